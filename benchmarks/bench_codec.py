@@ -0,0 +1,52 @@
+"""
+JSON codec benchmarks
+~~~~~~~~~~~~~~~~~~~~~
+
+Encoding payloads and decoding responses with every installed JSON backend,
+for large-attachment and many-recipient payloads.
+"""
+
+from shoutbox import Attachment, Email
+from shoutbox.json_codec import available_codecs, get_codec
+
+RESPONSE = b'{"emailid":"6f1c9d3e-2b7a-4c1e-9f0a-3d2b1c4e5f6a","message":"Payload uploaded successfully"}'
+
+
+def payloads(quick):
+    yield 'attachment_1mb', Email(
+        to='recipient@example.com',
+        subject='Benchmark',
+        html='<p>Benchmark</p>',
+        attachments=[Attachment(filename='blob.bin', content=b'\x00' * 1024 * 1024)]
+    ).to_dict()
+    if not quick:
+        yield 'attachment_10mb', Email(
+            to='recipient@example.com',
+            subject='Benchmark',
+            html='<p>Benchmark</p>',
+            attachments=[Attachment(filename='blob.bin', content=b'\x00' * 10 * 1024 * 1024)]
+        ).to_dict()
+    yield 'recipients_10k', Email(
+        to=[f"user{i}@example.com" for i in range(10000)],
+        subject='Benchmark',
+        html='<p>Benchmark</p>'
+    ).to_dict()
+
+
+def bench_codec_dumps(bench):
+    for payload_name, payload in payloads(bench.quick):
+        for name in available_codecs():
+            codec = get_codec(name)
+            bench.measure('codec.dumps', lambda: codec.dumps(payload), codec=name, payload=payload_name)
+
+
+def bench_codec_loads(bench):
+    for name in available_codecs():
+        codec = get_codec(name)
+        bench.measure('codec.loads', lambda: codec.loads(RESPONSE), codec=name, payload='response')
+
+
+BENCHMARKS = [
+    bench_codec_dumps,
+    bench_codec_loads,
+]
@@ -0,0 +1,80 @@
+"""
+Adaptive concurrency benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Fixed windows versus ``AdaptiveLimiter`` against a stand-in API server
+that answers 429 above its capacity. Results also store the number of
+rejected requests and the final adaptive limit in the saved JSON.
+
+Transactional latency behind a bulk backlog, through one FIFO queue and
+through the priority lanes of ``Dispatcher``. Results also store the
+transactional p50/p99 latency.
+"""
+
+import time
+
+from shoutbox import Email, ShoutboxClient
+from shoutbox.concurrency import AdaptiveLimiter
+from shoutbox.dispatch import Dispatcher, Lane
+from shoutbox.stats import LatencyHistogram
+from shoutbox.results import send_iter
+from shoutbox.testing import StandInAPIServer
+
+CAPACITY = 8
+
+
+def bench_adaptive_window(bench):
+    count = 200 if bench.quick else 2000
+    emails = [Email(to=f"user{i}@example.com", subject='Benchmark', html='<p>Benchmark</p>') for i in range(count)]
+    windows = {
+        'fixed=4': 4,
+        'fixed=8': 8,
+        'fixed=64': 64,
+        'adaptive': lambda: AdaptiveLimiter(initial=8, max_limit=64),
+    }
+    for name, window in windows.items():
+        window = window() if callable(window) else window
+        with StandInAPIServer(latency=0.005, capacity=CAPACITY) as server:
+            client = ShoutboxClient(api_key='benchmark', base_url=server.url, pool_size=64)
+            start = time.perf_counter()
+            results = list(send_iter(client.send, emails, window=window, retries=10, backoff=0.005))
+            elapsed = time.perf_counter() - start
+        result = bench.record('api.send.congested', count, elapsed, window=name)
+        result['rejected'] = server.rejected
+        result['failed'] = sum(not result for result in results)
+        if isinstance(window, AdaptiveLimiter):
+            result['final_limit'] = window.limit
+
+
+def bench_priority_dispatch(bench):
+    backlog = 500 if bench.quick else 5000
+    count = 20
+    bulk = [Email(to=f"user{i}@example.com", subject='Newsletter', html='<p>News</p>') for i in range(backlog)]
+    reset = Email(to='user@example.com', subject='Password reset', html='<p>Reset</p>')
+    modes = {
+        'fifo': lambda: [Lane('default')],
+        'priority': lambda: None,
+    }
+    for mode, lanes in modes.items():
+        histogram = LatencyHistogram()
+
+        def record(start):
+            return lambda future: histogram.record(time.perf_counter() - start)
+
+        with StandInAPIServer(latency=0.005) as server:
+            client = ShoutboxClient(api_key='benchmark', base_url=server.url, pool_size=16)
+            with Dispatcher(client, concurrency=16, lanes=lanes()) as dispatcher:
+                # Password resets arrive spread over the campaign
+                for i, email in enumerate(bulk):
+                    dispatcher.submit(email, priority='bulk' if mode == 'priority' else None)
+                    if i % (backlog // count) == 0:
+                        future = dispatcher.submit(reset, priority='transactional' if mode == 'priority' else None)
+                        future.add_done_callback(record(time.perf_counter()))
+        result = bench.record('dispatch.transactional', count, histogram.total, mode=mode)
+        result['p50'] = histogram.percentile(50)
+        result['p99'] = histogram.percentile(99)
+
+BENCHMARKS = [
+    bench_adaptive_window,
+    bench_priority_dispatch,
+]
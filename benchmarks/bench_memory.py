@@ -0,0 +1,32 @@
+"""
+Memory benchmarks
+~~~~~~~~~~~~~~~~~
+
+Memory held per queued ``Email`` (see ``peak_bytes_per_op``), with a
+shared sender and reply-to as in a typical outbox.
+"""
+
+from shoutbox import Email
+
+COUNT = 10000
+
+
+def bench_queued_email(bench):
+    def queue():
+        return [
+            Email(
+                to=f"user{i}@example.com",
+                subject='Hello',
+                html='<p>Hello</p>',
+                from_email='News <news@example.com>',
+                reply_to='reply@example.com'
+            )
+            for i in range(COUNT)
+        ]
+
+    bench.measure('memory.queued_email', queue, ops=COUNT, repeat=1)
+
+
+BENCHMARKS = [
+    bench_queued_email,
+]
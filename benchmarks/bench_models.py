@@ -0,0 +1,113 @@
+"""
+Model benchmarks
+~~~~~~~~~~~~~~~~
+
+Address validation, ``Email`` normalisation and payload serialisation.
+"""
+
+from shoutbox import Attachment, Email, EmailAddress
+
+RECIPIENT_COUNTS = (1, 10, 100, 1000, 10000)
+ATTACHMENT_SIZES = (1024, 64 * 1024, 1024 * 1024, 10 * 1024 * 1024, 50 * 1024 * 1024)
+
+
+def recipients(count: int) -> list:
+    return [f"user{i}@example.com" for i in range(count)]
+
+
+def bench_email_address(bench):
+    bench.measure('email_address.plain', lambda: EmailAddress('user@example.com'))
+    bench.measure('email_address.named', lambda: EmailAddress('User Name <user@example.com>'))
+
+
+def bench_email_post_init(bench):
+    for count in RECIPIENT_COUNTS:
+        to = recipients(count)
+        bench.measure(
+            'email.post_init',
+            lambda: Email(
+                to=to,
+                subject='Benchmark',
+                html='<p>Benchmark</p>',
+                from_email='Sender <sender@example.com>',
+                reply_to='reply@example.com'
+            ),
+            recipients=count
+        )
+
+
+def bench_email_from_trusted(bench):
+    for count in (1, 100, 10000):
+        to = recipients(count)
+        bench.measure(
+            'email.from_trusted',
+            lambda: Email.from_trusted(
+                to=to,
+                subject='Benchmark',
+                html='<p>Benchmark</p>',
+                from_email='Sender <sender@example.com>',
+                reply_to='reply@example.com'
+            ),
+            recipients=count
+        )
+        payload = Email(to=to, subject='Benchmark', html='<p>Benchmark</p>', from_email='sender@example.com').to_dict()
+        bench.measure('email.from_dict', lambda: Email.from_dict(payload), recipients=count)
+
+
+def bench_email_to_dict(bench):
+    for count in RECIPIENT_COUNTS:
+        email = Email(
+            to=recipients(count),
+            subject='Benchmark',
+            html='<p>Benchmark</p>',
+            from_email='sender@example.com'
+        )
+
+        def cold(serialise):
+            # Re-assigning a field drops the memoised payload
+            email.to = email.to
+            return serialise()
+
+        bench.measure('email.to_dict', lambda: cold(email.to_dict), recipients=count)
+        bench.measure('email.to_json', lambda: cold(email.to_json), recipients=count)
+        bench.measure('email.to_json.memoised', email.to_json, recipients=count)
+
+
+def bench_attachment_to_dict(bench):
+    sizes = ATTACHMENT_SIZES[:3] if bench.quick else ATTACHMENT_SIZES
+    for size in sizes:
+        attachment = Attachment(filename='blob.bin', content=b'\x00' * size)
+
+        def cold():
+            attachment.content = attachment.content
+            return attachment.to_dict()
+
+        bench.measure('attachment.to_dict', cold, size=size)
+
+
+def bench_with_overrides(bench):
+    for count in (1, 100):
+        base = Email(
+            to='placeholder@example.com',
+            cc=recipients(count),
+            subject='Benchmark',
+            html='<p>Benchmark</p>',
+            from_email='Sender <sender@example.com>',
+            reply_to='reply@example.com',
+            attachments=[Attachment(filename='blob.bin', content=b'\x00' * 64 * 1024)]
+        )
+        bench.measure(
+            'email.with_overrides.to_dict',
+            lambda: base.with_overrides(to='user@example.com', subject='Hello').to_dict(),
+            cc=count
+        )
+
+
+BENCHMARKS = [
+    bench_email_address,
+    bench_email_post_init,
+    bench_email_from_trusted,
+    bench_email_to_dict,
+    bench_attachment_to_dict,
+    bench_with_overrides,
+]
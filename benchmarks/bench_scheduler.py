@@ -0,0 +1,70 @@
+"""
+Scheduler benchmarks
+~~~~~~~~~~~~~~~~~~~~
+
+Inserting, cancelling and expiring timers in the ``TimerWheel`` behind
+``Scheduler``, against a ``heapq`` priority queue with lazy cancellation.
+"""
+
+import heapq
+import random
+
+from shoutbox.scheduler import TimerWheel, Timer
+
+
+def _deadlines(count):
+    rng = random.Random(0)
+    # Up to a day ahead at one second ticks
+    return [rng.randrange(1, 86400) for _ in range(count)]
+
+
+def bench_timer_insert_cancel(bench):
+    sizes = [10_000] if bench.quick else [10_000, 1_000_000]
+    for count in sizes:
+        deadlines = _deadlines(count)
+
+        def wheel():
+            timers = TimerWheel()
+            add = timers.add
+            handles = [add(Timer(i, deadline)) for i, deadline in enumerate(deadlines)]
+            for timer in handles[::2]:
+                timers.cancel(timer)
+
+        def heap():
+            queue = []
+            cancelled = set()
+            for i, deadline in enumerate(deadlines):
+                heapq.heappush(queue, (deadline, i))
+            for i in range(0, count, 2):
+                cancelled.add(i)
+
+        bench.measure('scheduler.insert_cancel', wheel, ops=count, repeat=1, timers=count, impl='wheel')
+        bench.measure('scheduler.insert_cancel', heap, ops=count, repeat=1, timers=count, impl='heapq')
+
+
+def bench_timer_expire(bench):
+    count = 10_000 if bench.quick else 100_000
+    deadlines = _deadlines(count)
+
+    def wheel():
+        timers = TimerWheel()
+        for i, deadline in enumerate(deadlines):
+            timers.add(Timer(i, deadline))
+        for now in range(0, 86400, 60):
+            timers.advance(now)
+
+    def heap():
+        queue = [(deadline, i) for i, deadline in enumerate(deadlines)]
+        heapq.heapify(queue)
+        for now in range(0, 86400, 60):
+            while queue and queue[0][0] <= now:
+                heapq.heappop(queue)
+
+    bench.measure('scheduler.expire', wheel, ops=count, repeat=1, timers=count, impl='wheel')
+    bench.measure('scheduler.expire', heap, ops=count, repeat=1, timers=count, impl='heapq')
+
+
+BENCHMARKS = [
+    bench_timer_insert_cancel,
+    bench_timer_expire,
+]
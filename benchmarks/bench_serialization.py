@@ -0,0 +1,73 @@
+"""
+Serialisation benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+Handing emails between processes: pickle, ``to_json()`` and the binary
+format from ``shoutbox.serialization``, with encoded sizes.
+"""
+
+import pickle
+
+from shoutbox import Attachment, Email
+from shoutbox import serialization
+from shoutbox.json_codec import get_codec
+
+
+def emails(quick):
+    yield 'recipients_100', Email(
+        to=[f"user{i}@example.com" for i in range(100)],
+        subject='Benchmark',
+        html='<p>Benchmark</p>',
+        from_email='Sender <sender@example.com>'
+    )
+    yield 'attachment_1mb', Email(
+        to='recipient@example.com',
+        subject='Benchmark',
+        html='<p>Benchmark</p>',
+        attachments=[Attachment(filename='blob.bin', content=b'\x00' * 1024 * 1024)]
+    )
+
+
+def json_dumps(email):
+    # Re-assigning a field drops the memoised body, as for a fresh email
+    email.to = email.to
+    return email.to_json()
+
+
+def json_loads(data):
+    return Email.from_dict(get_codec().loads(data))
+
+
+def bench_serialise(bench):
+    for email_name, email in emails(bench.quick):
+        formats = {
+            'pickle': (lambda: pickle.dumps(email), pickle.loads),
+            'json': (lambda: json_dumps(email), json_loads),
+            'binary': (lambda: serialization.dumps(email), serialization.loads),
+        }
+        for name, (dumps, loads) in formats.items():
+            data = dumps()
+            bench.measure('serialise.dumps', dumps, format=name, email=email_name, size=len(data))
+            bench.measure('serialise.loads', lambda: loads(data), format=name, email=email_name, size=len(data))
+
+
+def bench_serialise_batch(bench):
+    batch = [
+        Email(
+            to=f"user{i}@example.com",
+            subject='Benchmark',
+            html='<p>Benchmark</p>',
+            from_email='Sender <sender@example.com>',
+            reply_to='reply@example.com'
+        )
+        for i in range(1000)
+    ]
+    data = serialization.dumps_many(batch)
+    bench.measure('serialise.dumps_many', lambda: serialization.dumps_many(batch), ops=len(batch), size=len(data))
+    bench.measure('serialise.loads_many', lambda: serialization.loads_many(data), ops=len(batch), size=len(data))
+
+
+BENCHMARKS = [
+    bench_serialise,
+    bench_serialise_batch,
+]
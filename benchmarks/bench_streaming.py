@@ -0,0 +1,92 @@
+"""
+Streamed attachment benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Concurrent sends of emails with a large attachment from a file, read into
+``content`` (as ``file.read()`` in a web upload handler does) versus passed
+as ``Attachment(stream=...)``, over the API and SMTP. The stand-in servers
+run in a child process, so the peak memory recorded is the client's alone.
+"""
+
+import contextlib
+import multiprocessing
+import os
+import tempfile
+
+from shoutbox import ShoutboxClient, SMTPClient, Email, Attachment
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+
+SERVERS = {'api': StandInAPIServer, 'smtp': StandInSMTPServer}
+
+
+def _serve(transport, ports, stop):
+    server = SERVERS[transport]().start()
+    ports.put(server.port)
+    stop.wait()
+    server.stop()
+
+
+@contextlib.contextmanager
+def _server_process(transport):
+    context = multiprocessing.get_context('fork')
+    ports, stop = context.Queue(), context.Event()
+    process = context.Process(target=_serve, args=(transport, ports, stop), daemon=True)
+    process.start()
+    try:
+        yield ports.get(timeout=10)
+    finally:
+        stop.set()
+        process.join(5)
+
+
+def _send_all(client, paths, streamed):
+    files = [open(path, 'rb') for path in paths]
+    try:
+        attachments = [
+            Attachment(stream=f) if streamed else Attachment(filename=os.path.basename(f.name), content=f.read())
+            for f in files
+        ]
+        emails = [
+            Email(to='user@example.com', subject='Upload', html='<p>Attached</p>', attachments=[attachment])
+            for attachment in attachments
+        ]
+        for result in client.send_iter(emails, window=len(emails)):
+            if not result.ok:
+                raise result.error
+    finally:
+        for f in files:
+            f.close()
+
+
+def bench_streamed_attachments(bench):
+    concurrency = 4 if bench.quick else 8
+    size = (4 if bench.quick else 16) * 1024 * 1024
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for i in range(concurrency):
+            path = os.path.join(directory, f'upload-{i}.bin')
+            with open(path, 'wb') as f:
+                f.write(os.urandom(size))
+            paths.append(path)
+
+        for transport in SERVERS:
+            with _server_process(transport) as port:
+                if transport == 'api':
+                    client = ShoutboxClient(api_key='benchmark', base_url=f'http://127.0.0.1:{port}')
+                else:
+                    client = SMTPClient(api_key='benchmark', host='127.0.0.1', port=port, use_tls=False)
+                for streamed in (False, True):
+                    bench.measure(
+                        'attachment.send',
+                        lambda: _send_all(client, paths, streamed),
+                        ops=concurrency,
+                        repeat=1,
+                        transport=transport,
+                        mode='stream' if streamed else 'content',
+                        size=size
+                    )
+
+
+BENCHMARKS = [
+    bench_streamed_attachments,
+]
@@ -0,0 +1,58 @@
+"""
+Suppression list benchmarks
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+Bulk loading a ``SuppressionList`` and checking addresses against it, for
+addresses that are not on the list (answered by the Bloom filter) and
+addresses that are (confirmed in SQLite), against a plain SQLite lookup.
+"""
+
+import os
+import tempfile
+import time
+
+from shoutbox.suppression import SuppressionList
+
+
+def _addresses(prefix, count):
+    return [f"{prefix}{i}@example.com" for i in range(count)]
+
+
+def bench_suppression(bench):
+    sizes = [100_000] if bench.quick else [100_000, 10_000_000]
+    for count in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'suppressed.db')
+            suppression = SuppressionList(path, capacity=count)
+            listed = _addresses('listed', count)
+            # Loading is timed once; a repeat would only hit existing rows
+            start = time.perf_counter()
+            suppression.add_many(listed)
+            result = bench.record('suppression.load', count, time.perf_counter() - start, addresses=count)
+            result['filter_bytes'] = suppression.bloom.nbytes
+            del listed
+
+            lookups = 10_000
+            absent = _addresses('absent', lookups)
+            present = _addresses('listed', lookups)
+            db = suppression._db
+
+            def filtered(addresses):
+                for address in addresses:
+                    address in suppression
+
+            def sqlite_only(addresses):
+                for address in addresses:
+                    db.execute('SELECT 1 FROM suppressed WHERE address = ?', (address,)).fetchone()
+
+            for kind, addresses in (('absent', absent), ('present', present)):
+                bench.measure('suppression.lookup', lambda: filtered(addresses), ops=lookups,
+                              addresses=count, kind=kind, impl='bloom+sqlite')
+                bench.measure('suppression.lookup', lambda: sqlite_only(addresses), ops=lookups,
+                              addresses=count, kind=kind, impl='sqlite')
+            suppression.close()
+
+
+BENCHMARKS = [
+    bench_suppression,
+]
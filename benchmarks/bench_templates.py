@@ -0,0 +1,62 @@
+"""
+Template benchmarks
+~~~~~~~~~~~~~~~~~~~
+
+Per-recipient rendering with ``shoutbox.templates`` compared with
+formatting the HTML and building a fresh ``Email`` per recipient.
+"""
+
+from shoutbox import Attachment, Email
+from shoutbox.templates import EmailTemplate
+
+COUNT = 1000
+HTML = '<html><body><p>Dear $name,</p><p>Your code is <b>$code</b>.</p>' + '<p>Newsletter body.</p>' * 50 + '</body></html>'
+ROWS = [{'email': f"user{i}@example.com", 'name': f"User <{i}>", 'code': f"C{i:06d}"} for i in range(COUNT)]
+
+
+def make_base() -> Email:
+    return Email(
+        to='placeholder@example.com',
+        subject='Base',
+        html='<p>Base</p>',
+        from_email='News <news@example.com>',
+        reply_to='reply@example.com',
+        headers={'X-Campaign': 'benchmark'},
+        attachments=[Attachment(filename='terms.pdf', content=b'\x00' * 64 * 1024)]
+    )
+
+
+def bench_render_payload(bench):
+    template = EmailTemplate('Hello $name', html=HTML)
+    renderer = template.bind(make_base())
+    for validate in (True, False):
+        bench.measure(
+            'templates.render_payload',
+            lambda: list(renderer.render_many(ROWS, validate=validate)),
+            ops=COUNT,
+            validate=validate
+        )
+
+
+def bench_fresh_email(bench):
+    base = make_base()
+
+    def fresh():
+        for row in ROWS:
+            Email(
+                to=row['email'],
+                subject=f"Hello {row['name']}",
+                html=HTML.replace('$name', row['name']).replace('$code', row['code']),
+                from_email=base.from_email,
+                reply_to=base.reply_to,
+                headers=base.headers,
+                attachments=base.attachments
+            ).to_dict()
+
+    bench.measure('templates.fresh_email_to_dict', fresh, ops=COUNT)
+
+
+BENCHMARKS = [
+    bench_render_payload,
+    bench_fresh_email,
+]
@@ -0,0 +1,147 @@
+"""
+Transport benchmarks
+~~~~~~~~~~~~~~~~~~~~
+
+SMTP MIME construction and end-to-end sends against local stand-in servers,
+in sequential, threaded and async modes, and from worker processes.
+"""
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from shoutbox import Attachment, Email, ShoutboxClient, SMTPClient
+from shoutbox.parallel import ProcessPoolSender
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+
+WORKERS = 8
+
+
+def make_email(attachment_size: int = 0) -> Email:
+    attachments = []
+    if attachment_size:
+        attachments.append(Attachment(filename='blob.bin', content=b'\x00' * attachment_size))
+    return Email(
+        to='recipient@example.com',
+        subject='Benchmark',
+        html='<p>Benchmark</p>',
+        from_email='sender@example.com',
+        attachments=attachments
+    )
+
+
+def run_sequential(client, email, count):
+    for _ in range(count):
+        client.send(email)
+
+
+def run_threaded(client, email, count):
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        list(executor.map(client.send, [email] * count))
+
+
+def run_async(client, email, count):
+    async def main():
+        loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(WORKERS)
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            async def send_one():
+                async with semaphore:
+                    await loop.run_in_executor(executor, client.send, email)
+            await asyncio.gather(*(send_one() for _ in range(count)))
+    asyncio.run(main())
+
+
+MODES = {
+    'sequential': run_sequential,
+    'threaded': run_threaded,
+    'async': run_async,
+}
+
+
+def bench_mime_construction(bench):
+    client = SMTPClient(api_key='benchmark')
+    for size in (0, 1024, 1024 * 1024):
+        email = make_email(size)
+        bench.measure('smtp.build_message', lambda: client._build_message(email).as_bytes(), size=size)
+
+
+def bench_api_sends(bench):
+    count = 20 if bench.quick else 200
+    with StandInAPIServer() as server:
+        with ShoutboxClient(api_key='benchmark', base_url=server.url) as client:
+            for size in (0, 64 * 1024):
+                email = make_email(size)
+                for mode, run in MODES.items():
+                    bench.measure(
+                        'api.send',
+                        lambda: run(client, email, count),
+                        ops=count,
+                        repeat=1,
+                        mode=mode,
+                        size=size
+                    )
+
+
+def bench_smtp_sends(bench):
+    count = 10 if bench.quick else 100
+    with StandInSMTPServer() as server:
+        client = SMTPClient(api_key='benchmark', host=server.host, port=server.port, use_tls=False)
+        email = make_email()
+        for mode, run in MODES.items():
+            bench.measure(
+                'smtp.send',
+                lambda: run(client, email, count),
+                ops=count,
+                repeat=1,
+                mode=mode
+            )
+
+
+def bench_process_pool(bench):
+    # Distinct attachment objects, so every email is base64 encoded on send
+    count = 20 if bench.quick else 200
+    content = b'\x00' * 1024 * 1024
+    emails = [
+        Email(
+            to=f"user{i}@example.com",
+            subject='Benchmark',
+            html='<p>Benchmark</p>',
+            attachments=[Attachment(filename='blob.bin', content=content)]
+        )
+        for i in range(count)
+    ]
+
+    def fresh():
+        # Drop the cached encodings so every run encodes every email again
+        for email in emails:
+            email.attachments[0].content = content
+            email.attachments = email.attachments
+        return emails
+
+    with StandInAPIServer() as server:
+        factory = functools.partial(ShoutboxClient, api_key='benchmark', base_url=server.url)
+        with factory() as client:
+            bench.measure('api.send.campaign', lambda: run_threaded_many(client, fresh()), ops=count, repeat=1, mode='threaded')
+        for processes in (2, 4):
+            with ProcessPoolSender(factory, processes=processes, batch_size=4) as sender:
+                bench.measure(
+                    'api.send.campaign',
+                    lambda: list(sender.send(fresh())),
+                    ops=count,
+                    repeat=1,
+                    mode=f'processes={processes}'
+                )
+
+
+def run_threaded_many(client, emails):
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        list(executor.map(client.send, emails))
+
+
+BENCHMARKS = [
+    bench_mime_construction,
+    bench_api_sends,
+    bench_smtp_sends,
+    bench_process_pool,
+]
@@ -0,0 +1,91 @@
+"""
+Benchmark harness
+~~~~~~~~~~~~~~~~~
+
+Small timing and memory helpers shared by the benchmark modules.
+"""
+
+import gc
+import time
+import tracemalloc
+
+
+class Benchmark:
+    """Collects measurements for one benchmark run"""
+
+    def __init__(self, quick: bool = False, min_time: float = 0.2):
+        self.quick = quick
+        self.min_time = min_time / 4 if quick else min_time
+        self.results = []
+
+    def measure(self, name: str, func, ops: int = 1, repeat: int = 3, **params) -> dict:
+        """
+        Time ``func`` and record its peak traced memory
+
+        ``func`` is called in a loop until ``min_time`` has elapsed, ``repeat``
+        times, and the fastest round is kept. Peak memory is taken from a
+        separate single call under tracemalloc so tracing does not skew timings.
+
+        Args:
+            name: Benchmark name
+            func: Zero-argument callable performing ``ops`` operations per call
+            ops: Number of logical operations performed by one call
+            repeat: Number of timing rounds
+            **params: Parameters recorded alongside the result
+
+        Returns:
+            dict: The recorded result
+        """
+        func()  # warm up
+        best = None
+        calls = 0
+        for _ in range(1 if self.quick else repeat):
+            calls = 0
+            gc.collect()
+            start = time.perf_counter()
+            elapsed = 0.0
+            while elapsed < self.min_time or calls == 0:
+                func()
+                calls += 1
+                elapsed = time.perf_counter() - start
+            per_call = elapsed / calls
+            best = per_call if best is None else min(best, per_call)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = {
+            'name': name,
+            'params': params,
+            'ops': ops,
+            'seconds_per_call': best,
+            'ops_per_sec': ops / best if best else None,
+            'peak_bytes': peak,
+            'peak_bytes_per_op': peak / ops,
+        }
+        self.results.append(result)
+        return result
+
+    def record(self, name: str, ops: int, seconds: float, peak_bytes: int = None, **params) -> dict:
+        """Record a result measured by the caller, e.g. an end-to-end run"""
+        result = {
+            'name': name,
+            'params': params,
+            'ops': ops,
+            'seconds_per_call': seconds,
+            'ops_per_sec': ops / seconds if seconds else None,
+            'peak_bytes': peak_bytes,
+        }
+        self.results.append(result)
+        return result
+
+
+def result_key(result: dict) -> str:
+    """Stable key identifying a benchmark across runs"""
+    params = ','.join(f"{k}={v}" for k, v in sorted(result['params'].items()))
+    return f"{result['name']}[{params}]"
@@ -0,0 +1,102 @@
+"""
+Benchmark runner
+~~~~~~~~~~~~~~~~
+
+Runs every ``bench_*.py`` module in this directory and saves the results
+as JSON. Pass ``--compare`` with an earlier results file to flag
+regressions between releases.
+
+Usage:
+    python benchmarks/run.py --output results.json
+    python benchmarks/run.py --quick --compare results.json
+"""
+
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import sys
+
+from harness import Benchmark, result_key
+
+import shoutbox
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def discover(selected=None):
+    names = sorted(
+        name[:-3] for name in os.listdir(BENCH_DIR)
+        if name.startswith('bench_') and name.endswith('.py')
+    )
+    for name in names:
+        module = importlib.import_module(name)
+        for bench in module.BENCHMARKS:
+            if selected and not any(s in bench.__name__ for s in selected):
+                continue
+            yield bench
+
+
+def compare(results, baseline, threshold):
+    """Print the ratio against a baseline run and return the regressions"""
+    previous = {result_key(r): r for r in baseline['results']}
+    regressions = []
+    for result in results:
+        key = result_key(result)
+        old = previous.get(key)
+        if not old or not old['seconds_per_call']:
+            continue
+        ratio = result['seconds_per_call'] / old['seconds_per_call']
+        flag = ''
+        if ratio > 1 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(key)
+        print(f"{key:<60} {ratio:6.2f}x time{flag}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the Shoutbox benchmarks')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--compare', help='Compare against an earlier results JSON file')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='Relative slowdown reported as a regression (default: 0.1)')
+    parser.add_argument('--quick', action='store_true', help='Shorter runs and smaller inputs')
+    parser.add_argument('-k', dest='selected', action='append',
+                        help='Only run benchmarks whose name contains this string')
+    args = parser.parse_args(argv)
+
+    bench = Benchmark(quick=args.quick)
+    for func in discover(args.selected):
+        start = len(bench.results)
+        func(bench)
+        for result in bench.results[start:]:
+            peak = result['peak_bytes'] or 0
+            print(f"{result_key(result):<60} {result['ops_per_sec']:>14,.1f} ops/s "
+                  f"{peak / 1024:>12,.1f} KiB peak")
+
+    report = {
+        'version': shoutbox.__version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'quick': args.quick,
+        'results': bench.results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(bench.results, baseline, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
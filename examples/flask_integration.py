@@ -23,7 +23,7 @@ def send_email():
         )
         
         response = client.send(email)
-        return jsonify({'success': True, 'response': response})
+        return jsonify({'success': True, 'response': response.body})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
@@ -37,10 +37,10 @@ def send_email_with_attachment():
             
         file = request.files['file']
         
-        # Create attachment
+        # Create attachment, streamed from the upload instead of read into memory
         attachment = Attachment(
             filename=file.filename,
-            content=file.read(),
+            stream=file.stream,
             content_type=file.content_type
         )
         
@@ -54,7 +54,7 @@ def send_email_with_attachment():
         )
         
         response = client.send(email)
-        return jsonify({'success': True, 'response': response})
+        return jsonify({'success': True, 'response': response.body})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
@@ -74,7 +74,7 @@ def send_bulk_email():
         )
         
         response = client.send(email)
-        return jsonify({'success': True, 'response': response})
+        return jsonify({'success': True, 'response': response.body})
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
@@ -8,7 +8,8 @@ A Python library for sending emails through Shoutbox.net.
 from .client import ShoutboxClient
 from .smtp import SMTPClient
 from .models import Email, EmailAddress, Attachment
-from .exceptions import ShoutboxError, ValidationError, APIError
+from .results import SendResult
+from .exceptions import ShoutboxError, ValidationError, APIError, PartialSendError, PayloadTooLargeError
 
 __version__ = '0.1.2'
 
@@ -18,7 +19,10 @@ __all__ = [
     'Email',
     'EmailAddress',
     'Attachment',
+    'SendResult',
     'ShoutboxError',
     'ValidationError',
-    'APIError'
+    'APIError',
+    'PartialSendError',
+    'PayloadTooLargeError'
 ]
@@ -0,0 +1,7 @@
+"""Allow running the command line interface with ``python -m shoutbox``"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
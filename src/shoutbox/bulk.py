@@ -0,0 +1,237 @@
+"""
+Shoutbox bulk sending
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the mail-merge sender behind ``shoutbox send-bulk``.
+Recipients are streamed from CSV or JSONL one row at a time, rendered into
+emails lazily and sent with bounded concurrency, so memory use does not
+grow with the size of the list.
+"""
+
+import csv
+import json
+import os
+import time
+import typing
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .models import Email, EmailAddress
+from .templates import EmailTemplate
+from .results import SendResult, is_retryable
+from .concurrency import AdaptiveLimiter, resolve_window
+from .exceptions import ValidationError
+
+
+def read_rows(path: str, format: typing.Optional[str] = None) -> typing.Iterator[dict]:
+    """
+    Stream recipient rows from a CSV or JSONL file
+
+    Args:
+        path: File to read
+        format: ``'csv'`` or ``'jsonl'``; guessed from the file extension if omitted
+
+    Yields:
+        dict: One row per recipient
+    """
+    format = format or ('jsonl' if os.path.splitext(path)[1].lower() in ('.jsonl', '.ndjson', '.json') else 'csv')
+    if format not in ('csv', 'jsonl'):
+        raise ValueError(f"Unsupported recipient format: {format}")
+
+    with open(path, newline='', encoding='utf-8') as f:
+        if format == 'csv':
+            yield from csv.DictReader(f)
+        else:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def _ends_with_newline(path: str) -> bool:
+    with open(path, 'rb') as f:
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b'\n'
+
+
+class Progress:
+    """
+    Tracks which rows have completed
+
+    Rows complete out of order under concurrency, so progress is kept as a
+    low-water mark (every row below it is done) plus the completed rows
+    above it. The set only holds rows that finished ahead of a slower one,
+    so it stays small however long the list is.
+    """
+
+    def __init__(self):
+        self.next_row = 0
+        self._ahead = set()
+
+    def mark(self, row: int):
+        """Record a row as completed"""
+        if row < self.next_row:
+            return
+        self._ahead.add(row)
+        while self.next_row in self._ahead:
+            self._ahead.remove(self.next_row)
+            self.next_row += 1
+
+    def is_done(self, row: int) -> bool:
+        return row < self.next_row or row in self._ahead
+
+    @classmethod
+    def load(cls, path: str) -> 'Progress':
+        """
+        Rebuild progress from a results file written by :class:`BulkSender`
+
+        The results file doubles as the checkpoint: every row with a result
+        line has been attempted and is not sent again. A partially written
+        last line from an interrupted run is ignored.
+        """
+        progress = cls()
+        if not os.path.exists(path):
+            return progress
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    progress.mark(json.loads(line)['row'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+        return progress
+
+
+class BulkSender:
+    """
+    Mail-merge sender streaming recipients through a client
+
+    Subject and bodies are templates (``$name`` or ``${name}``, see
+    :mod:`shoutbox.templates`) filled from each row.
+
+    Args:
+        client: ``ShoutboxClient``, ``SMTPClient`` or anything with a ``send`` method
+        subject: Subject template
+        html: HTML body template
+        text: Plain text body template
+        from_email: Sender address shared by every email
+        reply_to: Reply-to address shared by every email
+        to_field: Row field holding the recipient address
+        name_field: Row field holding the recipient name, if present
+        concurrency: Maximum number of sends in flight, or an
+            :class:`~shoutbox.concurrency.AdaptiveLimiter`
+        escape_html: HTML-escape row values substituted into the HTML body
+    """
+
+    def __init__(
+        self,
+        client,
+        subject: str,
+        html: typing.Optional[str] = None,
+        text: typing.Optional[str] = None,
+        from_email: typing.Optional[typing.Union[str, EmailAddress]] = None,
+        reply_to: typing.Optional[typing.Union[str, EmailAddress]] = None,
+        to_field: str = 'email',
+        name_field: str = 'name',
+        concurrency: typing.Union[int, AdaptiveLimiter] = 8,
+        escape_html: bool = True
+    ):
+        self.client = client
+        self.template = EmailTemplate(subject, html, text, escape_html=escape_html)
+        self.from_email = EmailAddress(from_email) if isinstance(from_email, str) else from_email
+        self.reply_to = EmailAddress(reply_to) if isinstance(reply_to, str) else reply_to
+        self.to_field = to_field
+        self.name_field = name_field
+        self.limiter, self.concurrency, self._capacity = resolve_window(concurrency)
+
+    def build_email(self, row: dict) -> Email:
+        """Render the templates for one row into an email"""
+        address = row.get(self.to_field)
+        if not address:
+            raise ValidationError(f"Row has no '{self.to_field}' value")
+        subject, html, text = self.template.render(row)
+        return Email(
+            to=EmailAddress(address, row.get(self.name_field) or None),
+            subject=subject,
+            html=html,
+            text=text,
+            from_email=self.from_email,
+            reply_to=self.reply_to
+        )
+
+    def _send_row(self, row: dict):
+        email = self.build_email(row)
+        if not self.limiter:
+            return self.client.send(email)
+        start = time.perf_counter()
+        try:
+            result = self.client.send(email)
+        except Exception as e:
+            self.limiter.record(time.perf_counter() - start, congested=is_retryable(e))
+            raise
+        self.limiter.record(time.perf_counter() - start)
+        return result
+
+    def send(
+        self,
+        rows: typing.Iterable[dict],
+        output: str,
+        resume: bool = False,
+        on_result: typing.Optional[typing.Callable[[dict], None]] = None
+    ) -> dict:
+        """
+        Send an email for every row and write one JSON result line per row
+
+        Args:
+            rows: Recipient rows, typically from :func:`read_rows`
+            output: JSONL file receiving the results
+            resume: Skip rows already recorded in ``output`` and append to it
+            on_result: Called with each result record as it is written
+
+        Returns:
+            dict: Counts of ``sent``, ``failed``, ``skipped`` and ``suppressed`` rows
+        """
+        progress = Progress.load(output) if resume else Progress()
+        stats = {'sent': 0, 'failed': 0, 'skipped': 0, 'suppressed': 0}
+
+        with open(output, 'a' if resume else 'w', encoding='utf-8') as out, \
+                ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            if resume and out.tell() and not _ends_with_newline(output):
+                out.write('\n')
+
+            def record(future, row_number, row):
+                result = {'row': row_number, 'to': row.get(self.to_field)}
+                try:
+                    response = future.result()
+                except Exception as e:
+                    result.update(status='failed', error=str(e))
+                    stats['failed'] += 1
+                else:
+                    if isinstance(response, SendResult) and response.status == 'suppressed':
+                        result.update(status='suppressed', suppressed=response.suppressed)
+                        stats['suppressed'] += 1
+                    else:
+                        if isinstance(response, SendResult):
+                            response = response.body
+                        result.update(status='sent', response=response)
+                        stats['sent'] += 1
+                out.write(json.dumps(result, default=str) + '\n')
+                out.flush()
+                progress.mark(row_number)
+                if on_result:
+                    on_result(result)
+
+            pending = {}
+            for row_number, row in enumerate(rows):
+                if progress.is_done(row_number):
+                    stats['skipped'] += 1
+                    continue
+                while len(pending) >= self._capacity():
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(future, *pending.pop(future))
+                pending[executor.submit(self._send_row, row)] = (row_number, row)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record(future, *pending.pop(future))
+
+        return stats
@@ -0,0 +1,257 @@
+"""
+Shoutbox command line interface
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the ``shoutbox`` console entry point.
+"""
+
+import argparse
+import os
+import random
+import sys
+
+from . import __version__
+from .exceptions import ShoutboxError
+from .models import Email, Attachment
+from .client import ShoutboxClient
+from .smtp import SMTPClient
+from .loadgen import LoadGenerator, parse_size, parse_attachment_mix, synthetic_email
+from .bulk import BulkSender, read_rows
+from .concurrency import AdaptiveLimiter
+
+
+def _ms(seconds: float) -> str:
+    return f"{seconds * 1000:.1f}ms"
+
+
+def _start_stand_in(args):
+    """Start the local stand-in server requested with ``--stand-in``, if any"""
+    if not args.stand_in:
+        return None
+    from .testing import StandInAPIServer, StandInSMTPServer
+    args.api_key = args.api_key or 'stand-in'
+    server = StandInAPIServer if args.transport == 'api' else StandInSMTPServer
+    return server(latency=args.stand_in_latency / 1000).start()
+
+
+def _make_client(args, stand_in):
+    if args.transport == 'api':
+        base_url = stand_in.url if stand_in else args.base_url
+        return ShoutboxClient(api_key=args.api_key, base_url=base_url, pool_size=args.concurrency)
+    if stand_in:
+        return SMTPClient(api_key=args.api_key, host=stand_in.host, port=stand_in.port, use_tls=False)
+    return SMTPClient(api_key=args.api_key, host=args.host, port=args.port, use_tls=not args.no_tls)
+
+
+def _fresh_copy(email: Email) -> Email:
+    """A new email with the same fields, which has nothing serialised or encoded yet"""
+    return Email(
+        to=list(email.to),
+        subject=email.subject,
+        html=email.html,
+        from_email=email.from_email,
+        attachments=[
+            Attachment(filename=att.filename, content=att.content, content_type=att.content_type)
+            for att in email.attachments
+        ]
+    )
+
+
+def _email_source(args):
+    """
+    Return a callable building a synthetic email according to the attachment mix
+
+    Every call returns a new email, so each send pays for validation,
+    serialisation and attachment encoding like an application's would;
+    only the random content is generated once, up front.
+    """
+    mix = parse_attachment_mix(args.attachments)
+    payload_size = parse_size(args.payload_size)
+    emails = [synthetic_email(args.to, args.from_email, payload_size, size) for size, _ in mix]
+    weights = [weight for _, weight in mix]
+    if len(emails) == 1:
+        return lambda: _fresh_copy(emails[0])
+    return lambda: _fresh_copy(random.choices(emails, weights)[0])
+
+
+def bench(args) -> int:
+    """Run ``shoutbox bench``"""
+    if args.requests is None and args.duration is None:
+        args.duration = 10.0
+
+    stand_in = _start_stand_in(args)
+
+    try:
+        client = _make_client(args, stand_in)
+        generator = LoadGenerator(
+            client.send,
+            _email_source(args),
+            concurrency=args.concurrency,
+            rate=args.rate,
+            requests=args.requests,
+            duration=args.duration
+        )
+
+        target = 'local stand-in' if stand_in else (args.base_url if args.transport == 'api' else f"{args.host}:{args.port}")
+        rate = f"{args.rate:g}/s" if args.rate else 'unlimited'
+        print(f"shoutbox bench: {args.transport} -> {target}, concurrency {args.concurrency}, "
+              f"rate {rate}, payload {args.payload_size}, attachments {args.attachments}")
+
+        state = {'completed': 0, 'elapsed': 0.0}
+
+        def report(gen):
+            elapsed, completed = gen.elapsed, gen.completed
+            window = elapsed - state['elapsed']
+            rate = (completed - state['completed']) / window if window > 0 else 0.0
+            state.update(completed=completed, elapsed=elapsed)
+            latency = gen.latency
+            print(f"[{elapsed:6.1f}s] sent {latency.count:>8} errors {gen.errors:>6} | {rate:8.1f}/s | "
+                  f"p50 {_ms(latency.percentile(50))} p90 {_ms(latency.percentile(90))} "
+                  f"p99 {_ms(latency.percentile(99))}", flush=True)
+
+        generator.run(report=None if args.quiet else report, interval=args.interval)
+    finally:
+        if stand_in:
+            stand_in.stop()
+
+    summary = generator.summary()
+    print()
+    print("Summary")
+    print(f"  sent        {summary['sent']}")
+    print(f"  errors      {summary['errors']}")
+    print(f"  elapsed     {summary['elapsed']:.2f}s")
+    print(f"  throughput  {summary['throughput']:.1f}/s")
+    print(f"  latency     mean {_ms(summary['latency_mean'])}  p50 {_ms(summary['latency_p50'])}  "
+          f"p90 {_ms(summary['latency_p90'])}  p99 {_ms(summary['latency_p99'])}  max {_ms(summary['latency_max'])}")
+    if generator.last_error is not None:
+        print(f"  last error  {generator.last_error}")
+    return 1 if summary['errors'] and not summary['sent'] else 0
+
+
+def _read_template(value: str, path: str) -> str:
+    if path:
+        with open(path, encoding='utf-8') as f:
+            return f.read()
+    return value
+
+
+def send_bulk(args) -> int:
+    """Run ``shoutbox send-bulk``"""
+    stand_in = _start_stand_in(args)
+    concurrency = args.concurrency
+    if args.adaptive:
+        concurrency = AdaptiveLimiter(initial=min(8, args.concurrency), max_limit=args.concurrency)
+
+    try:
+        sender = BulkSender(
+            _make_client(args, stand_in),
+            subject=args.subject,
+            html=_read_template(args.html, args.html_file),
+            text=_read_template(args.text, args.text_file),
+            from_email=args.from_email,
+            reply_to=args.reply_to,
+            to_field=args.to_field,
+            name_field=args.name_field,
+            concurrency=concurrency,
+            escape_html=not args.no_escape
+        )
+
+        def report(result):
+            if result['status'] == 'failed' and not args.quiet:
+                print(f"row {result['row']}: {result['to']}: {result['error']}", file=sys.stderr, flush=True)
+
+        stats = sender.send(
+            read_rows(args.recipients, args.format),
+            args.output,
+            resume=args.resume,
+            on_result=report
+        )
+    finally:
+        if stand_in:
+            stand_in.stop()
+
+    print(f"sent {stats['sent']}, failed {stats['failed']}, skipped {stats['skipped']}, "
+          f"suppressed {stats['suppressed']} -> {args.output}")
+    if sender.limiter:
+        limiter = sender.limiter.stats()
+        print(f"adaptive concurrency: final limit {limiter['limit']}, "
+              f"{limiter['decreases']} decreases, {limiter['congestion_events']} congestion signals")
+    return 1 if stats['failed'] else 0
+
+
+def _add_transport_arguments(parser):
+    parser.add_argument('--transport', choices=('api', 'smtp'), default='api')
+    parser.add_argument('--api-key', default=os.getenv('SHOUTBOX_API_KEY'))
+    parser.add_argument('--base-url', default=os.getenv('SHOUTBOX_API_ENDPOINT', 'https://api.shoutbox.net'))
+    parser.add_argument('--host', default='mail.shoutbox.net', help='SMTP host')
+    parser.add_argument('--port', type=int, default=587, help='SMTP port')
+    parser.add_argument('--no-tls', action='store_true', help='Do not use STARTTLS for SMTP')
+    parser.add_argument('--stand-in', action='store_true',
+                        help='Send to a local stand-in server instead of Shoutbox')
+    parser.add_argument('--stand-in-latency', type=float, default=0.0, metavar='MS',
+                        help='Latency added by the stand-in server per send')
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog='shoutbox', description='Shoutbox command line tools')
+    parser.add_argument('--version', action='version', version=f"%(prog)s {__version__}")
+    commands = parser.add_subparsers(dest='command')
+
+    parser_bench = commands.add_parser('bench', help='Generate load against the API or SMTP service')
+    _add_transport_arguments(parser_bench)
+    parser_bench.add_argument('-c', '--concurrency', type=int, default=8, help='Concurrent senders (default: 8)')
+    parser_bench.add_argument('-r', '--rate', type=float, default=0,
+                              help='Target sends per second, 0 for unlimited (default: 0)')
+    parser_bench.add_argument('-n', '--requests', type=int, help='Total number of sends')
+    parser_bench.add_argument('-d', '--duration', type=float, help='Run time in seconds (default: 10)')
+    parser_bench.add_argument('--payload-size', default='1k', help='HTML body size (default: 1k)')
+    parser_bench.add_argument('--attachments', default='0', metavar='MIX',
+                              help='Attachment sizes and weights, e.g. 0:70,10k:20,1m:10 (default: 0)')
+    parser_bench.add_argument('--to', default=os.getenv('SHOUTBOX_TO') or 'recipient@example.com')
+    parser_bench.add_argument('--from', dest='from_email', default=os.getenv('SHOUTBOX_FROM') or 'sender@example.com')
+    parser_bench.add_argument('--interval', type=float, default=1.0, help='Seconds between progress lines')
+    parser_bench.add_argument('-q', '--quiet', action='store_true', help='Only print the summary')
+    parser_bench.set_defaults(func=bench)
+
+    parser_bulk = commands.add_parser('send-bulk', help='Mail-merge a CSV or JSONL recipient list')
+    parser_bulk.add_argument('recipients', help='CSV or JSONL file with one recipient per row')
+    parser_bulk.add_argument('--format', choices=('csv', 'jsonl'), help='Recipient file format (default: from extension)')
+    parser_bulk.add_argument('-o', '--output', required=True, help='JSONL file receiving one result per row')
+    parser_bulk.add_argument('--resume', action='store_true',
+                             help='Skip rows already recorded in the output file and append to it')
+    parser_bulk.add_argument('--subject', required=True, help='Subject template, e.g. "Hello $name"')
+    parser_bulk.add_argument('--html', help='HTML body template')
+    parser_bulk.add_argument('--html-file', help='File containing the HTML body template')
+    parser_bulk.add_argument('--text', help='Plain text body template')
+    parser_bulk.add_argument('--text-file', help='File containing the plain text body template')
+    parser_bulk.add_argument('--no-escape', action='store_true',
+                             help='Do not HTML-escape row values substituted into the HTML body')
+    parser_bulk.add_argument('--from', dest='from_email', default=os.getenv('SHOUTBOX_FROM'))
+    parser_bulk.add_argument('--reply-to')
+    parser_bulk.add_argument('--to-field', default='email', help='Row field with the recipient address (default: email)')
+    parser_bulk.add_argument('--name-field', default='name', help='Row field with the recipient name (default: name)')
+    parser_bulk.add_argument('-c', '--concurrency', type=int, default=8,
+                             help='Concurrent sends, or the upper bound with --adaptive (default: 8)')
+    parser_bulk.add_argument('--adaptive', action='store_true',
+                             help='Adapt concurrency to latency and 429/5xx responses')
+    parser_bulk.add_argument('-q', '--quiet', action='store_true', help='Do not report failed rows')
+    _add_transport_arguments(parser_bulk)
+    parser_bulk.set_defaults(func=send_bulk)
+
+    return parser
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, 'func', None):
+        parser.print_help()
+        return 2
+    try:
+        return args.func(args)
+    except (ValueError, ShoutboxError) as e:
+        parser.error(str(e))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
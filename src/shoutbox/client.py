@@ -6,21 +6,71 @@ This module contains the Shoutbox client class.
 """
 
 import os
+import time
+import typing
 from urllib.parse import urlparse
 import requests
+from requests.adapters import HTTPAdapter
 
-from .models import Email
-from .exceptions import ShoutboxError, APIError
+from .models import Email, _splice_streams
+from .exceptions import ShoutboxError, ValidationError, APIError, PartialSendError, PayloadTooLargeError
+from .json_codec import JSONCodec, get_codec
+from .results import SendResult, send_iter, asend_iter
+from .concurrency import AdaptiveLimiter
+from .dedupe import _SingleFlight
+from .mime import MessageSource, message_envelope, message_payload, parse_message
 
 class ShoutboxClient:
-    """Client for the Shoutbox email API"""
+    """
+    Client for the Shoutbox email API
+
+    Emails with an ``idempotency_key`` are sent with an ``Idempotency-Key``
+    header. With ``idempotency_keys`` set, emails without one get a key
+    derived from their recipients and content, see
+    :meth:`Email.derive_idempotency_key`. With a ``dedupe_store`` (see
+    :mod:`shoutbox.dedupe`), keys are derived as well and a send whose key
+    was already sent returns a result with ``duplicate`` set instead of
+    calling the API again.
+
+    With ``max_recipients_per_request`` set, emails with more recipients are
+    split into requests of at most that many (see
+    :meth:`Email.split_recipients`) sent concurrently over the connection
+    pool. Failed chunks are retried up to ``chunk_retries`` times without
+    repeating the chunks that succeeded.
+
+    With a ``suppression`` list (see :mod:`shoutbox.suppression`), suppressed
+    recipients are dropped before sending and listed in the result's
+    ``suppressed``. An email whose recipients are all suppressed is not sent
+    and returns a result with status ``'suppressed'``.
+
+    With a ``domain_validator`` (see :mod:`shoutbox.domains`), emails to a
+    domain that cannot receive mail raise ``ValidationError`` without
+    calling the API.
+
+    With ``max_request_size`` set, a request body whose estimated size (see
+    :meth:`Email.estimated_size`) is larger raises ``PayloadTooLargeError``
+    before anything is encoded or uploaded.
+
+    Emails with streamed attachments (``Attachment(stream=...)``) are sent
+    with a chunked request body, each stream base64-encoded as it is read,
+    so concurrent large uploads do not each hold their attachment in memory.
+    """
     
     def __init__(
         self, 
         api_key: str = None,
         base_url: str = os.getenv('SHOUTBOX_API_ENDPOINT', 'https://api.shoutbox.net'),
         timeout: int = 30,
-        verify_ssl: bool = True
+        verify_ssl: bool = True,
+        pool_size: int = 10,
+        json_codec: typing.Union[str, JSONCodec, None] = None,
+        idempotency_keys: bool = False,
+        dedupe_store=None,
+        max_recipients_per_request: typing.Optional[int] = None,
+        chunk_retries: int = 2,
+        suppression=None,
+        domain_validator=None,
+        max_request_size: typing.Optional[int] = None
     ):
         self.api_key = api_key or os.getenv('SHOUTBOX_API_KEY')
         if not self.api_key:
@@ -34,13 +84,30 @@ class ShoutboxClient:
         
         self.timeout = timeout
         self.verify_ssl = verify_ssl
+        self.pool_size = pool_size
+        self.idempotency_keys = idempotency_keys or dedupe_store is not None
+        self.dedupe_store = dedupe_store
+        self._single_flight = _SingleFlight(dedupe_store) if dedupe_store is not None else None
+        if max_recipients_per_request is not None and max_recipients_per_request < 1:
+            raise ValueError("max_recipients_per_request must be at least 1")
+        self.max_recipients_per_request = max_recipients_per_request
+        self.chunk_retries = chunk_retries
+        self.suppression = suppression
+        self.domain_validator = domain_validator
+        self.max_request_size = max_request_size
+        # Fastest installed JSON backend unless one is given
+        self.json_codec = get_codec(json_codec)
         self.session = requests.Session()
+        # Size the connection pool for concurrent senders
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'Authorization': f'Bearer {self.api_key}',
             'Content-Type': 'application/json'
         })
 
-    def send(self, email: Email) -> dict:
+    def send(self, email: Email) -> SendResult:
         """
         Send an email using the Shoutbox API
         
@@ -48,24 +115,267 @@ class ShoutboxClient:
             email: Email object containing the email details
             
         Returns:
-            dict: API response
+            SendResult: The result; the API response is available by key,
+            e.g. ``result['emailid']``, and is only parsed when accessed.
+            For chunked sends, ``chunks`` holds the result of each request.
+            If every recipient is suppressed, nothing is sent and the result's
+            status is ``'suppressed'``.
             
         Raises:
             ValidationError: If email validation fails
+            PayloadTooLargeError: If the request body is above ``max_request_size``
+            APIError: If the API request fails
+            PartialSendError: If only some chunks of a chunked send succeeded
+            ShoutboxError: For other Shoutbox-related errors
+        """
+        if self.suppression is not None:
+            allowed, suppressed = self.suppression.filter_email(email)
+            if allowed is None:
+                return SendResult('suppressed', email, attempts=0, suppressed=suppressed)
+            if suppressed:
+                result = self._send_keyed(allowed)
+                result.email = email
+                result.suppressed = suppressed
+                return result
+        return self._send_keyed(email)
+
+    def _send_keyed(self, email: Email) -> SendResult:
+        if self.domain_validator is not None:
+            self.domain_validator.validate_email(email)
+        key = email.idempotency_key
+        if key is None and self.idempotency_keys:
+            key = email.derive_idempotency_key()
+        if self._single_flight is not None:
+            return self._single_flight.send(key, email, lambda: self._deliver(email, key))
+        return self._deliver(email, key)
+
+    def _deliver(self, email: Email, key: typing.Optional[str]) -> SendResult:
+        limit = self.max_recipients_per_request
+        if limit and email.recipient_count() > limit:
+            return self._send_chunked(email, key, limit)
+        return self._send(email, key)
+
+    def send_raw(
+        self,
+        message: MessageSource,
+        envelope_from: typing.Optional[str] = None,
+        recipients: typing.Optional[typing.Iterable[str]] = None,
+        idempotency_key: typing.Optional[str] = None
+    ) -> SendResult:
+        """
+        Send a message that is already rendered, without converting it to ``Email``
+
+        The API takes JSON, so the message's headers and parts are mapped
+        straight onto the request payload (see
+        :func:`shoutbox.mime.message_payload`). Attachments that are base64
+        encoded in the message are passed through without being decoded.
+        Unlike :meth:`SMTPClient.send_raw`, the whole message is read into
+        memory.
+
+        Args:
+            message: RFC 5322 message as bytes, text, an
+                ``email.message.Message`` or a binary file object
+            envelope_from: Sender address; defaults to the ``From`` header
+            recipients: Addresses to deliver to; default to the ``To``,
+                ``Cc`` and ``Bcc`` headers
+            idempotency_key: Sent as the ``Idempotency-Key`` header
+
+        Returns:
+            SendResult: The result, with ``email`` None; status
+            ``'suppressed'`` if every recipient is suppressed
+
+        Raises:
+            ValidationError: If the message has no recipients, or a
+                recipient's domain cannot receive mail
+            PayloadTooLargeError: If the request body is above ``max_request_size``
+            APIError: If the API request fails
+            ShoutboxError: For other Shoutbox-related errors
+        """
+        msg = parse_message(message)
+        if recipients is not None:
+            recipients = list(dict.fromkeys(recipients))
+        suppressed = []
+        if self.suppression is not None:
+            addresses = message_envelope(msg)[1] if recipients is None else recipients
+            suppressed = [address for address in addresses if address in self.suppression]
+            if suppressed:
+                dropped = set(suppressed)
+                recipients = [address for address in addresses if address not in dropped]
+                if not recipients:
+                    return SendResult('suppressed', attempts=0, suppressed=suppressed)
+        payload = message_payload(msg, envelope_from, recipients)
+        if self.domain_validator is not None:
+            addresses = [address for key in ('to', 'cc', 'bcc') if key in payload for address in payload[key].split(',')]
+            rejected = self.domain_validator.undeliverable(addresses)
+            if rejected:
+                raise ValidationError(f"Undeliverable recipient domain: {', '.join(rejected)}")
+        body = self.json_codec.dumps(payload)
+        if self.max_request_size is not None and len(body) > self.max_request_size:
+            raise PayloadTooLargeError(
+                f"Message of {len(body)} bytes exceeds the request limit of {self.max_request_size} bytes",
+                len(body), self.max_request_size
+            )
+        result = self._post(body, idempotency_key)
+        result.suppressed = suppressed
+        return result
+
+    def check_size(self, email: Email) -> int:
+        """
+        Estimated request body size of an email, checked against ``max_request_size``
+
+        Returns:
+            int: The estimated size in bytes
+
+        Raises:
+            PayloadTooLargeError: If the email is too large to send
+        """
+        size = email.estimated_size('api')
+        if self.max_request_size is not None and size > self.max_request_size:
+            raise PayloadTooLargeError(
+                f"Email of about {size} bytes exceeds the request limit of {self.max_request_size} bytes",
+                size, self.max_request_size
+            )
+        return size
+
+    def _send(self, email: Email, key: typing.Optional[str]) -> SendResult:
+        if self.max_request_size is not None:
+            self.check_size(email)
+        body = email.to_json(self.json_codec)
+        if any(attachment.stream is not None for attachment in email.attachments or ()):
+            # Sent with chunked transfer encoding, encoding the streams as they are read
+            body = _splice_streams(body, email.attachments)
+        result = self._post(body, key)
+        result.email = email
+        return result
+
+    def _send_chunked(self, email: Email, key: typing.Optional[str], limit: int) -> SendResult:
+        chunks = email.split_recipients(limit)
+        if email.idempotency_key is None and key is not None:
+            for i, chunk in enumerate(chunks, 1):
+                chunk.idempotency_key = f"{key}:{i}"
+
+        def send(chunk):
+            return self._send(chunk, chunk.idempotency_key)
+
+        results = [None] * len(chunks)
+        window = min(len(chunks), self.pool_size)
+        if any(attachment.stream is not None for attachment in email.attachments or ()):
+            # Every request reads the same stream
+            window = 1
+        for result in send_iter(send, chunks, window, self.chunk_retries):
+            results[result.index] = result
+
+        sent = [result for result in results if result.ok]
+        message_ids = [result.message_id for result in sent]
+        aggregate = SendResult(
+            'sent' if len(sent) == len(results) else 'failed',
+            email,
+            body={'emailid': message_ids[0] if message_ids else None, 'emailids': message_ids},
+            bytes_sent=sum(result.bytes_sent for result in results),
+            latency=max(result.latency for result in results),
+            attempts=sum(result.attempts for result in results),
+            chunks=results
+        )
+        if not sent:
+            # Nothing was sent; report it like an unchunked send
+            aggregate.error = results[0].error
+            raise aggregate.error
+        if aggregate.ok:
+            return aggregate
+        failed = len(results) - len(sent)
+        aggregate.error = PartialSendError(f"{failed} of {len(results)} chunks failed", aggregate)
+        raise aggregate.error
+
+    def send_iter(
+        self,
+        emails: typing.Iterable[Email],
+        window: typing.Union[int, AdaptiveLimiter, None] = None,
+        retries: int = 0
+    ) -> typing.Iterator[SendResult]:
+        """
+        Send a stream of emails, yielding results as they complete
+
+        Emails are read lazily and at most ``window`` requests are in flight,
+        so arbitrarily long streams can be sent with bounded memory. Failed
+        sends are reported in their result instead of raising.
+
+        Example:
+            for result in client.send_iter(emails):
+                if not result.ok:
+                    print(result.index, result.error)
+
+        Args:
+            emails: Emails to send
+            window: Maximum requests in flight, defaulting to ``pool_size``, or an
+                :class:`~shoutbox.concurrency.AdaptiveLimiter`; size ``pool_size``
+                to its ``max_limit`` so connections are reused
+            retries: Extra attempts for timeouts, connection errors, 429 and 5xx responses
+
+        Returns:
+            Iterator[SendResult]: One result per email, in completion order
+        """
+        return send_iter(self.send, emails, window or self.pool_size, retries)
+
+    def asend_iter(
+        self,
+        emails: typing.Union[typing.Iterable[Email], typing.AsyncIterable[Email]],
+        window: typing.Union[int, AdaptiveLimiter, None] = None,
+        retries: int = 0
+    ) -> typing.AsyncIterator[SendResult]:
+        """
+        Async variant of :meth:`send_iter`, accepting a regular or async iterable
+
+        Example:
+            async for result in client.asend_iter(emails):
+                ...
+        """
+        return asend_iter(self.send, emails, window or self.pool_size, retries)
+
+    def send_payload(self, payload: dict, idempotency_key: typing.Optional[str] = None) -> SendResult:
+        """
+        Send a ready-made API payload, such as one rendered by ``shoutbox.templates``
+
+        Args:
+            payload: Payload in the format produced by ``Email.to_dict()``
+            idempotency_key: Sent as the ``Idempotency-Key`` header
+
+        Returns:
+            SendResult: The result
+
+        Raises:
             APIError: If the API request fails
             ShoutboxError: For other Shoutbox-related errors
         """
+        return self._post(self.json_codec.dumps(payload), idempotency_key)
+
+    def _post(
+        self,
+        body: typing.Union[bytes, typing.Iterator[bytes]],
+        idempotency_key: typing.Optional[str] = None
+    ) -> SendResult:
+        """Post an encoded JSON payload, or an iterator of its parts, to the send endpoint"""
+        start = time.perf_counter()
+        sent = 0
+
+        def counted(parts):
+            nonlocal sent
+            for part in parts:
+                sent += len(part)
+                yield part
+
+        data = body if isinstance(body, bytes) else counted(body)
         try:
             response = self.session.post(
                 f"{self.base_url}/send",
-                json=email.to_dict(),
+                data=data,
+                headers={'Idempotency-Key': idempotency_key} if idempotency_key else None,
                 timeout=self.timeout,
                 verify=self.verify_ssl
             )
             
             if response.status_code >= 400:
                 try:
-                    error_body = response.json()
+                    error_body = self.json_codec.loads(response.content)
                 except ValueError:
                     error_body = response.text
                 raise APIError(
@@ -74,7 +384,12 @@ class ShoutboxClient:
                     error_body
                 )
             
-            return response.json()
+            return SendResult(
+                raw=response.content,
+                codec=self.json_codec,
+                bytes_sent=len(body) if isinstance(body, bytes) else sent,
+                latency=time.perf_counter() - start
+            )
             
         except requests.exceptions.Timeout:
             raise ShoutboxError("Request timed out")
@@ -83,7 +398,7 @@ class ShoutboxClient:
         except requests.exceptions.ConnectionError:
             raise ShoutboxError("Connection error")
         except Exception as e:
-            if isinstance(e, APIError):
+            if isinstance(e, (APIError, ValidationError)):
                 raise
             raise ShoutboxError(f"Unexpected error: {str(e)}")
 
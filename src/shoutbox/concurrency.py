@@ -0,0 +1,146 @@
+"""
+Shoutbox adaptive concurrency
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains an adaptive concurrency limit for bulk sends.
+
+A fixed number of workers is either too low, wasting throughput, or too
+high, running into rate limits and queueing latency, and the right value
+changes over the day. :class:`AdaptiveLimiter` finds it as it goes, in the
+style of TCP congestion control: the limit grows by about one for every
+window of healthy sends and is cut multiplicatively on 429/5xx responses,
+transport errors or latency rising well above its no-load baseline.
+"""
+
+import threading
+import typing
+
+
+class AdaptiveLimiter:
+    """
+    Additive-increase, multiplicative-decrease concurrency limit
+
+    Pass it as the ``window`` of ``send_iter()`` or as the ``concurrency``
+    of ``BulkSender`` and read :attr:`limit` or :meth:`stats` for the
+    current value.
+
+    Args:
+        initial: Starting limit
+        min_limit: Lowest limit
+        max_limit: Highest limit, also the number of worker threads needed
+        increase: Added to the limit per window of healthy sends
+        decrease: Factor applied to the limit on congestion
+        latency_tolerance: Treat the smoothed latency exceeding this multiple
+            of the baseline (lowest recent) latency as congestion
+        smoothing: Weight of each new latency sample in the smoothed latency
+    """
+
+    # How fast the baseline latency follows slower samples, so that a
+    # permanently slower service does not read as congestion forever
+    BASELINE_DRIFT = 0.01
+
+    def __init__(
+        self,
+        initial: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 128,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_tolerance: float = 2.0,
+        smoothing: float = 0.1
+    ):
+        if not 1 <= min_limit <= max_limit:
+            raise ValueError("Limits must satisfy 1 <= min_limit <= max_limit")
+        if not 0 < decrease < 1:
+            raise ValueError("decrease must be between 0 and 1")
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+
+        self._limit = float(min(max(initial, min_limit), max_limit))
+        self._lock = threading.Lock()
+        self._baseline = None
+        self._smoothed = None
+        # Samples since the last decrease; starts high so the first congestion signal counts
+        self._since_decrease = float('inf')
+        self.samples = 0
+        self.congestion_events = 0
+        self.decreases = 0
+
+    @property
+    def limit(self) -> int:
+        """Current concurrency limit"""
+        return int(self._limit)
+
+    def record(self, latency: float, congested: bool = False):
+        """
+        Feed the outcome of one send into the limit
+
+        Args:
+            latency: Duration of the send in seconds
+            congested: The send failed with a rate limit, server or transport error
+        """
+        with self._lock:
+            self.samples += 1
+            self._since_decrease += 1
+            if congested:
+                self.congestion_events += 1
+                self._decrease()
+                return
+
+            if self._baseline is None or latency < self._baseline:
+                self._baseline = latency
+            else:
+                self._baseline += (latency - self._baseline) * self.BASELINE_DRIFT
+            if self._smoothed is None:
+                self._smoothed = latency
+            else:
+                self._smoothed += (latency - self._smoothed) * self.smoothing
+
+            if self._smoothed > self._baseline * self.latency_tolerance:
+                self._decrease()
+            else:
+                # About +increase per limit's worth of completions, i.e. per round trip
+                self._limit = min(self.max_limit, self._limit + self.increase / self._limit)
+
+    def _decrease(self):
+        # Responses already in flight reflect the old limit; cut at most once per window
+        if self._since_decrease < self._limit:
+            return
+        self._limit = max(self.min_limit, self._limit * self.decrease)
+        self._since_decrease = 0
+        self._smoothed = None
+        self.decreases += 1
+
+    def stats(self) -> dict:
+        """Current limit and the signals behind it"""
+        with self._lock:
+            return {
+                'limit': self.limit,
+                'samples': self.samples,
+                'congestion_events': self.congestion_events,
+                'decreases': self.decreases,
+                'latency': self._smoothed,
+                'baseline_latency': self._baseline,
+            }
+
+    def __repr__(self):
+        return f"AdaptiveLimiter(limit={self.limit}, min_limit={self.min_limit}, max_limit={self.max_limit})"
+
+
+def resolve_window(window: typing.Union[int, AdaptiveLimiter]) -> tuple:
+    """
+    Split a fixed or adaptive window into its parts
+
+    Returns:
+        tuple: ``(limiter, threads, capacity)`` where ``limiter`` is the
+        AdaptiveLimiter or None, ``threads`` the number of worker threads
+        needed and ``capacity`` a callable returning the current window
+    """
+    if isinstance(window, AdaptiveLimiter):
+        return window, window.max_limit, lambda: window.limit
+    window = max(1, window)
+    return None, window, lambda: window
@@ -0,0 +1,149 @@
+"""
+Shoutbox duplicate suppression
+~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains stores that remember which idempotency keys were
+sent recently, so that a retry after a timeout or a message redelivered by
+an at-least-once queue does not send the same email twice.
+
+Pass a store as ``ShoutboxClient(dedupe_store=...)``. A send whose key is
+in the store returns the earlier result without calling the API, and
+concurrent sends of one key wait for the first instead of racing it.
+"""
+
+import collections
+import sqlite3
+import threading
+import time
+import typing
+
+from .results import SendResult
+
+
+class MemoryDedupeStore:
+    """
+    In-memory LRU of recently sent keys
+
+    Args:
+        max_size: Keys kept; the least recently used are dropped first
+        ttl: Seconds a key is remembered
+        clock: Function returning the current time in seconds
+    """
+
+    def __init__(self, max_size: int = 100_000, ttl: float = 24 * 3600, clock: typing.Callable[[], float] = time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.clock = clock
+        # key -> (expires, message id)
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> typing.Optional[str]:
+        """
+        Look up a key
+
+        Returns:
+            str: The message id stored with the key ('' if there was none),
+            or None if the key was not sent within the window
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key: str, message_id: typing.Optional[str] = None):
+        """Remember a sent key"""
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, message_id or '')
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteDedupeStore:
+    """
+    Keys of recently sent emails in SQLite, shared between processes and restarts
+
+    Args:
+        path: Database file, or ``':memory:'``
+        ttl: Seconds a key is remembered
+        clock: Function returning the current Unix time
+    """
+
+    # Expired keys are purged once every this many puts
+    PURGE_INTERVAL = 1000
+
+    def __init__(self, path: str, ttl: float = 24 * 3600, clock: typing.Callable[[], float] = time.time):
+        self.ttl = ttl
+        self.clock = clock
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS sent '
+            '(key TEXT PRIMARY KEY, message_id TEXT NOT NULL, expires REAL NOT NULL)'
+        )
+
+    def get(self, key: str) -> typing.Optional[str]:
+        """Look up a key, see :meth:`MemoryDedupeStore.get`"""
+        with self._lock:
+            row = self._db.execute('SELECT message_id FROM sent WHERE key = ? AND expires > ?',
+                                   (key, self.clock())).fetchone()
+        return row[0] if row else None
+
+    def put(self, key: str, message_id: typing.Optional[str] = None):
+        """Remember a sent key"""
+        now = self.clock()
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO sent VALUES (?, ?, ?)', (key, message_id or '', now + self.ttl))
+            self._puts += 1
+            if self._puts % self.PURGE_INTERVAL == 0:
+                self._db.execute('DELETE FROM sent WHERE expires <= ?', (now,))
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM sent WHERE expires > ?', (self.clock(),)).fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class _SingleFlight:
+    """Runs at most one send per key at a time and skips keys already in the store"""
+
+    def __init__(self, store):
+        self.store = store
+        self._lock = threading.Lock()
+        self._in_flight = {}
+
+    def send(self, key: str, email, send: typing.Callable) -> SendResult:
+        while True:
+            with self._lock:
+                message_id = self.store.get(key)
+                if message_id is not None:
+                    return SendResult(email=email, message_id=message_id or None, attempts=0, duplicate=True)
+                done = self._in_flight.get(key)
+                if done is None:
+                    done = self._in_flight[key] = threading.Event()
+                    break
+            # Another thread is sending this key; use its result, or retry if it failed
+            done.wait()
+
+        try:
+            result = send()
+            self.store.put(key, result.message_id)
+            return result
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            done.set()
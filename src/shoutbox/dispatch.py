@@ -0,0 +1,278 @@
+"""
+Shoutbox priority dispatch
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains a dispatcher that shares one client between
+transactional and bulk mail without the bulk backlog delaying the rest.
+
+Every email is queued in a lane. Lanes are served with weighted fairness
+(stride scheduling): a lane with weight 8 gets eight sends for every one
+of a lane with weight 1 while both have work, and an idle lane leaves its
+share to the others. Lanes can also reserve concurrency that lower
+priority lanes may not use, so a password reset finds a free slot even
+when a campaign has filled the queue.
+"""
+
+import collections
+import threading
+import time
+import typing
+from concurrent.futures import Future
+
+from .models import Email
+from .results import SendResult
+from .stats import LatencyHistogram
+
+
+class Lane:
+    """
+    A priority class of the dispatcher
+
+    Args:
+        name: Lane name used with ``Dispatcher.submit(priority=...)``
+        weight: Share of the send slots while several lanes have work
+        reserved: Slots only this lane and higher priority lanes may use
+        max_depth: Queue length at which ``submit`` blocks, None for unbounded
+    """
+
+    def __init__(self, name: str, weight: float = 1.0, reserved: int = 0, max_depth: typing.Optional[int] = None):
+        if weight <= 0:
+            raise ValueError("Lane weight must be positive")
+        self.name = name
+        self.weight = weight
+        self.reserved = reserved
+        self.max_depth = max_depth
+
+        self.queue = collections.deque()
+        self.in_flight = 0
+        self.submitted = 0
+        self.sent = 0
+        self.failed = 0
+        self.suppressed = 0
+        self.max_queued = 0
+        self.wait_time = LatencyHistogram()
+        self.latency = LatencyHistogram()
+        # Stride scheduling position: the lane with the lowest pass is served next
+        self._pass = 0.0
+
+    def metrics(self) -> dict:
+        """Queue depth, throughput and wait-time percentiles of the lane"""
+        return {
+            'depth': len(self.queue),
+            'max_depth': self.max_queued,
+            'in_flight': self.in_flight,
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'failed': self.failed,
+            'suppressed': self.suppressed,
+            'wait_p50': self.wait_time.percentile(50),
+            'wait_p99': self.wait_time.percentile(99),
+            'wait_max': self.wait_time.max,
+            'latency_p50': self.latency.percentile(50),
+            'latency_p99': self.latency.percentile(99),
+        }
+
+    def __repr__(self):
+        return f"Lane({self.name!r}, weight={self.weight}, reserved={self.reserved})"
+
+
+def default_lanes() -> list:
+    """The ``transactional``, ``default`` and ``bulk`` lanes, highest priority first"""
+    return [
+        Lane('transactional', weight=8, reserved=2),
+        Lane('default', weight=4),
+        Lane('bulk', weight=1),
+    ]
+
+
+class Dispatcher:
+    """
+    Sends emails from priority lanes through one client
+
+    Example:
+        with Dispatcher(client, concurrency=16) as dispatcher:
+            for email in newsletter:
+                dispatcher.submit(email, priority='bulk')
+            ...
+            dispatcher.send(reset_email, priority='transactional')
+
+    Args:
+        client: Client (or anything with a ``send`` method) shared by all lanes
+        concurrency: Number of sends in flight across all lanes
+        lanes: Lanes, highest priority first; defaults to :func:`default_lanes`
+        default_priority: Lane used when ``submit`` is given no priority
+    """
+
+    def __init__(
+        self,
+        client,
+        concurrency: int = 16,
+        lanes: typing.Optional[typing.List[Lane]] = None,
+        default_priority: str = 'default'
+    ):
+        self.client = client
+        self.concurrency = max(1, concurrency)
+        self.lanes = lanes or default_lanes()
+        self._lanes = {lane.name: lane for lane in self.lanes}
+        if default_priority not in self._lanes:
+            raise ValueError(f"Unknown default priority: {default_priority}")
+        if sum(lane.reserved for lane in self.lanes) >= self.concurrency:
+            raise ValueError("Reserved slots must leave at least one shared slot")
+        self.default_priority = default_priority
+
+        lock = threading.Lock()
+        # Workers wait for work, blocked submitters for room in their lane
+        self._work = threading.Condition(lock)
+        self._room = threading.Condition(lock)
+        self._in_flight = 0
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._worker, name=f"shoutbox-dispatch-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, email: Email, priority: typing.Optional[str] = None, block: bool = True) -> Future:
+        """
+        Queue an email
+
+        Args:
+            email: Email to send
+            priority: Lane name; defaults to ``default_priority``
+            block: Wait for room when the lane is at its ``max_depth``
+                instead of raising ``OverflowError``
+
+        Returns:
+            Future: Resolves to the email's :class:`SendResult`; failed sends
+            resolve to a failed result rather than raising
+
+        Raises:
+            ValueError: If the priority is unknown
+            RuntimeError: If the dispatcher is closed
+            OverflowError: If the lane is full and ``block`` is False
+        """
+        lane = self._lane(priority)
+        future = Future()
+        with self._work:
+            while lane.max_depth is not None and len(lane.queue) >= lane.max_depth and not self._closed:
+                if not block:
+                    raise OverflowError(f"Lane {lane.name} is full")
+                self._room.wait()
+            if self._closed:
+                raise RuntimeError("Dispatcher is closed")
+            if not lane.queue and not lane.in_flight:
+                # A lane coming back from idle starts level with the others instead of using saved-up credit
+                lane._pass = max(lane._pass, self._min_pass())
+            lane.queue.append((email, future, time.perf_counter()))
+            lane.submitted += 1
+            lane.max_queued = max(lane.max_queued, len(lane.queue))
+            self._work.notify()
+        return future
+
+    def send(self, email: Email, priority: typing.Optional[str] = None, timeout: typing.Optional[float] = None) -> SendResult:
+        """
+        Send an email through its lane and wait for the result
+
+        Raises:
+            Exception: The send's error, as ``client.send`` would raise it
+        """
+        result = self.submit(email, priority).result(timeout)
+        if result.error is not None:
+            raise result.error
+        return result
+
+    def metrics(self) -> dict:
+        """Per-lane metrics, see :meth:`Lane.metrics`, keyed by lane name"""
+        with self._work:
+            return {lane.name: lane.metrics() for lane in self.lanes}
+
+    def _lane(self, priority: typing.Optional[str]) -> Lane:
+        try:
+            return self._lanes[priority or self.default_priority]
+        except KeyError:
+            raise ValueError(f"Unknown priority: {priority}") from None
+
+    def _min_pass(self) -> float:
+        active = [lane._pass for lane in self.lanes if lane.queue or lane.in_flight]
+        return min(active) if active else 0.0
+
+    def _next_lane(self) -> typing.Optional[Lane]:
+        """Pick the lane to serve next, or None if nothing may start now"""
+        best = None
+        # Free slots held back for higher priority lanes, accumulated while walking down the lanes
+        held = 0
+        for lane in self.lanes:
+            if lane.queue and self._in_flight + held < self.concurrency:
+                if best is None or lane._pass < best._pass:
+                    best = lane
+            held += max(0, lane.reserved - lane.in_flight)
+        return best
+
+    def _worker(self):
+        work = self._work
+        while True:
+            with work:
+                while True:
+                    lane = self._next_lane()
+                    if lane or (self._closed and not any(queued.queue for queued in self.lanes)):
+                        break
+                    work.wait()
+                if lane is None:
+                    return
+                email, future, queued_at = lane.queue.popleft()
+                lane._pass += 1 / lane.weight
+                lane.in_flight += 1
+                self._in_flight += 1
+                self._room.notify_all()
+
+            result = None
+            if future.set_running_or_notify_cancel():
+                started = time.perf_counter()
+                lane.wait_time.record(started - queued_at)
+                try:
+                    result = self.client.send(email)
+                    if not isinstance(result, SendResult):
+                        result = SendResult(body=result)
+                except Exception as e:
+                    result = SendResult('failed', error=e)
+                result.email = email
+                result.latency = time.perf_counter() - started
+                lane.latency.record(result.latency)
+
+            with work:
+                lane.in_flight -= 1
+                self._in_flight -= 1
+                if result is not None:
+                    # Suppressed emails were neither sent nor failed
+                    if result.status == 'suppressed':
+                        lane.suppressed += 1
+                    elif result.ok:
+                        lane.sent += 1
+                    else:
+                        lane.failed += 1
+                # A slot is free again
+                work.notify()
+            if result is not None:
+                future.set_result(result)
+
+    def close(self, wait: bool = True):
+        """
+        Stop accepting emails; queued emails are still sent
+
+        Args:
+            wait: Wait for the queues to drain
+        """
+        with self._work:
+            self._closed = True
+            self._work.notify_all()
+            self._room.notify_all()
+        if wait:
+            for thread in self._threads:
+                thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -0,0 +1,324 @@
+"""
+Shoutbox domain checks
+~~~~~~~~~~~~~~~~~~~~~
+
+This module contains a pre-send check that recipient domains can receive
+mail, so that typo and dead domains fail locally instead of costing an API
+call and a bounce.
+
+A domain is deliverable if it has MX records, or, without MX records, an
+address record (RFC 5321 implicit MX). Domains that do not exist, have no
+records or publish a null MX (RFC 7505) are not. Answers are cached with a
+TTL, shorter for negative answers, so checking a campaign list costs one
+lookup per distinct domain. Resolver failures such as timeouts are treated
+as deliverable: a check that cannot answer never blocks a send.
+
+MX lookups use ``dnspython`` when it is installed (``pip install
+shoutboxnet[dns]``). Without it only address records can be looked up, with
+the system resolver, and a domain without them may still have MX records,
+so that check never finds a domain undeliverable.
+"""
+
+import collections
+import socket
+import threading
+import time
+import typing
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from .models import Email, normalize_address
+from .exceptions import ValidationError
+
+try:
+    import dns.exception
+    import dns.resolver
+except ImportError:  # pragma: no cover
+    dns = None
+
+
+class DomainStatus:
+    """
+    Result of a domain check
+
+    Attributes:
+        domain: The domain, lower-cased and IDNA-encoded
+        deliverable: Whether the domain can receive mail
+        reason: ``'mx'``, ``'a'`` (address record, no MX), ``'null_mx'``,
+            ``'nxdomain'``, ``'no_records'``, or ``'error'`` if the resolver
+            could not answer
+        hosts: Mail exchangers or addresses found
+    """
+
+    __slots__ = ('domain', 'deliverable', 'reason', 'hosts')
+
+    def __init__(self, domain: str, deliverable: bool, reason: str, hosts: typing.Sequence[str] = ()):
+        self.domain = domain
+        self.deliverable = deliverable
+        self.reason = reason
+        self.hosts = tuple(hosts)
+
+    def __bool__(self):
+        return self.deliverable
+
+    def __repr__(self):
+        return f"DomainStatus({self.domain!r}, deliverable={self.deliverable}, reason={self.reason!r})"
+
+
+class DNSPythonResolver:
+    """
+    Looks up MX records, then address records, with ``dnspython``
+
+    Args:
+        timeout: Seconds allowed for each lookup
+    """
+
+    def __init__(self, timeout: float = 3.0):
+        if dns is None:
+            raise ImportError("DNSPythonResolver requires dnspython: pip install shoutboxnet[dns]")
+        self._resolver = dns.resolver.Resolver()
+        self._resolver.lifetime = timeout
+
+    def resolve(self, domain: str) -> DomainStatus:
+        """Check one domain"""
+        try:
+            answer = self._resolver.resolve(domain, 'MX')
+            hosts = [record.exchange.to_text(omit_final_dot=True) for record in answer]
+            if all(host in ('', '.') for host in hosts):
+                return DomainStatus(domain, False, 'null_mx')
+            return DomainStatus(domain, True, 'mx', hosts)
+        except dns.resolver.NXDOMAIN:
+            return DomainStatus(domain, False, 'nxdomain')
+        except dns.resolver.NoAnswer:
+            pass
+        except dns.exception.DNSException:
+            return DomainStatus(domain, True, 'error')
+
+        for rdtype in ('A', 'AAAA'):
+            try:
+                answer = self._resolver.resolve(domain, rdtype)
+                return DomainStatus(domain, True, 'a', [record.to_text() for record in answer])
+            except (dns.resolver.NoAnswer, dns.resolver.NXDOMAIN):
+                continue
+            except dns.exception.DNSException:
+                return DomainStatus(domain, True, 'error')
+        return DomainStatus(domain, False, 'no_records')
+
+
+class SocketResolver:
+    """
+    Looks up address records with the system resolver; used without ``dnspython``
+
+    The system resolver cannot look up MX records, so a domain without
+    address records gets reason ``'error'`` and counts as deliverable.
+    """
+
+    def resolve(self, domain: str) -> DomainStatus:
+        """Check one domain"""
+        try:
+            infos = socket.getaddrinfo(domain, None, proto=socket.IPPROTO_TCP)
+        except (socket.gaierror, UnicodeError):
+            # Not finding an address record says nothing about MX records
+            return DomainStatus(domain, True, 'error')
+        return DomainStatus(domain, True, 'a', sorted({info[4][0] for info in infos}))
+
+
+def default_resolver():
+    """:class:`DNSPythonResolver` if ``dnspython`` is installed, else :class:`SocketResolver`"""
+    return DNSPythonResolver() if dns is not None else SocketResolver()
+
+
+def _address_domain(address: str) -> str:
+    return normalize_address(address).rpartition('@')[2]
+
+
+class DomainValidator:
+    """
+    Cached deliverability checks of recipient domains
+
+    One validator can be shared by several clients and threads. Concurrent
+    checks of a domain that is not cached make a single lookup.
+
+    Example:
+        validator = DomainValidator()
+        client = ShoutboxClient(domain_validator=validator)
+        rows = validator.filter(read_rows('recipients.csv'))
+
+    Args:
+        resolver: Object with a ``resolve(domain)`` method returning a
+            :class:`DomainStatus`; defaults to :func:`default_resolver`
+        ttl: Seconds a deliverable domain is cached
+        negative_ttl: Seconds an undeliverable domain is cached
+        error_ttl: Seconds a failed lookup is cached
+        max_size: Domains cached; the least recently used are dropped first
+        concurrency: Lookups in flight in :meth:`check_many`
+        clock: Function returning the current time in seconds
+    """
+
+    def __init__(
+        self,
+        resolver=None,
+        ttl: float = 3600,
+        negative_ttl: float = 300,
+        error_ttl: float = 30,
+        max_size: int = 100_000,
+        concurrency: int = 16,
+        clock: typing.Callable[[], float] = time.monotonic
+    ):
+        self.resolver = resolver or default_resolver()
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.max_size = max_size
+        self.concurrency = max(1, concurrency)
+        self.clock = clock
+        # domain -> (expires, DomainStatus)
+        self._cache = collections.OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    def _cached(self, domain: str) -> typing.Optional[DomainStatus]:
+        """Cached status of a domain; caller holds the lock"""
+        entry = self._cache.get(domain)
+        if entry is None:
+            return None
+        if entry[0] <= self.clock():
+            del self._cache[domain]
+            return None
+        self._cache.move_to_end(domain)
+        self.hits += 1
+        return entry[1]
+
+    def check(self, domain: str) -> DomainStatus:
+        """
+        Check whether a domain can receive mail
+
+        Args:
+            domain: Domain, or an address whose domain to check
+
+        Returns:
+            DomainStatus: The cached or looked up status
+        """
+        domain = _address_domain('@' + domain)
+        with self._lock:
+            status = self._cached(domain)
+            if status is not None:
+                return status
+            future = self._in_flight.get(domain)
+            owner = future is None
+            if owner:
+                future = self._in_flight[domain] = Future()
+                self.lookups += 1
+        if not owner:
+            return future.result()
+
+        try:
+            status = self.resolver.resolve(domain)
+        except Exception:
+            status = DomainStatus(domain, True, 'error')
+        if status.reason == 'error':
+            ttl = self.error_ttl
+        else:
+            ttl = self.ttl if status.deliverable else self.negative_ttl
+        with self._lock:
+            self._cache[domain] = (self.clock() + ttl, status)
+            self._cache.move_to_end(domain)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+            del self._in_flight[domain]
+        future.set_result(status)
+        return status
+
+    def check_many(self, domains: typing.Iterable[str]) -> typing.Dict[str, DomainStatus]:
+        """
+        Check many domains or addresses, looking up those not cached concurrently
+
+        Returns:
+            dict: Status per distinct domain given
+        """
+        domains = list(dict.fromkeys(domains))
+        with self._lock:
+            results = {domain: self._cached(_address_domain('@' + domain)) for domain in domains}
+        missing = [domain for domain, status in results.items() if status is None]
+        if len(missing) == 1:
+            results[missing[0]] = self.check(missing[0])
+        elif missing:
+            with ThreadPoolExecutor(max_workers=min(self.concurrency, len(missing))) as executor:
+                results.update(zip(missing, executor.map(self.check, missing)))
+        return results
+
+    def is_deliverable(self, address: str) -> bool:
+        """Whether the domain of an address can receive mail"""
+        return self.check(_address_domain(address)).deliverable
+
+    def undeliverable(self, addresses: typing.Iterable[str]) -> list:
+        """Addresses whose domain cannot receive mail, checking each distinct domain once"""
+        addresses = list(addresses)
+        domains = [_address_domain(address) for address in addresses]
+        statuses = self.check_many(domains)
+        return [address for address, domain in zip(addresses, domains) if not statuses[domain]]
+
+    def validate_email(self, email: Email):
+        """
+        Check the domains of an email's recipients
+
+        Raises:
+            ValidationError: If any recipient's domain cannot receive mail
+        """
+        addresses = [addr.email for name in ('to', 'cc', 'bcc') for addr in getattr(email, name) or ()]
+        rejected = self.undeliverable(addresses)
+        if rejected:
+            raise ValidationError(f"Undeliverable recipient domain: {', '.join(rejected)}")
+
+    def filter(
+        self,
+        rows: typing.Iterable,
+        key: typing.Optional[typing.Callable] = None,
+        batch_size: int = 10_000,
+        rejected: typing.Optional[list] = None
+    ) -> typing.Iterator:
+        """
+        Drop rows whose address's domain cannot receive mail
+
+        Rows are read ``batch_size`` at a time and the new domains of each
+        batch are looked up concurrently.
+
+        Args:
+            rows: Addresses, or rows such as the dicts from
+                :func:`shoutbox.bulk.read_rows`
+            key: Function returning the address of a row; defaults to the row
+                itself for strings and ``row['email']`` otherwise
+            batch_size: Rows read per batch
+            rejected: List the dropped rows are appended to
+
+        Yields:
+            Rows with a deliverable domain, in input order
+        """
+        key = key or (lambda row: row if isinstance(row, str) else row['email'])
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                yield from self._filter_batch(batch, key, rejected)
+                batch = []
+        yield from self._filter_batch(batch, key, rejected)
+
+    def _filter_batch(self, batch: list, key: typing.Callable, rejected: typing.Optional[list]) -> typing.Iterator:
+        domains = [_address_domain(key(row)) for row in batch]
+        statuses = self.check_many(domains)
+        for row, domain in zip(batch, domains):
+            if statuses[domain]:
+                yield row
+            elif rejected is not None:
+                rejected.append(row)
+
+    def stats(self) -> dict:
+        """Lookups made, cache hits and cached domains"""
+        with self._lock:
+            return {'lookups': self.lookups, 'hits': self.hits, 'cached': len(self._cache)}
+
+    def clear(self):
+        """Drop every cached answer"""
+        with self._lock:
+            self._cache.clear()
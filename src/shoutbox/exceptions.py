@@ -13,9 +13,33 @@ class ValidationError(ShoutboxError):
     """Raised when input validation fails"""
     pass
 
+class PayloadTooLargeError(ValidationError):
+    """Raised before sending when an email's estimated size is above the transport's limit"""
+    def __init__(self, message: str, size: int = None, limit: int = None):
+        self.size = size
+        self.limit = limit
+        super().__init__(message)
+
+    def __reduce__(self):
+        return self.__class__, (self.args[0], self.size, self.limit)
+
 class APIError(ShoutboxError):
     """Raised when the API returns an error response"""
     def __init__(self, message: str, status_code: int, response_body: dict = None):
         self.status_code = status_code
         self.response_body = response_body
         super().__init__(message)
+
+    def __reduce__(self):
+        # Keep the status code when pickled, e.g. across worker processes
+        return self.__class__, (self.args[0], self.status_code, self.response_body)
+
+class PartialSendError(ShoutboxError):
+    """Raised when only some of the requests of a chunked send succeeded"""
+    def __init__(self, message: str, result=None):
+        # Aggregated SendResult; result.chunks holds the result of every chunk
+        self.result = result
+        super().__init__(message)
+
+    def __reduce__(self):
+        return self.__class__, (self.args[0], self.result)
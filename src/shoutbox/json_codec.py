@@ -0,0 +1,110 @@
+"""
+Shoutbox JSON codecs
+~~~~~~~~~~~~~~~~~~
+
+This module contains the JSON codecs used for API payloads and responses.
+The fastest installed backend is picked automatically: ``orjson``, then
+``ujson``, then the standard library ``json`` module.
+"""
+
+import json
+import typing
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import ujson
+except ImportError:  # pragma: no cover
+    ujson = None
+
+
+class JSONCodec:
+    """Codec backed by the standard library ``json`` module"""
+
+    name = 'json'
+
+    def dumps(self, obj) -> bytes:
+        """Encode an object to compact UTF-8 JSON"""
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    def loads(self, data: typing.Union[bytes, str]):
+        """
+        Decode JSON
+
+        Raises:
+            ValueError: If the data is not valid JSON
+        """
+        return json.loads(data)
+
+    def __repr__(self):
+        return f"<{self.__class__.__name__} {self.name}>"
+
+
+class OrjsonCodec(JSONCodec):
+    """Codec backed by ``orjson``"""
+
+    name = 'orjson'
+
+    def dumps(self, obj) -> bytes:
+        return orjson.dumps(obj)
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+class UjsonCodec(JSONCodec):
+    """Codec backed by ``ujson``"""
+
+    name = 'ujson'
+
+    def dumps(self, obj) -> bytes:
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False).encode()
+
+    def loads(self, data):
+        return ujson.loads(data)
+
+
+_CODECS = {
+    'orjson': (OrjsonCodec, orjson),
+    'ujson': (UjsonCodec, ujson),
+    'json': (JSONCodec, json),
+}
+
+_instances = {}
+
+
+def available_codecs() -> list[str]:
+    """Names of the codecs whose backend is installed, fastest first"""
+    return [name for name, (_, module) in _CODECS.items() if module is not None]
+
+
+def get_codec(codec: typing.Union[str, JSONCodec, None] = None) -> JSONCodec:
+    """
+    Resolve a codec
+
+    Args:
+        codec: A codec instance, a backend name (``'orjson'``, ``'ujson'``,
+            ``'json'``), or None / ``'auto'`` for the fastest installed backend
+
+    Returns:
+        JSONCodec: A shared codec instance
+
+    Raises:
+        ValueError: If the named backend is unknown or not installed
+    """
+    if isinstance(codec, JSONCodec):
+        return codec
+    name = codec or 'auto'
+    if name == 'auto':
+        name = available_codecs()[0]
+    if name not in _CODECS:
+        raise ValueError(f"Unknown JSON codec: {name}")
+    codec_class, module = _CODECS[name]
+    if module is None:
+        raise ValueError(f"JSON codec {name} is not installed")
+    if name not in _instances:
+        _instances[name] = codec_class()
+    return _instances[name]
@@ -0,0 +1,221 @@
+"""
+Shoutbox load generation
+~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the load generator behind ``shoutbox bench``. It drives
+synthetic emails through any client with a ``send`` method at a configured
+concurrency and rate, and records throughput and latency percentiles.
+"""
+
+import random
+import re
+import threading
+import time
+import typing
+
+from .models import Email, Attachment
+from .stats import LatencyHistogram
+
+_SIZE_PATTERN = re.compile(r'^\s*(\d+(?:\.\d+)?)\s*([kmg]?)i?b?\s*$', re.IGNORECASE)
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_size(value: str) -> int:
+    """Parse a size such as ``512``, ``10k`` or ``1.5MB`` into bytes"""
+    match = _SIZE_PATTERN.match(str(value))
+    if not match:
+        raise ValueError(f"Invalid size: {value}")
+    number, unit = match.groups()
+    return int(float(number) * _SIZE_UNITS[unit.lower()])
+
+
+def parse_attachment_mix(value: str) -> list[tuple[int, float]]:
+    """
+    Parse an attachment mix such as ``0:70,10k:20,1m:10``
+
+    Each entry is an attachment size and its relative weight. A size of
+    ``0`` means no attachment.
+
+    Returns:
+        list: ``(size, weight)`` tuples
+    """
+    mix = []
+    for entry in value.split(','):
+        size, _, weight = entry.partition(':')
+        mix.append((parse_size(size), float(weight or 1)))
+    if not mix or sum(weight for _, weight in mix) <= 0:
+        raise ValueError(f"Invalid attachment mix: {value}")
+    return mix
+
+
+def synthetic_email(
+    to: str,
+    from_email: str,
+    payload_size: int = 1024,
+    attachment_size: int = 0
+) -> Email:
+    """Build a synthetic email with an HTML body and optional attachment of the given sizes"""
+    filler = 'x' * max(payload_size - len('<html><p></p></html>'), 0)
+    attachments = []
+    if attachment_size:
+        attachments.append(Attachment(
+            filename=f"synthetic-{attachment_size}.bin",
+            content=random.getrandbits(8 * attachment_size).to_bytes(attachment_size, 'little')
+        ))
+    return Email(
+        to=to,
+        from_email=from_email,
+        subject='Shoutbox load test',
+        html=f"<html><p>{filler}</p></html>",
+        attachments=attachments
+    )
+
+
+class _Pacer:
+    """Hands out send slots, enforcing the request budget, deadline and target rate"""
+
+    def __init__(self, rate: float, requests: typing.Optional[int], deadline: typing.Optional[float]):
+        self._lock = threading.Lock()
+        self._interval = 1.0 / rate if rate else 0.0
+        self._next = time.monotonic()
+        self._remaining = requests
+        self._deadline = deadline
+        self.stopped = threading.Event()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.stopped.is_set():
+                return False
+            if self._remaining is not None:
+                if self._remaining <= 0:
+                    return False
+                self._remaining -= 1
+            slot = self._next
+            self._next = max(self._next, time.monotonic()) + self._interval if self._interval else slot
+        if self._deadline is not None and max(slot, time.monotonic()) >= self._deadline:
+            return False
+        delay = slot - time.monotonic()
+        if delay > 0:
+            if self.stopped.wait(delay):
+                return False
+        return True
+
+
+class LoadGenerator:
+    """
+    Drive emails through a client with bounded concurrency and an optional rate limit
+
+    Args:
+        send: Callable sending one email, usually ``client.send``
+        emails: Zero-argument callable returning the next email to send
+        concurrency: Number of sending threads
+        rate: Target sends per second across all threads (0 for unlimited)
+        requests: Stop after this many sends
+        duration: Stop after this many seconds
+    """
+
+    def __init__(
+        self,
+        send: typing.Callable[[Email], typing.Any],
+        emails: typing.Callable[[], Email],
+        concurrency: int = 1,
+        rate: float = 0,
+        requests: typing.Optional[int] = None,
+        duration: typing.Optional[float] = None
+    ):
+        if requests is None and duration is None:
+            raise ValueError("Either requests or duration must be set")
+        self.send = send
+        self.emails = emails
+        self.concurrency = max(1, concurrency)
+        self.rate = rate
+        self.requests = requests
+        self.duration = duration
+
+        self.latency = LatencyHistogram()
+        self.errors = 0
+        self.last_error = None
+        self.started = None
+        self.finished = None
+        self._lock = threading.Lock()
+        self._pacer = None
+        self._done = None
+        self._running = 0
+
+    @property
+    def completed(self) -> int:
+        return self.latency.count + self.errors
+
+    @property
+    def elapsed(self) -> float:
+        if self.started is None:
+            return 0.0
+        return (self.finished or time.monotonic()) - self.started
+
+    def stop(self):
+        """Ask the running load to stop after in-flight sends finish"""
+        if self._pacer:
+            self._pacer.stopped.set()
+
+    def _worker(self):
+        try:
+            while self._pacer.acquire():
+                email = self.emails()
+                start = time.perf_counter()
+                try:
+                    self.send(email)
+                except Exception as e:
+                    with self._lock:
+                        self.errors += 1
+                        self.last_error = e
+                else:
+                    self.latency.record(time.perf_counter() - start)
+        finally:
+            with self._lock:
+                self._running -= 1
+                if not self._running:
+                    self._done.set()
+
+    def run(self, report: typing.Optional[typing.Callable[['LoadGenerator'], None]] = None, interval: float = 1.0):
+        """
+        Run the load to completion
+
+        Args:
+            report: Called with the generator every ``interval`` seconds while running
+            interval: Seconds between ``report`` calls
+
+        Returns:
+            LoadGenerator: self, for reading the final statistics
+        """
+        self.started = time.monotonic()
+        deadline = self.started + self.duration if self.duration else None
+        self._pacer = _Pacer(self.rate, self.requests, deadline)
+        self._done = threading.Event()
+        self._running = self.concurrency
+
+        for _ in range(self.concurrency):
+            threading.Thread(target=self._worker, daemon=True).start()
+        try:
+            while not self._done.wait(interval):
+                if report:
+                    report(self)
+        except KeyboardInterrupt:
+            self.stop()
+            self._done.wait()
+        self.finished = time.monotonic()
+        return self
+
+    def summary(self) -> dict:
+        """Final statistics as a dict"""
+        elapsed = self.elapsed
+        return {
+            'sent': self.latency.count,
+            'errors': self.errors,
+            'elapsed': elapsed,
+            'throughput': self.completed / elapsed if elapsed else 0.0,
+            'latency_mean': self.latency.mean,
+            'latency_p50': self.latency.percentile(50),
+            'latency_p90': self.latency.percentile(90),
+            'latency_p99': self.latency.percentile(99),
+            'latency_max': self.latency.max,
+        }
@@ -0,0 +1,216 @@
+"""
+Shoutbox raw MIME messages
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains helpers for sending messages that are already
+rendered, such as ``django.core.mail.EmailMessage.message()`` or an
+``email.message.EmailMessage``, without converting them to :class:`Email`.
+
+``SMTPClient.send_raw`` streams such a message to the server as it is.
+The API takes JSON rather than MIME, so ``ShoutboxClient.send_raw`` maps the
+message's headers and parts straight onto the request payload; base64
+attachments are passed through without being decoded and encoded again.
+"""
+
+import base64
+import copy
+import email.parser
+import email.policy
+import io
+import typing
+from email.header import decode_header, make_header
+from email.message import Message
+from email.utils import getaddresses, parseaddr
+
+from .exceptions import ValidationError
+
+# A message as bytes, text, a parsed message or a binary file object
+MessageSource = typing.Union[bytes, str, Message, typing.BinaryIO]
+
+# Headers the API payload carries in its own fields, or that describe the MIME structure
+_PAYLOAD_HEADERS = frozenset((
+    'from', 'sender', 'to', 'cc', 'bcc', 'reply-to', 'subject', 'mime-version',
+    'content-type', 'content-transfer-encoding', 'content-disposition',
+))
+
+
+def parse_message(source: MessageSource) -> Message:
+    """
+    Parse a message from bytes, text or a binary file object
+
+    Returns:
+        Message: The message; a ``Message`` given is returned unchanged
+    """
+    if isinstance(source, Message):
+        return source
+    parser = email.parser.BytesParser(policy=email.policy.default)
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return parser.parsebytes(bytes(source))
+    return parser.parse(source)
+
+
+def read_headers(source: MessageSource) -> typing.Optional[Message]:
+    """
+    Parse only the header block of a message, leaving a file object where it was
+
+    Returns:
+        Message: The headers, or None for a file object that cannot seek
+    """
+    if isinstance(source, Message):
+        return source
+    if isinstance(source, str):
+        source = source.encode('utf-8')
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        stream = io.BytesIO(source)
+    elif source.seekable():
+        stream = source
+    else:
+        return None
+    position = stream.tell()
+    lines = []
+    for line in stream:
+        if line in (b'\r\n', b'\n'):
+            break
+        lines.append(line)
+    stream.seek(position)
+    return email.parser.BytesHeaderParser(policy=email.policy.default).parsebytes(b''.join(lines))
+
+
+def _header(msg: Message, name: str) -> typing.Optional[str]:
+    value = msg.get(name)
+    if value is None:
+        return None
+    # Decodes RFC 2047 encoded words whatever policy the message was parsed with
+    return str(make_header(decode_header(str(value))))
+
+
+def _addresses(msg: Message, *names: str) -> typing.List[str]:
+    values = [str(value) for name in names for value in msg.get_all(name, ())]
+    return [addr for _, addr in getaddresses(values) if addr]
+
+
+def message_envelope(msg: Message) -> typing.Tuple[str, typing.List[str]]:
+    """
+    Envelope sender and recipients from a message's headers
+
+    The sender is taken from ``Sender``, else ``From``; the recipients from
+    ``To``, ``Cc`` and ``Bcc``, each address once.
+
+    Returns:
+        tuple: ``(envelope_from, recipients)``
+    """
+    sender = _addresses(msg, 'Sender') or _addresses(msg, 'From')
+    recipients = list(dict.fromkeys(_addresses(msg, 'To', 'Cc', 'Bcc')))
+    return (sender[0] if sender else ''), recipients
+
+
+def without_bcc(msg: Message) -> Message:
+    """A shallow copy of a message without its ``Bcc`` headers, as ``smtplib.send_message`` sends"""
+    if 'Bcc' not in msg and 'Resent-Bcc' not in msg:
+        return msg
+    msg = copy.copy(msg)
+    del msg['Bcc']
+    del msg['Resent-Bcc']
+    return msg
+
+
+def _part_content(part: Message) -> bytes:
+    return part.get_payload(decode=True) or b''
+
+
+def _part_text(part: Message) -> str:
+    charset = part.get_content_charset() or 'utf-8'
+    try:
+        return _part_content(part).decode(charset, 'replace')
+    except LookupError:
+        return _part_content(part).decode('utf-8', 'replace')
+
+
+def _attachment(part: Message) -> dict:
+    if part.get('Content-Transfer-Encoding', '').strip().lower() == 'base64':
+        # Already base64; only the line breaks are dropped
+        content = ''.join(part.get_payload().split())
+    else:
+        content = base64.b64encode(_part_content(part)).decode()
+    filename = part.get_filename()
+    return {
+        'filename': str(make_header(decode_header(filename))) if filename else 'attachment',
+        'content': content,
+        'content_type': part.get_content_type(),
+    }
+
+
+def message_payload(
+    msg: Message,
+    envelope_from: typing.Optional[str] = None,
+    recipients: typing.Optional[typing.Iterable[str]] = None
+) -> dict:
+    """
+    API payload for a rendered message
+
+    The first ``text/html`` and ``text/plain`` parts that are not attachments
+    become the bodies. Every other leaf part, inline images included,
+    becomes an attachment. Headers the payload has no field for are kept in
+    ``headers``.
+
+    Args:
+        msg: The message
+        envelope_from: Sender address, instead of the ``From`` header's
+        recipients: Addresses to deliver to, instead of the ``To``, ``Cc``
+            and ``Bcc`` headers'; header addresses not listed are dropped and
+            listed addresses not in a header are sent as ``bcc``
+
+    Returns:
+        dict: The payload, without empty fields
+
+    Raises:
+        ValidationError: If no ``To`` address is left to send to
+    """
+    fields = {name: _addresses(msg, header) for name, header in (('to', 'To'), ('cc', 'Cc'), ('bcc', 'Bcc'))}
+    if recipients is not None:
+        wanted = dict.fromkeys(recipients)
+        for name in fields:
+            fields[name] = [addr for addr in fields[name] if addr in wanted]
+            for addr in fields[name]:
+                wanted.pop(addr, None)
+        fields['bcc'].extend(wanted)
+        if not fields['to']:
+            # The API requires a to address; cc addresses are visible anyway
+            fields['to'], fields['cc'] = fields['cc'], []
+    if not fields['to']:
+        raise ValidationError("Message has no To recipient")
+
+    name, sender = parseaddr(_header(msg, 'From') or '')
+    html = text = None
+    attachments = []
+    for part in msg.walk():
+        if part.is_multipart():
+            continue
+        content_type = part.get_content_type()
+        if part.get_content_disposition() != 'attachment':
+            if content_type == 'text/html' and html is None:
+                html = _part_text(part)
+                continue
+            if content_type == 'text/plain' and text is None:
+                text = _part_text(part)
+                continue
+        attachments.append(_attachment(part))
+
+    reply_to = _addresses(msg, 'Reply-To')
+    headers = {key: _header(msg, key) for key in dict.fromkeys(msg.keys()) if key.lower() not in _PAYLOAD_HEADERS}
+    payload = {
+        'to': ','.join(fields['to']),
+        'subject': _header(msg, 'Subject') or '',
+        'html': html,
+        'text': text,
+        'from': envelope_from or sender or None,
+        'name': name or None,
+        'cc': ','.join(fields['cc']) or None,
+        'bcc': ','.join(fields['bcc']) or None,
+        'reply_to': reply_to[0] if reply_to else None,
+        'headers': headers or None,
+        'attachments': attachments or None,
+    }
+    return {k: v for k, v in payload.items() if v is not None}
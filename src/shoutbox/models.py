@@ -6,15 +6,96 @@ This module contains the models used by Shoutbox.
 """
 
 import base64
+import hashlib
+import struct
 import typing
-from dataclasses import dataclass, field
+import uuid
+from dataclasses import FrozenInstanceError, dataclass, field, fields
 from email.utils import parseaddr
+from json.encoder import encode_basestring
 import re
 import os
 import mimetypes
 
 from .exceptions import ValidationError
+from .json_codec import JSONCodec, get_codec
 
+# Internationalised domains are matched in their IDNA (xn--) form, see normalize_address()
+_EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.(?:[a-zA-Z]{2,}|xn--[a-zA-Z0-9-]+)$')
+
+# Run full validation in the from_trusted()/from_dict() constructors too.
+# Meant for tests and debugging; also enabled by SHOUTBOX_VALIDATE_TRUSTED=1.
+validate_trusted = os.getenv('SHOUTBOX_VALIDATE_TRUSTED', '') not in ('', '0')
+
+# Also lower-case the local part of addresses. Mailbox names are case-sensitive
+# by the standard but in practice never at the big providers, so folding them
+# catches more duplicates. Also enabled by SHOUTBOX_FOLD_LOCAL_PART=1.
+fold_local_part = os.getenv('SHOUTBOX_FOLD_LOCAL_PART', '') not in ('', '0')
+
+# Interned EmailAddress objects for repeated sender and reply-to addresses
+_INTERN_LIMIT = 4096
+_interned = {}
+
+
+def _slotted(*extra: str):
+    """
+    Rebuild a dataclass with ``__slots__``
+
+    Equivalent to ``dataclass(slots=True)``, which needs Python 3.10. Slotted
+    instances have no per-instance ``__dict__``, which matters when millions
+    of emails are queued. ``extra`` names private attributes that also need
+    a slot.
+    """
+    def wrap(cls):
+        field_names = tuple(f.name for f in fields(cls))
+        cls_dict = dict(cls.__dict__)
+        cls_dict['__slots__'] = field_names + extra
+        for name in field_names:
+            # Defaults are already bound into the generated __init__
+            cls_dict.pop(name, None)
+        cls_dict.pop('__dict__', None)
+        cls_dict.pop('__weakref__', None)
+        slotted = type(cls)(cls.__name__, cls.__bases__, cls_dict)
+        slotted.__qualname__ = cls.__qualname__
+        return slotted
+    return wrap
+
+
+def normalize_address(address: str, fold_local: typing.Optional[bool] = None) -> str:
+    """
+    Normalise a bare address so equal mailboxes compare equal
+
+    The domain is lower-cased and internationalised domains are converted to
+    their IDNA form (``bücher.de`` becomes ``xn--bcher-kva.de``). The local
+    part is lower-cased too if ``fold_local`` is set, which defaults to the
+    module's ``fold_local_part`` setting.
+
+    Args:
+        address: Address such as ``User@Example.COM``
+        fold_local: Lower-case the local part
+
+    Returns:
+        str: The normalised address; unparseable input is returned stripped
+    """
+    address = address.strip()
+    local, at, domain = address.rpartition('@')
+    if not at:
+        return address
+    fold = fold_local_part if fold_local is None else fold_local
+    if not fold and domain.islower() and domain.isascii():
+        # Already normal, the common case
+        return address
+    if not domain.isascii():
+        try:
+            domain = domain.encode('idna').decode('ascii')
+        except UnicodeError:
+            return address
+    if fold:
+        local = local.lower()
+    return f"{local}@{domain.lower()}"
+
+
+@_slotted()
 @dataclass
 class EmailAddress:
     email: str
@@ -22,6 +103,7 @@ class EmailAddress:
 
     def __post_init__(self):
         name, addr = parseaddr(self.email)
+        addr = normalize_address(addr)
         if not addr or not self._is_valid_email(addr):
             raise ValidationError(f"Invalid email address: {self.email}")
         self.email = addr
@@ -30,24 +112,116 @@ class EmailAddress:
 
     def _is_valid_email(self, email: str) -> bool:
         """Validate email address format"""
-        pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
-        return bool(re.match(pattern, email))
+        return bool(_EMAIL_PATTERN.match(email))
+
+    @classmethod
+    def from_trusted(cls, email: str, name: typing.Optional[str] = None) -> 'EmailAddress':
+        """
+        Create an address from a bare, already validated address without parsing it
+
+        Validation still runs when ``shoutbox.models.validate_trusted`` is set.
+        """
+        if validate_trusted:
+            return cls(email, name)
+        address = object.__new__(cls)
+        object.__setattr__(address, 'email', email)
+        object.__setattr__(address, 'name', name)
+        return address
+
+    @classmethod
+    def intern(cls, value: typing.Union[str, 'EmailAddress']) -> 'EmailAddress':
+        """
+        Return a shared EmailAddress for a frequently repeated address string
+
+        Repeated calls with the same string return the same object, so a sender
+        used on a million queued emails is parsed and stored once. Interned
+        addresses are shared, so they are read-only: setting an attribute
+        raises ``dataclasses.FrozenInstanceError``. Assign a new address to
+        the email instead.
+
+        Args:
+            value: Address string such as ``"News <news@example.com>"``, or an
+                EmailAddress which is returned unchanged
+
+        Returns:
+            EmailAddress: The shared address
+
+        Raises:
+            ValidationError: If the address is invalid
+        """
+        if not isinstance(value, str):
+            return value
+        address = _interned.get(value)
+        if address is None:
+            address = cls(value)
+            if cls is EmailAddress:
+                address.__class__ = _SharedEmailAddress
+            if len(_interned) >= _INTERN_LIMIT:
+                _interned.clear()
+            _interned[value] = address
+        return address
 
     def __str__(self):
         if self.name:
             return f"{self.name} <{self.email}>"
         return self.email
 
+
+class _SharedEmailAddress(EmailAddress):
+    """An interned :class:`EmailAddress`, read-only because many emails hold it"""
+
+    __slots__ = ()
+
+    def __setattr__(self, name, value):
+        raise FrozenInstanceError(
+            f"EmailAddress {self} is interned and shared between emails; assign a new EmailAddress instead"
+        )
+
+    def __eq__(self, other):
+        if isinstance(other, EmailAddress):
+            return (self.email, self.name) == (other.email, other.name)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"EmailAddress(email={self.email!r}, name={self.name!r})"
+
+    def __reduce__(self):
+        # A copy is not shared, so it is a plain, modifiable address
+        return EmailAddress.from_trusted, (self.email, self.name)
+
+@_slotted('_serialized', '_start', '_token')
 @dataclass
 class Attachment:
+    """
+    An email attachment, from ``content`` bytes, a ``filepath`` or a ``stream``
+
+    A ``stream`` is sent without being read into memory: it is read and
+    base64-encoded chunk by chunk while the request body or SMTP message is
+    being sent. It is a binary file object, such as an open file or a Flask
+    upload, or an iterable of bytes chunks, such as an S3 response body.
+    ``size`` is its length in bytes and is needed unless the stream is a
+    seekable file. A seekable stream is rewound for every send, retries
+    included; other streams can be sent once. In ``to_dict()`` a streamed
+    attachment's content is a placeholder that the clients replace.
+    """
+
     filepath: typing.Optional[str] = None
     filename: typing.Optional[str] = None
     content: typing.Optional[bytes] = None
     content_type: typing.Optional[str] = None
+    stream: typing.Optional[typing.Union[typing.BinaryIO, typing.Iterable[bytes]]] = None
+    size: typing.Optional[int] = None
 
     def __post_init__(self):
+        object.__setattr__(self, '_start', None)
+        object.__setattr__(self, '_token', None)
+        if self.stream is not None:
+            self._init_stream()
+            return
         if not self.filepath and not self.content:
-            raise ValidationError("Either filepath or content must be provided")
+            raise ValidationError("Either filepath, content or stream must be provided")
 
         if self.filepath:
             # Load content from file if not provided
@@ -70,13 +244,291 @@ class Attachment:
         if not self.filename:
             raise ValidationError("Filename must be provided when using content directly")
 
+    def _init_stream(self):
+        stream = self.stream
+        if self.filepath or self.content:
+            raise ValidationError("A stream cannot be combined with filepath or content")
+        if not self.filename:
+            # Flask uploads have a filename, open files a name
+            name = getattr(stream, 'filename', None) or getattr(stream, 'name', None)
+            if not isinstance(name, str):
+                raise ValidationError("Filename must be provided when using a stream")
+            self.filename = os.path.basename(name)
+        if not self.content_type:
+            content_type, _ = mimetypes.guess_type(self.filename)
+            self.content_type = content_type or 'application/octet-stream'
+        if hasattr(stream, 'read') and getattr(stream, 'seekable', lambda: False)():
+            start = stream.tell()
+            if self.size is None:
+                self.size = stream.seek(0, os.SEEK_END) - start
+                stream.seek(start)
+            object.__setattr__(self, '_start', start)
+        if self.size is None:
+            raise ValidationError("Size must be provided for a stream that cannot seek")
+        object.__setattr__(self, '_token', uuid.uuid4().hex)
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self.__dataclass_fields__:
+            object.__setattr__(self, '_serialized', None)
+
+    @classmethod
+    def from_trusted(
+        cls,
+        filename: str,
+        content: bytes,
+        content_type: str = 'application/octet-stream',
+        serialized: typing.Optional[dict] = None
+    ) -> 'Attachment':
+        """
+        Create an attachment from known-good values without validation
+
+        Args:
+            filename: Attachment filename
+            content: Raw content
+            content_type: MIME type
+            serialized: Already encoded ``to_dict()`` form of the attachment, reused as is
+        """
+        if validate_trusted:
+            attachment = cls(filename=filename, content=content, content_type=content_type)
+        else:
+            attachment = object.__new__(cls)
+            for name, value in (('filepath', None), ('filename', filename),
+                                ('content', content), ('content_type', content_type),
+                                ('stream', None), ('size', None), ('_start', None), ('_token', None)):
+                object.__setattr__(attachment, name, value)
+        object.__setattr__(attachment, '_serialized', serialized)
+        return attachment
+
+    @property
+    def streamed(self) -> bool:
+        """Whether the content is sent from a stream"""
+        return self.stream is not None
+
+    @property
+    def placeholder(self) -> typing.Optional[str]:
+        """The content of a streamed attachment in ``to_dict()``, None for other attachments"""
+        return f"shoutbox-stream-{self._token}" if self._token else None
+
+    def content_size(self) -> int:
+        """Length of the content in bytes"""
+        return self.size if self.stream is not None else len(self.content)
+
+    def iter_content(self, chunk_size: int = 64 * 1024) -> typing.Iterator[bytes]:
+        """
+        Yield the content in chunks, reading a stream as it goes
+
+        Raises:
+            ValidationError: If a stream does not give ``size`` bytes, for
+                example because it cannot seek and was already sent
+        """
+        stream = self.stream
+        if stream is None:
+            yield self.content
+            return
+        if hasattr(stream, 'read'):
+            if self._start is not None:
+                stream.seek(self._start)
+            chunks = iter(lambda: stream.read(chunk_size), b'')
+        else:
+            chunks = stream
+        total = 0
+        for chunk in chunks:
+            total += len(chunk)
+            yield chunk
+        if total != self.size:
+            raise ValidationError(
+                f"Attachment {self.filename} gave {total} bytes instead of {self.size}; "
+                f"a stream that cannot seek can only be sent once"
+            )
+
+    def iter_base64(self, mime: bool = False) -> typing.Iterator[bytes]:
+        """
+        Yield the content base64-encoded, encoding it as it is read
+
+        Args:
+            mime: Break the output into lines of 76 characters ending in a
+                newline, except the last, as in a MIME part; otherwise it
+                is one unbroken string, as in the API payload
+        """
+        # Whole groups of 3 bytes encode without padding, of 57 bytes to whole lines
+        unit = 57 if mime else 3
+        encode = base64.encodebytes if mime else base64.b64encode
+        buffer = bytearray()
+        # A line break is held back until more lines follow, so the last line has none
+        pending = b''
+        for chunk in self.iter_content():
+            buffer += chunk
+            whole = len(buffer) - len(buffer) % unit
+            if whole:
+                encoded = encode(buffer[:whole])
+                del buffer[:whole]
+                if mime:
+                    yield pending + encoded[:-1]
+                    pending = b'\n'
+                else:
+                    yield encoded
+        if buffer:
+            yield pending + encode(buffer).rstrip(b'\n')
+
     def to_dict(self):
-        return {
-            'filename': self.filename,
-            'content': base64.b64encode(self.content).decode(),
-            'content_type': self.content_type
-        }
+        """Convert attachment to API payload format, encoding the content once"""
+        data = self._serialized
+        if data is None:
+            data = {
+                'filename': self.filename,
+                'content': self.placeholder or base64.b64encode(self.content).decode(),
+                'content_type': self.content_type
+            }
+            object.__setattr__(self, '_serialized', data)
+        return data
+
+def _splice_streams(data: bytes, attachments: typing.Iterable[Attachment], mime: bool = False) -> typing.Iterator[bytes]:
+    """Yield encoded data with the placeholders of streamed attachments replaced by their encoded content"""
+    for attachment in attachments:
+        if attachment.stream is not None:
+            head, _, data = data.partition(attachment.placeholder.encode())
+            yield head
+            yield from attachment.iter_base64(mime)
+    yield data
+
+
+def _normalize_recipients(value):
+    """Convert a recipient field to a list of EmailAddress objects"""
+    if isinstance(value, str):
+        return [EmailAddress(value)]
+    if isinstance(value, list):
+        return [EmailAddress(addr) if isinstance(addr, str) else addr for addr in value]
+    if isinstance(value, EmailAddress):
+        return [value]
+    return value
+
+
+def _normalize_address(value):
+    """Convert a single address field to a (shared) EmailAddress object"""
+    if isinstance(value, str):
+        return EmailAddress.intern(value)
+    return value
+
+
+def _trusted_recipients(value):
+    if isinstance(value, str):
+        return [EmailAddress.from_trusted(value)]
+    if isinstance(value, EmailAddress):
+        return [value]
+    if value:
+        return [EmailAddress.from_trusted(addr) if isinstance(addr, str) else addr for addr in value]
+    return value
+
+
+def _unique_recipients(to, cc, bcc) -> typing.Optional[tuple]:
+    """
+    Drop repeated addresses across to, cc and bcc, keeping the most visible
+
+    Returns:
+        tuple: New ``(to, cc, bcc)``, or None if there were no repeats
+    """
+    if not cc and not bcc and len(to) < 2:
+        return None
+    seen = set()
+    fields = []
+    repeated = False
+    for addrs in (to, cc, bcc):
+        if addrs:
+            unique = []
+            for addr in addrs:
+                if addr.email in seen:
+                    repeated = True
+                else:
+                    seen.add(addr.email)
+                    unique.append(addr)
+            if len(unique) != len(addrs):
+                addrs = unique
+        fields.append(addrs)
+    if not repeated:
+        return None
+    to, cc, bcc = fields
+    return to, cc or None, bcc or None
+
+
+def _split_emails(value):
+    return [EmailAddress.from_trusted(addr) for addr in value.split(',')] if value else None
+
+
+def _join_emails(addresses):
+    return ','.join([addr.email for addr in addresses]) if addresses else None
+
+
+_PART_SIZE = struct.Struct('<Q')
+_NONE_PART = b'\xff' * 8
+
+# Fixed MIME overhead: multipart and part headers, boundaries, Date and Message-ID
+_MIME_OVERHEAD = 400
+_MIME_PART_OVERHEAD = 160
+
+
+def _json_string_size(value: str) -> int:
+    """Bytes of a string encoded as a JSON string, with non-ASCII characters as raw UTF-8"""
+    if value.isascii() and value.isprintable():
+        # Only quotes and backslashes need escaping
+        return len(value) + 2 + value.count('"') + value.count('\\')
+    encoded = encode_basestring(value)
+    return len(encoded) if encoded.isascii() else len(encoded.encode('utf-8'))
+
+
+def _base64_size(size: int) -> int:
+    return (size + 2) // 3 * 4
+
+
+def _mime_base64_size(size: int) -> int:
+    """Bytes of base64 content in a MIME part, in lines of 76 characters and CRLF"""
+    encoded = _base64_size(size)
+    return encoded + (encoded + 75) // 76 * 2
+
+
+def _mime_header_size(value: str) -> int:
+    """Bytes of a header value as folded, with non-ASCII text in RFC 2047 encoded words"""
+    if value.isascii():
+        # Folding adds a CRLF and an indent about every 70 characters
+        return len(value) + len(value) // 70 * 3
+    # Base64 encoded words, =?utf-8?b?...?=, of at most 75 characters, one per folded line.
+    # A word carries at most 45 bytes but is cut early so characters are not split.
+    size = len(value.encode('utf-8'))
+    words = -(-size // 40)
+    return _base64_size(size) + words * (len('=?utf-8?b??=') + 3 + 4)
+
+
+def _mime_text_size(value: str) -> int:
+    if value.isascii():
+        # Sent as 7bit, with bare newlines turned into CRLF
+        return len(value) + value.count('\n')
+    return _mime_base64_size(len(value.encode('utf-8')))
+
 
+# Serialised payload fragments, keyed by payload key, and the fields they depend on
+_FRAGMENT_BUILDERS = {
+    'to': lambda email: ','.join([addr.email for addr in email.to]),
+    'cc': lambda email: _join_emails(email.cc),
+    'bcc': lambda email: _join_emails(email.bcc),
+    'from': lambda email: email.from_email.email if email.from_email else None,
+    'name': lambda email: email.from_email.name or None if email.from_email else None,
+    'reply_to': lambda email: email.reply_to.email if email.reply_to else None,
+    'attachments': lambda email: [att.to_dict() for att in email.attachments] if email.attachments else None,
+}
+
+_FRAGMENT_FIELDS = {
+    'to': ('to',),
+    'cc': ('cc',),
+    'bcc': ('bcc',),
+    'from_email': ('from', 'name'),
+    'reply_to': ('reply_to',),
+    'attachments': ('attachments',),
+}
+
+# Fields holding a list or dict, whose contents can change without the field being assigned
+_CONTAINER_FIELDS = ('to', 'cc', 'bcc', 'headers', 'attachments')
+
+@_slotted('_fragments', '_payload', '_json', '_sizes', '_contents')
 @dataclass
 class Email:
     to: typing.Union[str, list[str], EmailAddress, list[EmailAddress]]
@@ -89,71 +541,506 @@ class Email:
     reply_to: typing.Optional[typing.Union[str, EmailAddress]] = None
     headers: typing.Optional[dict] = field(default_factory=dict)
     attachments: typing.Optional[list[Attachment]] = field(default_factory=list)
+    idempotency_key: typing.Optional[str] = None
 
     def __post_init__(self):
         # Convert string emails to EmailAddress objects
-        if isinstance(self.to, str):
-            self.to = [EmailAddress(self.to)]
-        elif isinstance(self.to, list):
-            self.to = [EmailAddress(addr) if isinstance(addr, str) else addr for addr in self.to]
-        elif isinstance(self.to, EmailAddress):
-            self.to = [self.to]
+        self.to = _normalize_recipients(self.to)
 
         if self.cc:
-            if isinstance(self.cc, str):
-                self.cc = [EmailAddress(self.cc)]
-            elif isinstance(self.cc, list):
-                self.cc = [EmailAddress(addr) if isinstance(addr, str) else addr for addr in self.cc]
-            elif isinstance(self.cc, EmailAddress):
-                self.cc = [self.cc]
-            
+            self.cc = _normalize_recipients(self.cc)
+
         if self.bcc:
-            if isinstance(self.bcc, str):
-                self.bcc = [EmailAddress(self.bcc)]
-            elif isinstance(self.bcc, list):
-                self.bcc = [EmailAddress(addr) if isinstance(addr, str) else addr for addr in self.bcc]
-            elif isinstance(self.bcc, EmailAddress):
-                self.bcc = [self.bcc]
-
-        if isinstance(self.from_email, str):
-            self.from_email = EmailAddress(self.from_email)
-        
-        if isinstance(self.reply_to, str):
-            self.reply_to = EmailAddress(self.reply_to)
+            self.bcc = _normalize_recipients(self.bcc)
+
+        self.from_email = _normalize_address(self.from_email)
+        self.reply_to = _normalize_address(self.reply_to)
+
+        self._check_recipients()
+        unique = _unique_recipients(self.to, self.cc, self.bcc)
+        if unique:
+            self.to, self.cc, self.bcc = unique
+
+        self._check_content()
+
+        # Serialised payload fragments and the memoised payload, see to_dict()
+        self._fragments = None
+        self._payload = None
+        self._json = None
+        self._sizes = None
+        self._contents = None
+
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in _EMAIL_FIELDS:
+            self._invalidate(name)
+
+    def _invalidate(self, name: str):
+        try:
+            fragments = self._fragments
+        except AttributeError:
+            return  # still in __init__
+        # Drop cached serialisations derived from a changed field
+        object.__setattr__(self, '_payload', None)
+        object.__setattr__(self, '_json', None)
+        object.__setattr__(self, '_sizes', None)
+        if fragments:
+            for key in _FRAGMENT_FIELDS.get(name, ()):
+                fragments.pop(key, None)
+
+    def _contents_key(self) -> tuple:
+        """What the list and dict fields hold, in the order of ``_CONTAINER_FIELDS``"""
+        return (
+            tuple(self.to or ()),
+            tuple(self.cc or ()),
+            tuple(self.bcc or ()),
+            tuple(self.headers.items()) if self.headers else (),
+            tuple((att.filename, att.content_type, att.content, att.stream) for att in self.attachments or ()),
+        )
+
+    def _check_contents(self):
+        """
+        Drop cached serialisations of list and dict fields changed in place
+
+        The fields' items are compared with those seen when the caches were
+        last used. Unchanged items are the same objects, so this costs a
+        pointer comparison per recipient, header and attachment.
+        """
+        key = self._contents_key()
+        previous = self._contents
+        if key == previous:
+            return
+        object.__setattr__(self, '_contents', key)
+        for i, name in enumerate(_CONTAINER_FIELDS):
+            if previous is None or key[i] != previous[i]:
+                self._invalidate(name)
+
+    @classmethod
+    def from_trusted(
+        cls,
+        to: typing.Union[str, list[str], EmailAddress, list[EmailAddress]],
+        subject: str,
+        html: typing.Optional[str] = None,
+        text: typing.Optional[str] = None,
+        cc: typing.Optional[typing.Union[str, list[str], EmailAddress, list[EmailAddress]]] = None,
+        bcc: typing.Optional[typing.Union[str, list[str], EmailAddress, list[EmailAddress]]] = None,
+        from_email: typing.Optional[typing.Union[str, EmailAddress]] = None,
+        reply_to: typing.Optional[typing.Union[str, EmailAddress]] = None,
+        headers: typing.Optional[dict] = None,
+        attachments: typing.Optional[list[Attachment]] = None,
+        idempotency_key: typing.Optional[str] = None
+    ) -> 'Email':
+        """
+        Create an email from already validated data without re-validating it
+
+        Use this for data that was validated before, such as recipients from
+        your own database or emails read back from your own queue. Recipient
+        strings must be bare addresses (``user@example.com``); they are not
+        parsed or checked. Sender and reply-to strings are interned, see
+        :meth:`EmailAddress.intern`.
+
+        When ``shoutbox.models.validate_trusted`` is set (or the
+        ``SHOUTBOX_VALIDATE_TRUSTED=1`` environment variable), this runs the
+        normal constructor with full validation instead, which is useful in tests.
+
+        Returns:
+            Email: The email
+        """
+        if validate_trusted:
+            return cls(to, subject, html, text, cc, bcc, from_email, reply_to,
+                       headers if headers is not None else {},
+                       attachments if attachments is not None else [],
+                       idempotency_key)
+
+        email = object.__new__(cls)
+        values = (
+            ('to', _trusted_recipients(to)),
+            ('subject', subject),
+            ('html', html),
+            ('text', None if html else text),
+            ('cc', _trusted_recipients(cc)),
+            ('bcc', _trusted_recipients(bcc)),
+            ('from_email', EmailAddress.intern(from_email) if from_email else from_email),
+            ('reply_to', EmailAddress.intern(reply_to) if reply_to else reply_to),
+            ('headers', headers if headers is not None else {}),
+            ('attachments', attachments if attachments is not None else []),
+            ('idempotency_key', idempotency_key),
+            ('_fragments', None),
+            ('_payload', None),
+            ('_json', None),
+            ('_sizes', None),
+            ('_contents', None),
+        )
+        for name, value in values:
+            object.__setattr__(email, name, value)
+        return email
+
+    @classmethod
+    def from_dict(cls, payload: dict) -> 'Email':
+        """
+        Rebuild an email from its ``to_dict()`` payload without re-validating it
+
+        Attachments are decoded from base64 and keep their encoded form, so
+        serialising the email again does not re-encode them. Validation can be
+        turned back on like for :meth:`from_trusted`.
+
+        Args:
+            payload: Payload produced by ``to_dict()``
+
+        Returns:
+            Email: The email
+        """
+        from_email = None
+        if payload.get('from'):
+            from_email = EmailAddress.from_trusted(payload['from'], payload.get('name'))
+        reply_to = payload.get('reply_to')
+        attachments = [
+            Attachment.from_trusted(
+                att['filename'],
+                base64.b64decode(att['content']),
+                att.get('content_type') or 'application/octet-stream',
+                serialized=dict(att)
+            )
+            for att in payload.get('attachments') or ()
+        ]
+        return cls.from_trusted(
+            to=_split_emails(payload.get('to')) or [],
+            subject=payload.get('subject'),
+            html=payload.get('html'),
+            text=payload.get('text'),
+            cc=_split_emails(payload.get('cc')),
+            bcc=_split_emails(payload.get('bcc')),
+            from_email=from_email,
+            reply_to=EmailAddress.from_trusted(reply_to) if reply_to else None,
+            headers=dict(payload['headers']) if payload.get('headers') else {},
+            attachments=attachments
+        )
+
+    def __getstate__(self):
+        # Pickle the fields only; caches are rebuilt on demand
+        return {name: getattr(self, name) for name in _EMAIL_FIELDS}
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_fragments', None)
+        object.__setattr__(self, '_payload', None)
+        object.__setattr__(self, '_json', None)
+        object.__setattr__(self, '_sizes', None)
+        object.__setattr__(self, '_contents', None)
+
+    def _check_recipients(self):
+        for name in ('to', 'cc', 'bcc'):
+            addrs = getattr(self, name)
+            if addrs and not (isinstance(addrs, list) and all(isinstance(addr, EmailAddress) for addr in addrs)):
+                raise ValidationError(f"Invalid {name} recipients: {addrs!r}")
+        if not self.to:
+            raise ValidationError("Email must have at least one to recipient")
+
+    def _check_content(self):
+        if self.text and self.html:
+            self.text = None
 
-        if self.text and self.html: 
-            self.text = None    
-        
         if not self.html and not self.text:
             raise ValidationError("Email must have either HTML or text content")
 
+    def derive_idempotency_key(self) -> str:
+        """
+        Idempotency key derived from the recipients and content
+
+        Emails with the same sender, recipients, subject, bodies, headers and
+        attachments get the same key, so a send repeated after a timeout or
+        redelivered by a queue is recognised as a duplicate. Streamed
+        attachments are not read for this, so the key of an email with one
+        is only repeated for the same ``Attachment`` object.
+
+        Returns:
+            str: Hex SHA-256 digest
+        """
+        self._check_contents()
+        digest = hashlib.sha256()
+        update = digest.update
+
+        def part(value):
+            # Length-prefixed so adjacent values cannot run into each other
+            if value is None:
+                update(_NONE_PART)
+                return
+            if isinstance(value, str):
+                value = value.encode()
+            update(_PART_SIZE.pack(len(value)))
+            update(value)
+
+        fragment = self._fragment
+        for key in ('to', 'cc', 'bcc', 'from', 'reply_to'):
+            part(fragment(key))
+        part(self.subject)
+        part(self.html)
+        part(self.text)
+        for name, value in sorted((self.headers or {}).items()):
+            part(name)
+            part(str(value))
+        for attachment in self.attachments or ():
+            part(attachment.filename)
+            part(attachment.content_type)
+            # A stream is not read to derive the key; each streamed attachment keys apart
+            part(attachment.content if attachment.stream is None else attachment.placeholder)
+        return digest.hexdigest()
+
+    def recipient_count(self) -> int:
+        """Number of to, cc and bcc recipients"""
+        return sum(len(addrs) for addrs in (self.to, self.cc, self.bcc) if addrs)
+
+    def estimated_size(self, transport: str = 'api') -> int:
+        """
+        Size of the encoded email in bytes, computed without encoding it
+
+        For the API this is the size of the JSON request body: exact for
+        ASCII text, and for other text as sent by codecs that write UTF-8
+        (``orjson``; the ``json`` codec escapes it, which is larger).
+        Attachments are counted at their base64 size from their raw length.
+        For SMTP it is the size of the MIME message to within a few hundred
+        bytes, rounded up rather than down, counting non-ASCII headers as
+        RFC 2047 encoded words. Text is scanned for characters that need escaping; attachments
+        are only measured. The estimate is cached until a field changes.
+
+        Args:
+            transport: ``'api'`` or ``'smtp'``
+
+        Returns:
+            int: Estimated size in bytes
+
+        Raises:
+            ValueError: If the transport is unknown
+        """
+        self._check_contents()
+        sizes = self._sizes
+        if sizes is None:
+            sizes = {}
+            object.__setattr__(self, '_sizes', sizes)
+        size = sizes.get(transport)
+        if size is None:
+            size = sizes[transport] = self._estimate_size(transport)
+        return size
+
+    def _estimate_size(self, transport: str) -> int:
+        recipients = [addrs for addrs in (self.to, self.cc, self.bcc) if addrs]
+        attachments = self.attachments or ()
+        if transport == 'api':
+            # {"key":value,...}; every address list is one comma-separated string
+            size = 1 + sum(len(key) + 4 + sum(len(addr.email) + 1 for addr in addrs) + 1
+                           for key, addrs in zip(('to', 'cc', 'bcc'), (self.to, self.cc, self.bcc)) if addrs)
+            for key, value in (('subject', self.subject), ('html', self.html), ('text', self.text),
+                               ('from', self.from_email.email if self.from_email else None),
+                               ('name', self.from_email.name if self.from_email else None),
+                               ('reply_to', self.reply_to.email if self.reply_to else None)):
+                if value:
+                    size += len(key) + 4 + _json_string_size(value)
+            if self.headers:
+                size += 12 + 2 * len(self.headers) + sum(
+                    _json_string_size(str(key)) + _json_string_size(str(value)) for key, value in self.headers.items()
+                )
+            if attachments:
+                # "attachments":[{"filename":...,"content":...,"content_type":...},...]
+                size += 16 + len(attachments) + sum(
+                    42 + _json_string_size(att.filename) + _base64_size(att.content_size()) +
+                    _json_string_size(att.content_type)
+                    for att in attachments
+                )
+            return size
+        if transport == 'smtp':
+            size = _MIME_OVERHEAD + _mime_header_size(self.subject)
+            # Bcc is not a header, but the envelope is counted with it
+            size += sum(_mime_header_size(', '.join(str(addr) for addr in addrs)) + 6 for addrs in recipients)
+            if self.from_email:
+                size += _mime_header_size(str(self.from_email)) + 8
+            if self.reply_to:
+                size += _mime_header_size(str(self.reply_to)) + 12
+            if self.headers:
+                size += sum(len(str(key)) + _mime_header_size(str(value)) + 4 for key, value in self.headers.items())
+            size += _mime_text_size(self.html or self.text or '')
+            for attachment in attachments:
+                # A non-ASCII filename is percent-encoded (RFC 2231)
+                filename = len(attachment.filename) if attachment.filename.isascii() else \
+                    3 * len(attachment.filename.encode('utf-8')) + 9
+                size += _MIME_PART_OVERHEAD + 2 * filename + len(attachment.content_type)
+                size += _mime_base64_size(attachment.content_size())
+            return size
+        raise ValueError(f"Unknown transport: {transport}")
+
+    def split_recipients(self, max_recipients: int) -> list:
+        """
+        Split the email into copies with at most ``max_recipients`` recipients each
+
+        Recipients keep their field (to, cc or bcc), so a recipient never sees
+        addresses that were not visible to them before. A copy that only has
+        cc or bcc recipients is addressed to the sender, like a mail merge
+        to undisclosed recipients. Copies of an email with an idempotency key
+        get the key suffixed with ``:1``, ``:2``, ...
+
+        Args:
+            max_recipients: Recipients per copy
+
+        Returns:
+            list: The copies, or just this email if it is small enough
+
+        Raises:
+            ValueError: If ``max_recipients`` is below 1
+            ValidationError: If a copy needs the sender as recipient but
+                the email has no ``from_email``
+        """
+        if max_recipients < 1:
+            raise ValueError("max_recipients must be at least 1")
+        if self.recipient_count() <= max_recipients:
+            return [self]
+
+        recipients = [(name, addr) for name in ('to', 'cc', 'bcc') for addr in getattr(self, name) or ()]
+        chunks = []
+        for start in range(0, len(recipients), max_recipients):
+            fields = {'to': [], 'cc': [], 'bcc': []}
+            for name, addr in recipients[start:start + max_recipients]:
+                fields[name].append(addr)
+            if not fields['to']:
+                if not self.from_email:
+                    raise ValidationError("Splitting cc/bcc recipients requires a from_email to address the copies to")
+                fields['to'] = [self.from_email]
+            changes = {name: value or None for name, value in fields.items()}
+            if self.idempotency_key is not None:
+                changes['idempotency_key'] = f"{self.idempotency_key}:{len(chunks) + 1}"
+            chunks.append(self.with_overrides(**changes))
+        return chunks
+
+    def _fragment(self, key: str):
+        fragments = self._fragments
+        if fragments is None:
+            fragments = {}
+            object.__setattr__(self, '_fragments', fragments)
+        try:
+            return fragments[key]
+        except KeyError:
+            value = fragments[key] = _FRAGMENT_BUILDERS[key](self)
+            return value
+
+    def with_overrides(self, **changes) -> 'Email':
+        """
+        Create a variant of this email with some fields replaced
+
+        The variant shares every unchanged field with this email by reference,
+        including attachments, and also shares its serialised payload fragments,
+        so only the overridden fields are validated and re-serialised.
+
+        The idempotency key is not shared: a variant is a different email, so
+        it has no key unless ``idempotency_key`` is given with the changes.
+
+        Example:
+            for row in rows:
+                client.send(base.with_overrides(to=row['email'], subject=row['subject']))
+
+        Args:
+            **changes: New values for any of the email fields
+
+        Returns:
+            Email: The derived email
+
+        Raises:
+            ValidationError: If an overridden field is invalid
+            TypeError: If an unknown field is given
+        """
+        unknown = set(changes).difference(_EMAIL_FIELDS)
+        if unknown:
+            raise TypeError(f"Unknown Email fields: {', '.join(sorted(unknown))}")
+
+        # Serialise the shared parts once so every variant can reuse them
+        self._check_contents()
+        for key in _FRAGMENT_BUILDERS:
+            self._fragment(key)
+
+        variant = object.__new__(type(self))
+        for name in _EMAIL_FIELDS:
+            object.__setattr__(variant, name, getattr(self, name))
+        # Sharing the key would make the variant a duplicate of this email
+        object.__setattr__(variant, 'idempotency_key', None)
+        fragments = dict(self._fragments)
+        for name in changes:
+            for key in _FRAGMENT_FIELDS.get(name, ()):
+                del fragments[key]
+        object.__setattr__(variant, '_fragments', fragments)
+        object.__setattr__(variant, '_payload', None)
+        object.__setattr__(variant, '_json', None)
+        object.__setattr__(variant, '_sizes', None)
+        # Overridden fields differ from the key, and their fragments are already dropped
+        object.__setattr__(variant, '_contents', self._contents)
+
+        for name, value in changes.items():
+            if name in ('to', 'cc', 'bcc'):
+                value = _normalize_recipients(value) if value or name == 'to' else value
+            elif name in ('from_email', 'reply_to'):
+                value = _normalize_address(value)
+            object.__setattr__(variant, name, value)
+        if 'to' in changes or 'cc' in changes or 'bcc' in changes:
+            variant._check_recipients()
+            unique = _unique_recipients(variant.to, variant.cc, variant.bcc)
+            if unique:
+                for name, value in zip(('to', 'cc', 'bcc'), unique):
+                    if value is not getattr(variant, name):
+                        object.__setattr__(variant, name, value)
+                        fragments.pop(name, None)
+        if 'html' in changes or 'text' in changes:
+            variant._check_content()
+        return variant
+
     def to_dict(self) -> dict:
-        """Convert email to API payload format"""
+        """
+        Convert email to API payload format
+
+        The payload is computed once and reused until a field changes,
+        whether it is assigned or a list or dict is changed in place. Treat
+        the returned dict as read-only; copy it before modifying it.
+        """
+        self._check_contents()
+        return self._cached_payload()
+
+    def _cached_payload(self) -> dict:
+        payload = self._payload
+        if payload is None:
+            payload = self._build_payload()
+            object.__setattr__(self, '_payload', payload)
+        return payload
+
+    def to_json(self, codec: typing.Optional[JSONCodec] = None) -> bytes:
+        """
+        Convert email to the JSON request body, encoding it once
+
+        Args:
+            codec: JSON codec to encode with; defaults to the fastest installed backend
+        """
+        codec = codec or get_codec()
+        self._check_contents()
+        cached = self._json
+        if cached is None or cached[0] is not codec:
+            cached = (codec, codec.dumps(self._cached_payload()))
+            object.__setattr__(self, '_json', cached)
+        return cached[1]
+
+    def _build_payload(self) -> dict:
+        fragment = self._fragment
         payload = {
-            'to': ','.join([addr.email for addr in self.to]),
+            'to': fragment('to'),
             'subject': self.subject,
             'html': self.html,
-            'from': self.from_email.email if self.from_email else None
+            'text': self.text,
+            'from': fragment('from'),
+            # Add optional fields only if they have values
+            'name': fragment('name'),
+            'cc': fragment('cc'),
+            'bcc': fragment('bcc'),
+            'reply_to': fragment('reply_to'),
+            'headers': self.headers or None,
+            'attachments': fragment('attachments'),
         }
 
-        # Add optional fields only if they have values
-        if self.from_email and self.from_email.name:
-            payload['name'] = self.from_email.name
-        
-        if self.cc: 
-            payload['cc'] = ','.join([addr.email for addr in self.cc])
-
-        if self.bcc:
-            payload['bcc'] = ','.join([addr.email for addr in self.bcc])
-            
-        if self.reply_to:
-            payload['reply_to'] = self.reply_to.email
-        
-        if self.headers:
-            payload['headers'] = self.headers
-            
-        if self.attachments:
-            payload['attachments'] = [att.to_dict() for att in self.attachments]
-
         # Remove None values
         return {k: v for k, v in payload.items() if v is not None}
+
+
+_EMAIL_FIELDS = tuple(f.name for f in fields(Email))
@@ -0,0 +1,300 @@
+"""
+Shoutbox multiprocess sending
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains a sender that spreads encoding and sending over
+several worker processes, for campaigns where base64, MIME and JSON
+encoding keep one core busy under the GIL.
+
+Emails are handed to the workers in batches using the binary format from
+:mod:`shoutbox.serialization`. Large attachment contents are placed in
+shared memory once and only referenced from the batches, so an attachment
+shared by every email of a campaign is not copied through the pipe for
+each of them.
+"""
+
+import os
+import time
+import typing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # pragma: no cover - Python < 3.8
+    shared_memory = None
+
+from . import serialization
+from .models import Email, Attachment
+from .results import SendResult
+from .exceptions import ShoutboxError
+
+# Attachment contents cached per worker, by shared memory segment name
+_SEGMENT_CACHE = 32
+
+# State of the current worker process, set up by _init_worker()
+_worker = None
+
+
+class _Worker:
+    """Client and thread pool owned by one worker process"""
+
+    def __init__(self, client_factory: typing.Callable, concurrency: int):
+        self.client = client_factory()
+        self.executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        self.contents = {}
+
+    def content(self, name: str, size: int) -> bytes:
+        content = self.contents.get(name)
+        if content is None:
+            segment = shared_memory.SharedMemory(name=name)
+            try:
+                content = bytes(segment.buf[:size])
+            finally:
+                segment.close()
+            if len(self.contents) >= _SEGMENT_CACHE:
+                self.contents.clear()
+            self.contents[name] = content
+        return content
+
+    def send(self, email: Email) -> SendResult:
+        start = time.perf_counter()
+        try:
+            result = self.client.send(email)
+            if not isinstance(result, SendResult):
+                result = SendResult(body=result)
+        except Exception as e:
+            # Client errors are ShoutboxErrors, which pickle back to the parent
+            error = e if isinstance(e, ShoutboxError) else ShoutboxError(f"Unexpected error: {e}")
+            result = SendResult('failed', error=error)
+        # The parent process still holds the email
+        result.email = None
+        result.latency = time.perf_counter() - start
+        return result
+
+
+def _init_worker(client_factory: typing.Callable, concurrency: int):
+    global _worker
+    _worker = _Worker(client_factory, concurrency)
+
+
+def _send_batch(data: bytes, shared: list) -> list:
+    """Worker task: decode a batch, restore shared attachments and send it"""
+    emails = serialization.loads_many(data)
+    for email_index, attachment_index, name, size in shared:
+        emails[email_index].attachments[attachment_index].content = _worker.content(name, size)
+    if _worker.executor:
+        return list(_worker.executor.map(_worker.send, emails))
+    return [_worker.send(email) for email in emails]
+
+
+class _Segments:
+    """Shared memory segments holding large attachment contents, reference counted per batch"""
+
+    def __init__(self):
+        # id(content) -> [segment, content, batches using it]
+        self._segments = {}
+
+    def acquire(self, content: bytes) -> tuple:
+        entry = self._segments.get(id(content))
+        if entry is None:
+            segment = shared_memory.SharedMemory(create=True, size=len(content))
+            segment.buf[:len(content)] = content
+            # Keep the content alive so its id is not reused while the segment exists
+            entry = self._segments[id(content)] = [segment, content, 0]
+        entry[2] += 1
+        return entry[0].name, len(content)
+
+    def release(self, contents: list):
+        for content in contents:
+            entry = self._segments[id(content)]
+            entry[2] -= 1
+            if not entry[2]:
+                del self._segments[id(content)]
+                entry[0].close()
+                entry[0].unlink()
+
+    def close(self):
+        for segment, _, _ in self._segments.values():
+            segment.close()
+            segment.unlink()
+        self._segments.clear()
+
+
+class ProcessPoolSender:
+    """
+    Sends a stream of emails from several worker processes
+
+    Every worker builds its own client with ``client_factory`` and sends
+    with up to ``concurrency`` threads, so encoding runs in parallel across
+    processes and network waits overlap within each process.
+
+    Example:
+        factory = functools.partial(ShoutboxClient, api_key='...')
+        with ProcessPoolSender(factory, processes=4) as sender:
+            for result in sender.send(emails):
+                if not result.ok:
+                    print(result.index, result.error)
+
+    Args:
+        client_factory: Picklable callable returning a client, e.g. a
+            ``functools.partial`` of ``ShoutboxClient`` or ``SMTPClient``
+        processes: Number of worker processes; defaults to the CPU count
+        concurrency: Sends in flight per worker process
+        batch_size: Emails handed to a worker at a time
+        shared_memory_threshold: Attachments at least this large are passed
+            through shared memory; None to always copy them
+        mp_context: ``multiprocessing`` context for the workers, e.g.
+            ``multiprocessing.get_context('spawn')``
+    """
+
+    def __init__(
+        self,
+        client_factory: typing.Callable,
+        processes: typing.Optional[int] = None,
+        concurrency: int = 8,
+        batch_size: int = 32,
+        shared_memory_threshold: typing.Optional[int] = 256 * 1024,
+        mp_context=None
+    ):
+        self.client_factory = client_factory
+        self.processes = max(1, processes or os.cpu_count() or 1)
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.shared_memory_threshold = shared_memory_threshold if shared_memory else None
+        self.mp_context = mp_context
+        self._executor = None
+        self._segments = _Segments() if self.shared_memory_threshold is not None else None
+
+    def _start(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.processes,
+                mp_context=self.mp_context,
+                initializer=_init_worker,
+                initargs=(self.client_factory, self.concurrency)
+            )
+        return self._executor
+
+    def _pack(self, emails: list) -> tuple:
+        """Serialise a batch, moving large attachment contents to shared memory"""
+        threshold = self.shared_memory_threshold
+        shared = []
+        contents = []
+        if threshold is not None:
+            for email_index, email in enumerate(emails):
+                if not any(not att.streamed and len(att.content) >= threshold for att in email.attachments or ()):
+                    continue
+                attachments = []
+                for attachment_index, attachment in enumerate(email.attachments):
+                    if not attachment.streamed and len(attachment.content) >= threshold:
+                        name, size = self._segments.acquire(attachment.content)
+                        shared.append((email_index, attachment_index, name, size))
+                        contents.append(attachment.content)
+                        attachment = Attachment.from_trusted(attachment.filename, b'', attachment.content_type)
+                    attachments.append(attachment)
+                emails[email_index] = Email.from_trusted(
+                    to=email.to,
+                    subject=email.subject,
+                    html=email.html,
+                    text=email.text,
+                    cc=email.cc,
+                    bcc=email.bcc,
+                    from_email=email.from_email,
+                    reply_to=email.reply_to,
+                    headers=email.headers,
+                    attachments=attachments,
+                    idempotency_key=email.idempotency_key
+                )
+        try:
+            return serialization.dumps_many(emails), shared, contents
+        except Exception:
+            self._segments.release(contents)
+            raise
+
+    def send(self, emails: typing.Iterable[Email]) -> typing.Iterator[SendResult]:
+        """
+        Send every email and yield one result per email as batches complete
+
+        Emails are read from ``emails`` lazily; at most two batches per
+        worker are queued at any time.
+
+        Args:
+            emails: Emails to send
+
+        Yields:
+            SendResult: One result per email, with ``index`` set to the
+            email's position in ``emails``. Results from different batches
+            may arrive out of order.
+        """
+        executor = self._start()
+        window = self.processes * 2
+        pending = {}
+
+        def collect(future):
+            start, batch, contents = pending.pop(future)
+            if contents:
+                self._segments.release(contents)
+            try:
+                results = future.result()
+            except Exception as e:
+                error = ShoutboxError(f"Worker failed: {e}")
+                results = [SendResult('failed', error=error) for _ in batch]
+            for index, (email, result) in enumerate(zip(batch, results), start):
+                result.index = index
+                result.email = email
+                yield result
+
+        try:
+            for start, batch in _batches(emails, self.batch_size):
+                if len(pending) >= window:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield from collect(future)
+                data, shared, contents = self._pack(list(batch))
+                try:
+                    future = executor.submit(_send_batch, data, shared)
+                except Exception:
+                    if contents:
+                        self._segments.release(contents)
+                    raise
+                pending[future] = (start, batch, contents)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from collect(future)
+        finally:
+            if pending:
+                # Abandoned by the caller: let the queued batches finish before freeing their memory
+                wait(pending)
+                for future in list(pending):
+                    _, _, contents = pending.pop(future)
+                    if contents:
+                        self._segments.release(contents)
+
+    def close(self):
+        """Stop the worker processes and free shared memory"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        if self._segments is not None:
+            self._segments.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _batches(emails: typing.Iterable[Email], size: int) -> typing.Iterator[tuple]:
+    batch = []
+    start = 0
+    for email in emails:
+        batch.append(email)
+        if len(batch) == size:
+            yield start, batch
+            start += size
+            batch = []
+    if batch:
+        yield start, batch
@@ -0,0 +1,123 @@
+"""
+Shoutbox recipient lists
+~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains a de-duplicator for campaign recipient lists.
+
+Addresses are compared after :func:`~shoutbox.models.normalize_address`,
+so ``User@Example.com`` and ``User@example.COM`` count as one recipient.
+Lists are de-duplicated while they stream, with a set of the addresses
+seen so far. When that set would outgrow ``max_in_memory`` addresses, the
+rest of the list is de-duplicated with an external sort through temporary
+files instead, so lists of any length fit in bounded memory.
+"""
+
+import heapq
+import itertools
+import os
+import pickle
+import tempfile
+import typing
+
+from .models import normalize_address
+
+
+def _row_address(row) -> str:
+    if isinstance(row, str):
+        return row
+    return row['email']
+
+
+def dedupe_recipients(
+    rows: typing.Iterable,
+    key: typing.Optional[typing.Callable] = None,
+    fold_local: typing.Optional[bool] = None,
+    max_in_memory: int = 1_000_000,
+    tmp_dir: typing.Optional[str] = None
+) -> typing.Iterator:
+    """
+    Drop rows whose address was already seen
+
+    Example:
+        for row in dedupe_recipients(read_rows('recipients.csv')):
+            ...
+
+    Args:
+        rows: Addresses, or rows such as the dicts from
+            :func:`shoutbox.bulk.read_rows`
+        key: Function returning the address of a row; defaults to the row
+            itself for strings and ``row['email']`` otherwise
+        fold_local: Also ignore the case of the local part, see
+            :func:`~shoutbox.models.normalize_address`
+        max_in_memory: Distinct addresses kept in memory before switching
+            to an external sort
+        tmp_dir: Directory for the sort's temporary files
+
+    Yields:
+        The first row for every address. Rows are yielded in input order
+        until ``max_in_memory`` distinct addresses were seen; rows after that
+        follow in order of their normalised address. Rows must be picklable.
+    """
+    key = key or _row_address
+    rows = iter(rows)
+    seen = set()
+    for row in rows:
+        address = normalize_address(key(row), fold_local)
+        if address in seen:
+            continue
+        if len(seen) >= max_in_memory:
+            yield from _external_dedupe(itertools.chain([row], rows), seen, key, fold_local, max_in_memory, tmp_dir)
+            return
+        seen.add(address)
+        yield row
+
+
+def _external_dedupe(rows, seen: set, key, fold_local, run_size: int, tmp_dir) -> typing.Iterator:
+    """De-duplicate the rest of a list with sorted runs on disk and a k-way merge"""
+    with tempfile.TemporaryDirectory(prefix='shoutbox-dedupe-', dir=tmp_dir) as directory:
+        # Addresses already yielded go first as markers, with position -1
+        runs = [_write_run(directory, 0, sorted((address, -1, None) for address in seen))]
+        seen.clear()
+
+        position = itertools.count()
+        while True:
+            chunk = [
+                (normalize_address(key(row), fold_local), next(position), row)
+                for row in itertools.islice(rows, run_size)
+            ]
+            if not chunk:
+                break
+            # Positions are unique, so rows themselves are never compared
+            chunk.sort(key=lambda entry: entry[:2])
+            runs.append(_write_run(directory, len(runs), chunk))
+            del chunk
+
+        previous = None
+        merged = heapq.merge(*(_read_run(path) for path in runs), key=lambda entry: entry[:2])
+        for address, index, row in merged:
+            if address == previous:
+                continue
+            previous = address
+            if index >= 0:
+                yield row
+
+
+def _write_run(directory: str, number: int, entries) -> str:
+    path = os.path.join(directory, f'run-{number}')
+    with open(path, 'wb') as f:
+        pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+        for entry in entries:
+            pickler.dump(entry)
+            # Entries are independent; do not let the memo keep every row alive
+            pickler.clear_memo()
+    return path
+
+
+def _read_run(path: str) -> typing.Iterator[tuple]:
+    with open(path, 'rb') as f:
+        unpickler = pickle.Unpickler(f)
+        while True:
+            try:
+                yield unpickler.load()
+            except EOFError:
+                return
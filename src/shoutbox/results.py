@@ -0,0 +1,310 @@
+"""
+Shoutbox send results
+~~~~~~~~~~~~~~~~~~~
+
+This module contains the result type for streamed sends and the windowed
+send loops behind ``send_iter()`` and ``asend_iter()`` on the clients.
+
+Emails are pulled from the input lazily and at most ``window`` sends are in
+flight, so memory stays bounded for input streams of any length. Results
+are yielded in completion order: a slow send does not hold back the
+results of those that finish after it started.
+"""
+
+import asyncio
+import time
+import typing
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from .exceptions import ShoutboxError, ValidationError, APIError, PartialSendError
+from .concurrency import AdaptiveLimiter, resolve_window
+
+
+_UNPARSED = object()
+
+
+class SendResult(Mapping):
+    """
+    Outcome of a send
+
+    Returned by ``send()`` on every transport and yielded by ``send_iter()``.
+    The response body is kept as raw bytes and only parsed when it is
+    accessed, through :attr:`body`, :attr:`message_id` or mapping access
+    (``result['emailid']``). A result is truthy when the email was sent.
+
+    Attributes:
+        status: ``'sent'``, ``'failed'``, or ``'suppressed'`` when every
+            recipient was on the client's suppression list
+        email: The email that was sent
+        index: Position of the email in the input stream of ``send_iter()``
+        refused: Recipients rejected by the server, mapped to ``(code, message)``
+        bytes_sent: Size of the request body or SMTP message
+        latency: Seconds from the first attempt to completion
+        attempts: Number of attempts made
+        error: The exception for failed sends
+        raw: Raw response body, if any
+        duplicate: The email was recognised as already sent and not sent again
+        chunks: Results of the requests of a send split by recipients, or None
+        suppressed: Recipients dropped because they are on the suppression list
+    """
+
+    __slots__ = ('status', 'email', 'index', 'refused', 'bytes_sent', 'latency', 'attempts',
+                 'error', 'raw', 'duplicate', 'chunks', 'suppressed', '_codec', '_body', '_message_id')
+
+    def __init__(
+        self,
+        status: str = 'sent',
+        email=None,
+        index: typing.Optional[int] = None,
+        message_id: typing.Optional[str] = None,
+        refused: typing.Optional[dict] = None,
+        bytes_sent: int = 0,
+        latency: float = 0.0,
+        attempts: int = 1,
+        error: typing.Optional[BaseException] = None,
+        body=_UNPARSED,
+        raw: typing.Optional[bytes] = None,
+        codec=None,
+        duplicate: bool = False,
+        chunks: typing.Optional[list] = None,
+        suppressed: typing.Optional[list] = None
+    ):
+        self.status = status
+        self.email = email
+        self.index = index
+        self.refused = refused or {}
+        self.bytes_sent = bytes_sent
+        self.latency = latency
+        self.attempts = attempts
+        self.error = error
+        self.raw = raw
+        self.duplicate = duplicate
+        self.chunks = chunks
+        self.suppressed = suppressed or []
+        self._codec = codec
+        if body is _UNPARSED and raw is None:
+            body = None
+        self._body = body
+        self._message_id = message_id
+
+    @property
+    def ok(self) -> bool:
+        """Whether the email was sent"""
+        return self.status == 'sent'
+
+    @property
+    def body(self):
+        """Parsed response body, decoded on first access"""
+        body = self._body
+        if body is _UNPARSED:
+            body = self._body = self._codec.loads(self.raw)
+        return body
+
+    @property
+    def message_id(self) -> typing.Optional[str]:
+        """Message id assigned by the server, or the Message-ID header for SMTP"""
+        if self._message_id is None:
+            body = self.body
+            if isinstance(body, Mapping):
+                return body.get('emailid')
+        return self._message_id
+
+    @property
+    def accepted(self) -> list:
+        """Addresses of the recipients the server accepted"""
+        if self.chunks:
+            return [addr for chunk in self.chunks for addr in chunk.accepted]
+        if not self.ok or self.email is None:
+            return []
+        email = self.email
+        recipients = [addr.email for addrs in (email.to, email.cc, email.bcc) if addrs for addr in addrs]
+        if self.suppressed:
+            suppressed = set(self.suppressed)
+            recipients = [addr for addr in recipients if addr not in suppressed]
+        return [addr for addr in recipients if addr not in self.refused]
+
+    def _mapping(self) -> Mapping:
+        body = self.body
+        return body if isinstance(body, Mapping) else {}
+
+    def __getitem__(self, key):
+        return self._mapping()[key]
+
+    def __iter__(self):
+        return iter(self._mapping())
+
+    def __len__(self):
+        return len(self._mapping())
+
+    def __bool__(self):
+        return self.status == 'sent'
+
+    def __eq__(self, other):
+        if isinstance(other, SendResult):
+            return self is other
+        return super().__eq__(other)
+
+    __hash__ = object.__hash__
+
+    def __getstate__(self):
+        # Parse the body first so the codec does not travel with the result
+        state = {name: getattr(self, name) for name in self.__slots__}
+        state['_body'] = self.body
+        state['_codec'] = None
+        return state
+
+    def __setstate__(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        outcome = f"message_id={self.message_id!r}" if self.ok else f"error={self.error!r}"
+        return (f"SendResult(index={self.index}, status={self.status!r}, {outcome}, "
+                f"latency={self.latency:.3f}, attempts={self.attempts})")
+
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether a failed send may succeed if repeated
+
+    Validation errors and API errors other than rate limiting (429) and
+    server errors (5xx) are permanent; other transport errors are not.
+    Partially sent emails are not retried as a whole, since their failed
+    chunks were already retried.
+    """
+    if isinstance(error, (ValidationError, PartialSendError)):
+        return False
+    if isinstance(error, APIError):
+        return error.status_code == 429 or (error.status_code or 0) >= 500
+    return isinstance(error, ShoutboxError)
+
+
+def _send_one(
+    send: typing.Callable,
+    index: int,
+    email,
+    retries: int,
+    backoff: float,
+    limiter: typing.Optional[AdaptiveLimiter] = None
+) -> SendResult:
+    start = time.perf_counter()
+    attempts = 0
+    while True:
+        attempts += 1
+        attempt_start = time.perf_counter()
+        try:
+            result = send(email)
+        except Exception as e:
+            retryable = is_retryable(e)
+            if limiter:
+                limiter.record(time.perf_counter() - attempt_start, congested=retryable)
+            if attempts > retries or not retryable:
+                return SendResult('failed', email, index, error=e,
+                                  latency=time.perf_counter() - start, attempts=attempts)
+            time.sleep(backoff * 2 ** (attempts - 1))
+        else:
+            if limiter:
+                limiter.record(time.perf_counter() - attempt_start)
+            if not isinstance(result, SendResult):
+                # A plain send function returning the response body
+                result = SendResult('sent', email, body=result)
+            result.index = index
+            result.email = email
+            result.latency = time.perf_counter() - start
+            result.attempts = attempts
+            return result
+
+
+def send_iter(
+    send: typing.Callable,
+    emails: typing.Iterable,
+    window: typing.Union[int, AdaptiveLimiter] = 8,
+    retries: int = 0,
+    backoff: float = 0.1
+) -> typing.Iterator[SendResult]:
+    """
+    Send emails with a bounded window in flight, yielding results as they complete
+
+    Args:
+        send: Function sending one email, such as ``client.send``
+        emails: Emails to send; read lazily
+        window: Maximum number of sends in flight, or an
+            :class:`~shoutbox.concurrency.AdaptiveLimiter` adjusting it from
+            the latency and errors of the sends
+        retries: Extra attempts for sends failing with a retryable error,
+            see :func:`is_retryable`
+        backoff: Delay before the first retry, doubled for each further one
+
+    Yields:
+        SendResult: One result per email, in completion order
+    """
+    limiter, threads, capacity = resolve_window(window)
+    executor = ThreadPoolExecutor(max_workers=threads)
+    pending = set()
+    try:
+        for index, email in enumerate(emails):
+            while len(pending) >= capacity():
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(_send_one, send, index, email, retries, backoff, limiter))
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        # Also reached when the caller stops iterating early
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def asend_iter(
+    send: typing.Callable,
+    emails: typing.Union[typing.Iterable, typing.AsyncIterable],
+    window: typing.Union[int, AdaptiveLimiter] = 8,
+    retries: int = 0,
+    backoff: float = 0.1
+) -> typing.AsyncIterator[SendResult]:
+    """
+    Async variant of :func:`send_iter`
+
+    ``send`` is a blocking function and runs in a thread pool, so the event
+    loop stays responsive. ``emails`` may be a regular or an async iterable.
+
+    Yields:
+        SendResult: One result per email, in completion order
+    """
+    limiter, threads, capacity = resolve_window(window)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=threads)
+    pending = set()
+
+    async def drain(limit):
+        while len(pending) > limit:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for future in done:
+                pending.discard(future)
+                yield future.result()
+
+    try:
+        index = 0
+        async for email in _aiter(emails):
+            async for result in drain(capacity() - 1):
+                yield result
+            pending.add(loop.run_in_executor(executor, _send_one, send, index, email, retries, backoff, limiter))
+            index += 1
+
+        async for result in drain(0):
+            yield result
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def _aiter(iterable):
+    if hasattr(iterable, '__aiter__'):
+        async for item in iterable:
+            yield item
+    else:
+        for item in iterable:
+            yield item
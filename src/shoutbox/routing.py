@@ -0,0 +1,338 @@
+"""
+Shoutbox transport routing
+~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains a client that sends each email through the API or
+over SMTP, whichever suits it: the API for small transactional mail, SMTP
+for large attachments and long recipient lists.
+
+The route is picked by rules on the email's estimated size (see
+:meth:`Email.estimated_size`, which encodes nothing) and recipient count.
+An email above one transport's size limit goes through the other. Each
+transport's latency and recent errors are tracked; a transport that
+keeps failing is taken out of rotation for a cool-down period and its
+mail goes through the other one.
+"""
+
+import collections
+import threading
+import time
+import typing
+
+from .models import Email
+from .exceptions import PayloadTooLargeError
+from .results import SendResult, send_iter, asend_iter, is_retryable
+from .concurrency import AdaptiveLimiter
+from .stats import LatencyHistogram
+
+API = 'api'
+SMTP = 'smtp'
+
+
+class RoutingRule:
+    """
+    Sends matching emails through a transport
+
+    A rule matches when every condition it sets holds.
+
+    Args:
+        transport: ``'api'`` or ``'smtp'``
+        min_size: Estimated API request size in bytes from which the rule matches
+        min_recipients: Number of to/cc/bcc recipients from which the rule matches
+        when: Function of the email, its estimated size and its recipient
+            count returning whether the rule matches
+    """
+
+    def __init__(
+        self,
+        transport: str,
+        min_size: typing.Optional[int] = None,
+        min_recipients: typing.Optional[int] = None,
+        when: typing.Optional[typing.Callable[[Email, int, int], bool]] = None
+    ):
+        if transport not in (API, SMTP):
+            raise ValueError(f"Unknown transport: {transport}")
+        self.transport = transport
+        self.min_size = min_size
+        self.min_recipients = min_recipients
+        self.when = when
+
+    def matches(self, email: Email, size: int, recipients: int) -> bool:
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.min_recipients is not None and recipients < self.min_recipients:
+            return False
+        return self.when is None or self.when(email, size, recipients)
+
+    def __repr__(self):
+        return (f"RoutingRule({self.transport!r}, min_size={self.min_size}, "
+                f"min_recipients={self.min_recipients})")
+
+
+def default_rules() -> list:
+    """Route emails over 5 MB or with 50 or more recipients over SMTP"""
+    return [
+        RoutingRule(SMTP, min_size=5 * 1024 * 1024),
+        RoutingRule(SMTP, min_recipients=50),
+    ]
+
+
+class TransportHealth:
+    """
+    Latency and error statistics of one transport, with a circuit breaker
+
+    A transport is taken out of rotation for ``cooldown`` seconds after
+    ``failure_threshold`` consecutive retryable failures, or when more than
+    ``max_error_rate`` of its last ``window`` sends failed.
+    """
+
+    # Sends in the window before the error rate is acted on
+    MIN_SAMPLES = 10
+    # Weight of the latest send in recent_latency
+    LATENCY_WEIGHT = 0.2
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        max_error_rate: float = 0.5,
+        window: int = 50,
+        cooldown: float = 30.0,
+        clock: typing.Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.max_error_rate = max_error_rate
+        self.cooldown = cooldown
+        self.clock = clock
+        self.latency = LatencyHistogram()
+        self.sent = 0
+        self.failed = 0
+        self.trips = 0
+        # Exponentially weighted moving average of send latency
+        self.recent_latency = 0.0
+        self._last_record = 0.0
+        self._recent = collections.deque(maxlen=window)
+        self._consecutive = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        """Whether the transport is in rotation"""
+        return self.clock() >= self._open_until
+
+    def slower_than(self, seconds: float) -> bool:
+        """
+        Whether recent sends took longer than ``seconds`` on average
+
+        An average older than ``cooldown`` is ignored, so a transport that was
+        avoided for being slow gets traffic again to measure it.
+        """
+        return self.recent_latency > seconds and self.clock() - self._last_record < self.cooldown
+
+    def record(self, latency: float, error: typing.Optional[BaseException] = None):
+        """Record the outcome of a send"""
+        self.latency.record(latency)
+        # Permanent errors say something about the email, not the transport
+        failure = error is not None and is_retryable(error)
+        with self._lock:
+            self._last_record = self.clock()
+            if self.sent + self.failed:
+                self.recent_latency += self.LATENCY_WEIGHT * (latency - self.recent_latency)
+            else:
+                self.recent_latency = latency
+            if error is None:
+                self.sent += 1
+            else:
+                self.failed += 1
+            self._recent.append(failure)
+            self._consecutive = self._consecutive + 1 if failure else 0
+            if not failure:
+                return
+            errors = sum(self._recent)
+            if (self._consecutive >= self.failure_threshold or
+                    (len(self._recent) >= self.MIN_SAMPLES and errors / len(self._recent) > self.max_error_rate)):
+                self._open_until = self.clock() + self.cooldown
+                self._recent.clear()
+                self._consecutive = 0
+                self.trips += 1
+
+    def metrics(self) -> dict:
+        """Counts, error rate, latency percentiles and health of the transport"""
+        with self._lock:
+            recent = list(self._recent)
+        return {
+            'healthy': self.healthy,
+            'sent': self.sent,
+            'failed': self.failed,
+            'error_rate': sum(recent) / len(recent) if recent else 0.0,
+            'trips': self.trips,
+            'recent_latency': self.recent_latency,
+            'latency_p50': self.latency.percentile(50),
+            'latency_p99': self.latency.percentile(99),
+        }
+
+
+class RoutingClient:
+    """
+    Sends each email through the API or SMTP client, by rules and transport health
+
+    Rules are tried in order and the first match picks the transport;
+    emails no rule matches go through the API. An email above the picked
+    transport's size limit (``max_request_size`` or ``max_message_size``)
+    goes through the other one. If the picked transport is out of rotation,
+    or slower than ``max_latency`` on recent sends, the other one is used
+    unless it is as well. With ``failover`` set, a send
+    that fails with a retryable error (see :func:`shoutbox.results.is_retryable`)
+    is repeated once on the other transport. A timed out send may still have
+    been delivered, so give emails an ``idempotency_key`` or turn failover
+    off where a duplicate would matter.
+
+    Example:
+        router = RoutingClient(ShoutboxClient(), SMTPClient())
+        router.send(email)
+        print(router.metrics())
+
+    Args:
+        api: ``ShoutboxClient`` (or anything with a ``send`` method)
+        smtp: ``SMTPClient`` (or anything with a ``send`` method)
+        rules: Routing rules; defaults to :func:`default_rules`
+        failover: Repeat failed sends on the other transport
+        failure_threshold: Consecutive failures that take a transport out of rotation
+        max_error_rate: Share of failures among recent sends that does the same
+        cooldown: Seconds a transport stays out of rotation
+        max_latency: Recent average latency in seconds above which a
+            transport's mail goes through the other one, None for no limit
+        clock: Function returning the current time in seconds
+    """
+
+    def __init__(
+        self,
+        api,
+        smtp,
+        rules: typing.Optional[typing.List[RoutingRule]] = None,
+        failover: bool = True,
+        failure_threshold: int = 5,
+        max_error_rate: float = 0.5,
+        cooldown: float = 30.0,
+        max_latency: typing.Optional[float] = None,
+        clock: typing.Callable[[], float] = time.monotonic
+    ):
+        self.transports = {API: api, SMTP: smtp}
+        self.rules = default_rules() if rules is None else rules
+        self.failover = failover
+        self.max_latency = max_latency
+        self.health = {
+            name: TransportHealth(name, failure_threshold, max_error_rate, cooldown=cooldown, clock=clock)
+            for name in self.transports
+        }
+
+    def route(self, email: Email) -> str:
+        """
+        Pick the transport for an email
+
+        Returns:
+            str: ``'api'`` or ``'smtp'``
+        """
+        size = email.estimated_size()
+        recipients = email.recipient_count()
+        transport = API
+        for rule in self.rules:
+            if rule.matches(email, size, recipients):
+                transport = rule.transport
+                break
+        other = _other(transport)
+        if not self._fits(transport, email):
+            # If neither fits, the picked transport raises PayloadTooLargeError
+            return other if self._fits(other, email) else transport
+        if not self._available(transport) and self._available(other) and self._fits(other, email):
+            return other
+        return transport
+
+    def _fits(self, transport: str, email: Email) -> bool:
+        check_size = getattr(self.transports[transport], 'check_size', None)
+        if check_size is None:
+            return True
+        try:
+            check_size(email)
+        except PayloadTooLargeError:
+            return False
+        return True
+
+    def _available(self, transport: str) -> bool:
+        health = self.health[transport]
+        if not health.healthy:
+            return False
+        return self.max_latency is None or not health.slower_than(self.max_latency)
+
+    def send(self, email: Email) -> SendResult:
+        """
+        Send an email through the transport picked by :meth:`route`
+
+        Returns:
+            SendResult: The result of the transport that sent the email
+
+        Raises:
+            ValidationError: If email validation fails
+            ShoutboxError: The error of the last transport tried
+        """
+        transport = self.route(email)
+        try:
+            return self._send(transport, email)
+        except Exception as e:
+            if not self.failover or not is_retryable(e):
+                raise
+            other = _other(transport)
+            # The first error stands if the other transport is down or cannot take the email
+            if not self.health[other].healthy or not self._fits(other, email):
+                raise
+        return self._send(other, email)
+
+    def _send(self, transport: str, email: Email) -> SendResult:
+        health = self.health[transport]
+        start = time.perf_counter()
+        try:
+            result = self.transports[transport].send(email)
+        except Exception as e:
+            health.record(time.perf_counter() - start, e)
+            raise
+        health.record(time.perf_counter() - start)
+        if not isinstance(result, SendResult):
+            result = SendResult(email=email, body=result)
+        return result
+
+    def metrics(self) -> dict:
+        """Per-transport metrics, see :meth:`TransportHealth.metrics`"""
+        return {name: health.metrics() for name, health in self.health.items()}
+
+    def send_iter(
+        self,
+        emails: typing.Iterable[Email],
+        window: typing.Union[int, AdaptiveLimiter] = 8,
+        retries: int = 0
+    ) -> typing.Iterator[SendResult]:
+        """Streamed sends, see :meth:`ShoutboxClient.send_iter`"""
+        return send_iter(self.send, emails, window, retries)
+
+    def asend_iter(
+        self,
+        emails: typing.Union[typing.Iterable[Email], typing.AsyncIterable[Email]],
+        window: typing.Union[int, AdaptiveLimiter] = 8,
+        retries: int = 0
+    ) -> typing.AsyncIterator[SendResult]:
+        """Async variant of :meth:`send_iter`"""
+        return asend_iter(self.send, emails, window, retries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        for transport in self.transports.values():
+            close = getattr(transport, '__exit__', None)
+            if close:
+                close(exc_type, exc_val, exc_tb)
+
+
+def _other(transport: str) -> str:
+    return SMTP if transport == API else API
@@ -0,0 +1,468 @@
+"""
+Shoutbox scheduled sending
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains a scheduler for delayed and timed sends, such as
+"15 minutes after signup unless cancelled" or "09:00 in the recipient's
+time zone", without an external cron job polling a database.
+
+Pending sends are kept in a hierarchical timer wheel: inserting and
+cancelling are O(1) whatever the number of pending sends, and advancing
+the clock only touches the sends that are due. Due sends are released to a
+:class:`~shoutbox.dispatch.Dispatcher` in batches. With a store, pending
+sends survive a restart of the process.
+"""
+
+import datetime
+import sqlite3
+import threading
+import time
+import typing
+import uuid
+from concurrent.futures import Future
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
+
+from . import serialization
+from .models import Email
+from .results import SendResult
+from .dispatch import Dispatcher
+
+
+class Timer:
+    """A pending entry of a :class:`TimerWheel`"""
+
+    __slots__ = ('id', 'expires', 'payload', '_slot', '_level')
+
+    def __init__(self, id, expires: int, payload=None):
+        self.id = id
+        self.expires = expires
+        self.payload = payload
+        # The dict holding the timer, for O(1) cancellation
+        self._slot = None
+        self._level = None
+
+    @property
+    def pending(self) -> bool:
+        return self._slot is not None
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel
+
+    Time is counted in integer ticks. Level 0 has one slot per tick, and
+    every further level has slots ``slots`` times as wide. A timer is put in
+    the lowest level whose range covers it and moves down a level each time
+    the wheel below completes a turn, so it is touched at most ``levels``
+    times before it fires. Timers beyond the top level wait in an overflow
+    set until they come into range.
+
+    Args:
+        slots: Slots per level, a power of two
+        levels: Number of levels
+    """
+
+    def __init__(self, slots: int = 64, levels: int = 4):
+        if slots < 2 or slots & (slots - 1):
+            raise ValueError("slots must be a power of two")
+        if levels < 1:
+            raise ValueError("levels must be at least 1")
+        self.slots = slots
+        self.levels = levels
+        self._bits = slots.bit_length() - 1
+        self._mask = slots - 1
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._overflow = {}
+        self._range = slots ** levels
+        # Overflow timers are placed again each time the top level moves on a slot
+        self._overflow_mask = (1 << (self._bits * max(levels - 1, 1))) - 1
+        self.now = 0
+        self.count = 0
+        # Timers in level 0; while there are none, advancing skips to the next cascade
+        self._near = 0
+
+    def add(self, timer: Timer) -> Timer:
+        """Add a timer; timers already due fire on the next :meth:`advance`"""
+        if timer._slot is not None:
+            raise ValueError("Timer is already pending")
+        self._place(timer)
+        self.count += 1
+        return timer
+
+    def _place(self, timer: Timer):
+        expires = max(timer.expires, self.now)
+        delta = expires - self.now
+        if delta >= self._range:
+            level = self.levels
+            slot = self._overflow
+        else:
+            level = 0
+            while delta >= 1 << (self._bits * (level + 1)):
+                level += 1
+            slot = self._wheels[level][(expires >> (self._bits * level)) & self._mask]
+            if not level:
+                self._near += 1
+        slot[timer.id] = timer
+        timer._slot = slot
+        timer._level = level
+
+    def cancel(self, timer: Timer) -> bool:
+        """Remove a pending timer; returns False if it already fired or was cancelled"""
+        slot = timer._slot
+        if slot is None:
+            return False
+        del slot[timer.id]
+        timer._slot = None
+        if not timer._level:
+            self._near -= 1
+        self.count -= 1
+        return True
+
+    def advance(self, now: int) -> typing.List[Timer]:
+        """
+        Move the wheel to tick ``now``
+
+        Returns:
+            list: Timers that expired, ordered by tick
+        """
+        expired = []
+        if not self.count:
+            self.now = max(self.now, now)
+        while self.now <= now and self.count:
+            tick = self.now
+            if not tick & self._mask:
+                self._cascade(tick)
+            if not self._near:
+                # Nothing can expire before the next cascade
+                self.now = min(now, (tick | self._mask) + 1)
+                if self.now == tick:
+                    break
+                continue
+            slot = self._wheels[0][tick & self._mask]
+            if slot:
+                for timer in slot.values():
+                    timer._slot = None
+                expired.extend(slot.values())
+                self.count -= len(slot)
+                self._near -= len(slot)
+                slot.clear()
+            if tick == now:
+                break
+            self.now = tick + 1
+        return expired
+
+    def _cascade(self, tick: int):
+        if self._overflow and not tick & self._overflow_mask:
+            self._reinsert(self._overflow)
+        # Higher levels first, so their timers can drop all the way down
+        for level in range(self.levels - 1, 0, -1):
+            if tick & ((1 << (self._bits * level)) - 1):
+                continue
+            self._reinsert(self._wheels[level][(tick >> (self._bits * level)) & self._mask])
+
+    def _reinsert(self, slot: dict):
+        timers = list(slot.values())
+        slot.clear()
+        for timer in timers:
+            self._place(timer)
+
+    def __len__(self):
+        return self.count
+
+
+class ScheduledSend:
+    """
+    Handle of a scheduled email, returned by :meth:`Scheduler.schedule`
+
+    Attributes:
+        id: Identifier, also used by the store
+        at: Due time as a Unix timestamp
+        email: The email
+        priority: Dispatcher lane
+        future: Future of the send once it has been released, see
+            :meth:`Dispatcher.submit`
+    """
+
+    __slots__ = ('id', 'at', 'email', 'priority', 'future', '_timer')
+
+    def __init__(self, id: str, at: float, email: Email, priority: typing.Optional[str] = None):
+        self.id = id
+        self.at = at
+        self.email = email
+        self.priority = priority
+        self.future = None
+        self._timer = None
+
+    @property
+    def pending(self) -> bool:
+        """Whether the email is still waiting to be released"""
+        return self._timer is not None and self._timer.pending
+
+    def __repr__(self):
+        return f"ScheduledSend({self.id!r}, at={self.at}, priority={self.priority!r})"
+
+
+class SQLiteScheduleStore:
+    """
+    Persists pending scheduled sends in SQLite
+
+    Emails are stored in the :mod:`shoutbox.serialization` format.
+
+    Args:
+        path: Database file, or ``':memory:'``
+    """
+
+    def __init__(self, path: str):
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS scheduled '
+            '(id TEXT PRIMARY KEY, at REAL NOT NULL, priority TEXT, email BLOB NOT NULL)'
+        )
+
+    def add(self, send: ScheduledSend):
+        data = serialization.dumps(send.email)
+        with self._lock:
+            self._db.execute('INSERT OR REPLACE INTO scheduled VALUES (?, ?, ?, ?)',
+                             (send.id, send.at, send.priority, data))
+
+    def remove(self, ids: typing.Iterable[str]):
+        with self._lock:
+            self._db.execute('BEGIN')
+            self._db.executemany('DELETE FROM scheduled WHERE id = ?', ((i,) for i in ids))
+            self._db.execute('COMMIT')
+
+    def load(self) -> typing.Iterator[ScheduledSend]:
+        """Pending sends, earliest first"""
+        with self._lock:
+            rows = self._db.execute('SELECT id, at, priority, email FROM scheduled ORDER BY at').fetchall()
+        for id, at, priority, data in rows:
+            yield ScheduledSend(id, at, serialization.loads(data), priority)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class Scheduler:
+    """
+    Releases emails to a dispatcher when they are due
+
+    Example:
+        with Scheduler(Dispatcher(client)) as scheduler:
+            handle = scheduler.schedule(welcome, delay=15 * 60)
+            ...
+            scheduler.cancel(handle)
+
+    Args:
+        dispatcher: :class:`~shoutbox.dispatch.Dispatcher` receiving due
+            emails; a client is wrapped in a dispatcher owned by the scheduler
+        tick: Timer resolution in seconds
+        store: Store persisting pending sends, e.g. :class:`SQLiteScheduleStore`;
+            sends found in it are scheduled again on start
+        batch_size: Sent emails removed from the store at a time
+        clock: Function returning the current Unix time
+        start: Run the background thread; without it, call :meth:`run_pending`
+    """
+
+    def __init__(
+        self,
+        dispatcher,
+        tick: float = 1.0,
+        store: typing.Optional[SQLiteScheduleStore] = None,
+        batch_size: int = 100,
+        clock: typing.Callable[[], float] = time.time,
+        start: bool = True
+    ):
+        self._owns_dispatcher = not isinstance(dispatcher, Dispatcher)
+        self.dispatcher = Dispatcher(dispatcher) if self._owns_dispatcher else dispatcher
+        self.tick = tick
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.clock = clock
+        self.released = 0
+
+        self._lock = threading.Lock()
+        self._wheel = TimerWheel()
+        self._wheel.now = self._ticks(clock())
+        self._pending = {}
+        # Ids of released sends that finished, to remove from the store
+        self._finished = []
+        self._stop = threading.Event()
+        self._thread = None
+
+        if store is not None:
+            for send in store.load():
+                self._add(send)
+        if start:
+            self._thread = threading.Thread(target=self._run, name='shoutbox-scheduler', daemon=True)
+            self._thread.start()
+
+    def _ticks(self, timestamp: float) -> int:
+        # Round up so an email is never released before its time
+        return int(-(-timestamp // self.tick))
+
+    def schedule(
+        self,
+        email: Email,
+        at: typing.Union[datetime.datetime, float, None] = None,
+        delay: typing.Optional[float] = None,
+        priority: typing.Optional[str] = None
+    ) -> ScheduledSend:
+        """
+        Schedule an email
+
+        Args:
+            email: Email to send
+            at: Due time, as a datetime (naive datetimes are local time) or
+                Unix timestamp; see :func:`next_local_time`
+            delay: Seconds from now, instead of ``at``
+            priority: Dispatcher lane for the send
+
+        Returns:
+            ScheduledSend: Handle for :meth:`cancel`
+
+        Raises:
+            ValueError: If neither or both of ``at`` and ``delay`` are given,
+                or the priority is not a lane of the dispatcher
+        """
+        if (at is None) == (delay is None):
+            raise ValueError("Give exactly one of at and delay")
+        # Fails now rather than when the email is due
+        self.dispatcher._lane(priority)
+        if delay is not None:
+            at = self.clock() + delay
+        elif isinstance(at, datetime.datetime):
+            at = at.timestamp()
+        send = ScheduledSend(uuid.uuid4().hex, float(at), email, priority)
+        if self.store is not None:
+            self.store.add(send)
+        self._add(send)
+        return send
+
+    def _add(self, send: ScheduledSend):
+        timer = Timer(send.id, self._ticks(send.at), send)
+        with self._lock:
+            send._timer = self._wheel.add(timer)
+            self._pending[send.id] = send
+
+    def cancel(self, send: typing.Union[ScheduledSend, str]) -> bool:
+        """
+        Cancel a scheduled email
+
+        Args:
+            send: Handle or id returned by :meth:`schedule`
+
+        Returns:
+            bool: False if the email was already released or cancelled
+        """
+        send_id = send if isinstance(send, str) else send.id
+        with self._lock:
+            send = self._pending.pop(send_id, None)
+            if send is None or not self._wheel.cancel(send._timer):
+                return False
+        if self.store is not None:
+            self.store.remove([send_id])
+        return True
+
+    def run_pending(self) -> int:
+        """
+        Release every email that is due
+
+        An email stays in the store until its send has finished, so a
+        restart while it is queued in the dispatcher sends it again rather
+        than losing it. If the dispatcher refuses an email, for instance
+        because it was closed, its ``future`` holds a failed result and the
+        email stays in the store.
+
+        Returns:
+            int: Number of emails released
+        """
+        with self._lock:
+            due = self._wheel.advance(self._ticks(self.clock()))
+            for timer in due:
+                del self._pending[timer.id]
+            self.released += len(due)
+        for timer in due:
+            send = timer.payload
+            try:
+                send.future = self.dispatcher.submit(send.email, send.priority)
+            except Exception as e:
+                send.future = Future()
+                send.future.set_result(SendResult('failed', send.email, attempts=0, error=e))
+                continue
+            if self.store is not None:
+                send.future.add_done_callback(lambda future, send_id=send.id: self._finish(send_id))
+        self._remove_finished()
+        return len(due)
+
+    def _finish(self, send_id: str):
+        with self._lock:
+            self._finished.append(send_id)
+            full = len(self._finished) >= self.batch_size
+        if full:
+            self._remove_finished()
+
+    def _remove_finished(self):
+        with self._lock:
+            finished, self._finished = self._finished, []
+        if finished:
+            self.store.remove(finished)
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            self.run_pending()
+
+    def close(self):
+        """Stop the scheduler; pending emails stay in the store"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._owns_dispatcher:
+            self.dispatcher.close()
+        if self.store is not None:
+            self._remove_finished()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def next_local_time(
+    time_of_day: datetime.time,
+    timezone: typing.Union[datetime.tzinfo, str],
+    now: typing.Optional[datetime.datetime] = None
+) -> datetime.datetime:
+    """
+    Next occurrence of a wall clock time in a time zone
+
+    Example:
+        scheduler.schedule(email, at=next_local_time(datetime.time(9), 'Europe/Amsterdam'))
+
+    Args:
+        time_of_day: Local time, e.g. ``datetime.time(9, 0)``
+        timezone: tzinfo or IANA time zone name (Python 3.9+)
+        now: Current time; defaults to now
+
+    Returns:
+        datetime: Aware datetime of the next occurrence, possibly today
+    """
+    if isinstance(timezone, str):
+        if ZoneInfo is None:
+            raise ValueError("Time zone names require Python 3.9+, pass a tzinfo instead")
+        timezone = ZoneInfo(timezone)
+    now = (now or datetime.datetime.now(datetime.timezone.utc)).astimezone(timezone)
+    candidate = datetime.datetime.combine(now.date(), time_of_day, tzinfo=timezone)
+    if candidate <= now:
+        candidate = datetime.datetime.combine(now.date() + datetime.timedelta(days=1), time_of_day, tzinfo=timezone)
+    return candidate
@@ -0,0 +1,354 @@
+"""
+Shoutbox binary serialisation
+~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains a compact, versioned binary format for handing emails
+between processes and through queues.
+
+Compared to pickling or ``to_dict()`` JSON, attachments are stored as raw
+bytes rather than base64, and every address, name, content type and
+filename is written once to a shared string table and referenced by index.
+:func:`dumps_many` shares one table between a whole batch, so a sender or
+reply-to address repeated on every email costs a byte or two per email.
+
+Layout::
+
+    b'SBX' version
+    string table:   size, then size + UTF-8 bytes per string
+    email count:    size
+    per email:      field count, then per field: tag, size, body
+
+Sizes are one byte below 255, otherwise ``0xFF`` and a little-endian
+uint32. Fields carry their own length, so decoders skip tags they do not
+know and new fields can be added without a version bump.
+"""
+
+import struct
+import typing
+
+from .models import Email, EmailAddress, Attachment
+
+MAGIC = b'SBX'
+VERSION = 1
+
+_HEADER = MAGIC + bytes([VERSION])
+_U32 = struct.Struct('<I')
+
+# Field tags
+_TO = 1
+_SUBJECT = 2
+_HTML = 3
+_TEXT = 4
+_CC = 5
+_BCC = 6
+_FROM = 7
+_REPLY_TO = 8
+_HEADERS = 9
+_ATTACHMENTS = 10
+_IDEMPOTENCY_KEY = 11
+
+
+def _put_size(out: bytearray, n: int):
+    if n < 0xFF:
+        out.append(n)
+    else:
+        out.append(0xFF)
+        out += _U32.pack(n)
+
+
+def _put_bytes(out: bytearray, data: bytes):
+    _put_size(out, len(data))
+    out += data
+
+
+class _Writer:
+    """Encodes emails, collecting their strings into one table"""
+
+    __slots__ = ('strings', 'body')
+
+    def __init__(self):
+        # String -> index; index 0 stands for None
+        self.strings = {}
+        self.body = bytearray()
+
+    def ref(self, out: bytearray, value: typing.Optional[str]):
+        if value is None:
+            out.append(0)
+            return
+        index = self.strings.get(value)
+        if index is None:
+            index = self.strings[value] = len(self.strings) + 1
+        _put_size(out, index)
+
+    def address(self, out: bytearray, address: EmailAddress):
+        self.ref(out, address.email)
+        self.ref(out, address.name)
+
+    def field(self, tag: int, data: bytearray):
+        self.body.append(tag)
+        _put_bytes(self.body, data)
+
+    def email(self, email: Email):
+        ref = self.ref
+        address = self.address
+        start = len(self.body)
+        self.body.append(0)  # field count, patched below
+        count = 0
+
+        for tag, value in ((_TO, email.to), (_CC, email.cc), (_BCC, email.bcc)):
+            if value is None:
+                continue
+            data = bytearray()
+            _put_size(data, len(value))
+            for addr in value:
+                address(data, addr)
+            self.field(tag, data)
+            count += 1
+
+        for tag, value in ((_SUBJECT, email.subject), (_HTML, email.html), (_TEXT, email.text),
+                           (_IDEMPOTENCY_KEY, email.idempotency_key)):
+            if value is None:
+                continue
+            self.field(tag, value.encode())
+            count += 1
+
+        for tag, value in ((_FROM, email.from_email), (_REPLY_TO, email.reply_to)):
+            if value is None:
+                continue
+            data = bytearray()
+            address(data, value)
+            self.field(tag, data)
+            count += 1
+
+        if email.headers:
+            data = bytearray()
+            _put_size(data, len(email.headers))
+            for name, value in email.headers.items():
+                if not isinstance(name, str) or not isinstance(value, str):
+                    raise TypeError(f"Header names and values must be strings: {name!r}")
+                ref(data, name)
+                _put_bytes(data, value.encode())
+            self.field(_HEADERS, data)
+            count += 1
+
+        if email.attachments:
+            # Written straight into the body so large contents are copied once
+            parts = [bytearray()]
+            _put_size(parts[0], len(email.attachments))
+            for attachment in email.attachments:
+                if attachment.stream is not None:
+                    raise TypeError(f"Streamed attachment {attachment.filename} cannot be serialised")
+                data = bytearray()
+                ref(data, attachment.filename)
+                ref(data, attachment.content_type)
+                ref(data, attachment.filepath)
+                _put_size(data, len(attachment.content))
+                parts.append(data)
+                parts.append(attachment.content)
+            self.body.append(_ATTACHMENTS)
+            _put_size(self.body, sum(len(part) for part in parts))
+            for part in parts:
+                self.body += part
+            count += 1
+
+        self.body[start] = count
+
+    def getvalue(self) -> bytes:
+        out = bytearray(_HEADER)
+        _put_size(out, len(self.strings))
+        for value in self.strings:
+            _put_bytes(out, value.encode())
+        return b''.join((out, self.body))
+
+
+class _Reader:
+    """Decodes the format written by :class:`_Writer`"""
+
+    __slots__ = ('data', 'pos', 'strings')
+
+    def __init__(self, data: bytes):
+        if not isinstance(data, bytes):
+            data = bytes(data)
+        if data[:3] != MAGIC:
+            raise ValueError("Not a serialised Shoutbox email")
+        if len(data) < 4 or data[3] > VERSION:
+            raise ValueError(f"Unsupported serialisation version: {data[3] if len(data) > 3 else None}")
+        self.data = data
+        self.pos = 4
+        strings = [None]
+        for _ in range(self.size()):
+            strings.append(self.bytes().decode())
+        self.strings = strings
+
+    def size(self) -> int:
+        data = self.data
+        pos = self.pos
+        try:
+            n = data[pos]
+            if n == 0xFF:
+                n = _U32.unpack_from(data, pos + 1)[0]
+                self.pos = pos + 5
+            else:
+                self.pos = pos + 1
+        except (IndexError, struct.error):
+            raise ValueError("Truncated serialised email") from None
+        return n
+
+    def bytes(self) -> bytes:
+        n = self.size()
+        start = self.pos
+        end = self.pos = start + n
+        if end > len(self.data):
+            raise ValueError("Truncated serialised email")
+        return self.data[start:end]
+
+    def ref(self) -> typing.Optional[str]:
+        try:
+            return self.strings[self.size()]
+        except IndexError:
+            raise ValueError("Invalid string reference in serialised email") from None
+
+    def address(self) -> EmailAddress:
+        return EmailAddress.from_trusted(self.ref(), self.ref())
+
+    def addresses(self) -> list:
+        ref = self.ref
+        address = EmailAddress.from_trusted
+        return [address(ref(), ref()) for _ in range(self.size())]
+
+    def email(self, validate: bool) -> Email:
+        values = {}
+        for _ in range(self.size()):
+            tag = self.size()
+            end = self.size() + self.pos
+            if tag in (_TO, _CC, _BCC):
+                values[tag] = self.addresses()
+            elif tag in (_SUBJECT, _HTML, _TEXT, _IDEMPOTENCY_KEY):
+                values[tag] = self.data[self.pos:end].decode()
+            elif tag in (_FROM, _REPLY_TO):
+                values[tag] = self.address()
+            elif tag == _HEADERS:
+                values[tag] = {self.ref(): self.bytes().decode() for _ in range(self.size())}
+            elif tag == _ATTACHMENTS:
+                values[tag] = [self.attachment(validate) for _ in range(self.size())]
+            if end > len(self.data):
+                raise ValueError("Truncated serialised email")
+            # Unknown tags from newer writers are skipped
+            self.pos = end
+
+        kwargs = dict(
+            to=values.get(_TO, []),
+            subject=values.get(_SUBJECT),
+            html=values.get(_HTML),
+            text=values.get(_TEXT),
+            cc=values.get(_CC),
+            bcc=values.get(_BCC),
+            from_email=values.get(_FROM),
+            reply_to=values.get(_REPLY_TO),
+            headers=values.get(_HEADERS, {}),
+            attachments=values.get(_ATTACHMENTS, []),
+            idempotency_key=values.get(_IDEMPOTENCY_KEY),
+        )
+        if not validate:
+            return Email.from_trusted(**kwargs)
+        for name in ('to', 'cc', 'bcc'):
+            if kwargs[name]:
+                kwargs[name] = [EmailAddress(addr.email, addr.name) for addr in kwargs[name]]
+        for name in ('from_email', 'reply_to'):
+            if kwargs[name]:
+                kwargs[name] = EmailAddress(kwargs[name].email, kwargs[name].name)
+        return Email(**kwargs)
+
+    def attachment(self, validate: bool) -> Attachment:
+        filename = self.ref()
+        content_type = self.ref()
+        filepath = self.ref()
+        content = self.bytes()
+        if validate:
+            return Attachment(filepath=filepath, filename=filename, content=content, content_type=content_type)
+        attachment = Attachment.from_trusted(filename, content, content_type)
+        if filepath:
+            object.__setattr__(attachment, 'filepath', filepath)
+        return attachment
+
+
+def dumps(email: Email) -> bytes:
+    """
+    Serialise an email
+
+    Args:
+        email: Email to serialise
+
+    Returns:
+        bytes: The serialised email
+
+    Raises:
+        TypeError: If a header name or value is not a string
+    """
+    writer = _Writer()
+    _put_size(writer.body, 1)
+    writer.email(email)
+    return writer.getvalue()
+
+
+def dumps_many(emails: typing.Iterable[Email]) -> bytes:
+    """
+    Serialise a batch of emails with one shared string table
+
+    Args:
+        emails: Emails to serialise
+
+    Returns:
+        bytes: The serialised batch, read back with :func:`loads_many`
+    """
+    writer = _Writer()
+    emails = list(emails)
+    _put_size(writer.body, len(emails))
+    for email in emails:
+        writer.email(email)
+    return writer.getvalue()
+
+
+def loads(data: bytes, validate: bool = False) -> Email:
+    """
+    Deserialise an email written by :func:`dumps`
+
+    Args:
+        data: Serialised email
+        validate: Validate addresses and content as the ``Email`` constructor
+            does. By default the trusted construction path is used, see
+            :meth:`Email.from_trusted`.
+
+    Returns:
+        Email: The email
+
+    Raises:
+        ValueError: If the data is not a single serialised email
+        ValidationError: If ``validate`` is set and the email is invalid
+    """
+    emails = loads_many(data, validate)
+    if len(emails) != 1:
+        raise ValueError(f"Expected one serialised email, found {len(emails)}")
+    return emails[0]
+
+
+def loads_many(data: bytes, validate: bool = False) -> list[Email]:
+    """
+    Deserialise a batch written by :func:`dumps_many` (or :func:`dumps`)
+
+    Args:
+        data: Serialised batch
+        validate: Validate each email, see :func:`loads`
+
+    Returns:
+        list: The emails, in order
+
+    Raises:
+        ValueError: If the data is not a serialised batch
+        ValidationError: If ``validate`` is set and an email is invalid
+    """
+    reader = _Reader(data)
+    emails = [reader.email(validate) for _ in range(reader.size())]
+    if reader.pos != len(reader.data):
+        raise ValueError("Trailing data after serialised emails")
+    return emails
@@ -6,16 +6,112 @@ This module contains the SMTP client class.
 """
 
 import os
+import re
 import smtplib
+import time
+import typing
+from email.generator import BytesGenerator
+from email.message import Message
+from email import encoders
+from email.utils import make_msgid
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 
-from .models import Email
-from .exceptions import ShoutboxError
+from .models import Email, _splice_streams
+from .exceptions import ShoutboxError, ValidationError, PayloadTooLargeError
+from .results import SendResult, send_iter, asend_iter
+from .concurrency import AdaptiveLimiter
+from .mime import MessageSource, message_envelope, read_headers, without_bcc
+
+_EOL = re.compile(br'\r\n|\r|\n')
+
+
+class _DataWriter:
+    """
+    Writes message data to an SMTP connection in the DATA phase
+
+    Line endings are turned into CRLF and lines starting with a dot are
+    dot-stuffed (RFC 5321 section 4.5.2) as the data streams through, also
+    across the boundaries of the chunks written.
+    """
+
+    BUFFER_SIZE = 64 * 1024
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.size = 0
+        self._buffer = []
+        self._buffered = 0
+        self._line_start = True
+        self._cr = False
+
+    def write(self, data: bytes):
+        if self._cr and data[:1] == b'\n':
+            # The CR ending the last chunk was already sent as CRLF
+            data = data[1:]
+            self._cr = False
+        if not data:
+            return
+        self._cr = data[-1:] == b'\r'
+        crlf = data.count(b'\r\n')
+        if crlf != data.count(b'\n') or crlf != data.count(b'\r'):
+            data = _EOL.sub(b'\r\n', data)
+        if self._line_start and data[:1] == b'.':
+            data = b'.' + data
+        data = data.replace(b'\r\n.', b'\r\n..')
+        self._line_start = data[-1:] == b'\n'
+        self._buffer.append(data)
+        self._buffered += len(data)
+        if self._buffered >= self.BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            data = b''.join(self._buffer)
+            self.sock.sendall(data)
+            self.size += len(data)
+            self._buffer = []
+            self._buffered = 0
+
+    def close(self):
+        """End the data with CRLF.CRLF"""
+        self._buffer.append(b'.\r\n' if self._line_start else b'\r\n.\r\n')
+        self.flush()
+
+
+def _source_size(source) -> typing.Optional[int]:
+    """Bytes left in a raw message source, if known without reading it"""
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return len(source)
+    if isinstance(source, (str, Message)):
+        return None
+    try:
+        if source.seekable():
+            position = source.tell()
+            end = source.seek(0, os.SEEK_END)
+            source.seek(position)
+            return end - position
+    except (AttributeError, OSError):
+        pass
+    return None
+
 
 class SMTPClient:
-    """Client for the Shoutbox SMTP service"""
+    """
+    Client for the Shoutbox SMTP service
+
+    With a ``suppression`` list (see :mod:`shoutbox.suppression`), suppressed
+    recipients are dropped before sending, and with a ``domain_validator``
+    (see :mod:`shoutbox.domains`) emails to domains that cannot receive mail
+    are rejected, as with ``ShoutboxClient``. With ``max_message_size``
+    set, larger messages raise ``PayloadTooLargeError`` before the MIME
+    message is built.
+
+    Messages that are already rendered are sent with :meth:`send_raw`.
+    Streamed attachments (``Attachment(stream=...)``) are encoded as the
+    message is sent, without being read into memory.
+    """
     
     def __init__(
         self, 
@@ -23,7 +119,10 @@ class SMTPClient:
         host: str = "mail.shoutbox.net",  
         port: int = 587,
         use_tls: bool = True,
-        timeout: int = 30
+        timeout: int = 30,
+        suppression=None,
+        domain_validator=None,
+        max_message_size: typing.Optional[int] = None
     ):
         self.api_key = api_key or os.getenv('SHOUTBOX_API_KEY')
         if not self.api_key:
@@ -33,8 +132,76 @@ class SMTPClient:
         self.port = port
         self.use_tls = use_tls
         self.timeout = timeout
+        self.suppression = suppression
+        self.domain_validator = domain_validator
+        self.max_message_size = max_message_size
+
+    def _login(self, server: smtplib.SMTP):
+        """Enable TLS if configured and authenticate on an open connection"""
+        if self.use_tls:
+            server.starttls()
+        server.login(self.api_key, self.api_key)
+
+    def _build_message(self, email: Email) -> MIMEMultipart:
+        """Build the MIME message for an email"""
+        # Create message container
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = email.subject
+        
+        # Set From header with name if provided
+        if email.from_email:
+            msg['From'] = str(email.from_email)
+        
+        # Set To header(s)
+        msg['To'] = ', '.join(str(addr) for addr in email.to)
+        
+        # Set CC header(s) if provided
+        if email.cc:
+            msg['Cc'] = ', '.join(str(addr) for addr in email.cc)
+        
+        # Set Reply-To if provided
+        if email.reply_to:
+            msg['Reply-To'] = str(email.reply_to)
+        
+        # Add custom headers if any
+        if email.headers:
+            for key, value in email.headers.items():
+                msg[key] = str(value)
+
+        # Message-ID doubles as the id reported in SendResult.message_id
+        if 'Message-ID' not in msg:
+            domain = email.from_email.email.rpartition('@')[2] if email.from_email else None
+            msg['Message-ID'] = make_msgid(domain=domain or 'shoutbox.net')
+        
+        # Attach HTML content, or plain text for text-only emails
+        if email.html:
+            msg.attach(MIMEText(email.html, 'html'))
+        else:
+            msg.attach(MIMEText(email.text, 'plain'))
+        
+        # Add attachments if any
+        for attachment in email.attachments:
+            if attachment.stream is not None:
+                # The placeholder is replaced by the encoded stream while sending
+                mime_attachment = MIMEApplication(attachment.placeholder, _encoder=encoders.encode_noop)
+                mime_attachment['Content-Transfer-Encoding'] = 'base64'
+            else:
+                mime_attachment = MIMEApplication(attachment.content)
+            mime_attachment.add_header(
+                'Content-Disposition',
+                'attachment',
+                filename=attachment.filename
+            )
+            if attachment.content_type:
+                mime_attachment.add_header(
+                    'Content-Type',
+                    attachment.content_type
+                )
+            msg.attach(mime_attachment)
 
-    def send(self, email: Email) -> bool:
+        return msg
+
+    def send(self, email: Email) -> SendResult:
         """
         Send an email using the Shoutbox SMTP service
         
@@ -42,80 +209,272 @@ class SMTPClient:
             email: Email object containing the email details
             
         Returns:
-            bool: True if email was sent successfully
+            SendResult: The result, truthy when the email was sent, with the
+            Message-ID and any recipients the server refused; status
+            ``'suppressed'`` if every recipient is suppressed
             
         Raises:
             ValidationError: If email validation fails
+            PayloadTooLargeError: If the message is above ``max_message_size``
             ShoutboxError: For SMTP-related errors
         """
+        if self.suppression is not None:
+            allowed, suppressed = self.suppression.filter_email(email)
+            if allowed is None:
+                return SendResult('suppressed', email, attempts=0, suppressed=suppressed)
+            if suppressed:
+                result = self._send(allowed)
+                result.email = email
+                result.suppressed = suppressed
+                return result
+        return self._send(email)
+
+    def check_size(self, email: Email) -> int:
+        """
+        Estimated message size of an email, checked against ``max_message_size``
+
+        Returns:
+            int: The estimated size in bytes
+
+        Raises:
+            PayloadTooLargeError: If the email is too large to send
+        """
+        size = email.estimated_size('smtp')
+        if self.max_message_size is not None and size > self.max_message_size:
+            raise PayloadTooLargeError(
+                f"Email of about {size} bytes exceeds the message limit of {self.max_message_size} bytes",
+                size, self.max_message_size
+            )
+        return size
+
+    def _send(self, email: Email) -> SendResult:
+        if self.domain_validator is not None:
+            self.domain_validator.validate_email(email)
+        if self.max_message_size is not None:
+            self.check_size(email)
+        start = time.perf_counter()
         try:
-            # Create message container
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = email.subject
-            
-            # Set From header with name if provided
-            if email.from_email:
-                msg['From'] = str(email.from_email)
-            
-            # Set To header(s)
-            msg['To'] = ', '.join(str(addr) for addr in email.to)
-            
-            # Set CC header(s) if provided
+            msg = self._build_message(email)
+            data = msg.as_bytes(policy=msg.policy.clone(linesep='\r\n'))
+
+            # Get all recipient addresses
+            recipients = [addr.email for addr in email.to]
             if email.cc:
-                msg['Cc'] = ', '.join(str(addr) for addr in email.cc)
-            
-            # Set Reply-To if provided
-            if email.reply_to:
-                msg['Reply-To'] = str(email.reply_to)
-            
-            # Add custom headers if any
-            if email.headers:
-                for key, value in email.headers.items():
-                    msg[key] = str(value)
-            
-            # Attach HTML content
-            msg.attach(MIMEText(email.html, 'html'))
-            
-            # Add attachments if any
-            for attachment in email.attachments:
-                mime_attachment = MIMEApplication(attachment.content)
-                mime_attachment.add_header(
-                    'Content-Disposition',
-                    'attachment',
-                    filename=attachment.filename
-                )
-                if attachment.content_type:
-                    mime_attachment.add_header(
-                        'Content-Type',
-                        attachment.content_type
-                    )
-                msg.attach(mime_attachment)
-            
+                recipients.extend(addr.email for addr in email.cc)
+            if email.bcc:
+                recipients.extend(addr.email for addr in email.bcc)
+            # Emails built with from_trusted() are not de-duplicated; send each address once
+            recipients = list(dict.fromkeys(recipients))
+
+            sender = email.from_email.email if email.from_email else ''
+            streamed = any(attachment.stream is not None for attachment in email.attachments)
+
             # Connect to SMTP server
             with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as server:
-                if self.use_tls:
-                    server.starttls()
-                server.login(self.api_key, self.api_key)
-                
-                # Get all recipient addresses
-                recipients = [addr.email for addr in email.to]
-                if email.cc:
-                    recipients.extend(addr.email for addr in email.cc)
-                if email.bcc:
-                    recipients.extend(addr.email for addr in email.bcc)
-                
+                self._login(server)
+
                 # Send the email
-                server.send_message(msg, to_addrs=recipients)
+                if streamed:
+                    refused, sent = self._stream(
+                        server, _splice_streams(data, email.attachments, mime=True), sender, recipients, None
+                    )
+                else:
+                    refused = server.sendmail(sender, recipients, data)
+                    sent = len(data)
             
-            return True
+            return SendResult(
+                email=email,
+                message_id=msg['Message-ID'],
+                refused=refused,
+                bytes_sent=sent,
+                latency=time.perf_counter() - start
+            )
             
         except smtplib.SMTPAuthenticationError:
             raise ShoutboxError("SMTP authentication failed")
         except smtplib.SMTPException as e:
             raise ShoutboxError(f"SMTP error: {str(e)}")
+        except ShoutboxError:
+            raise
+        except Exception as e:
+            raise ShoutboxError(f"Unexpected error: {str(e)}")
+
+    def send_raw(
+        self,
+        message: MessageSource,
+        envelope_from: typing.Optional[str] = None,
+        recipients: typing.Optional[typing.Iterable[str]] = None
+    ) -> SendResult:
+        """
+        Send a message that is already rendered, as it is
+
+        The message is streamed to the server: a file object is read in
+        chunks, and a ``Message`` is serialised as it is sent, so large
+        attachments are never held in memory twice. Bytes, text and files are
+        sent unchanged; a ``Message`` is sent without its ``Bcc`` header,
+        like ``smtplib.send_message`` does.
+
+        Example:
+            client.send_raw(django_message.message())
+            with open('rendered.eml', 'rb') as f:
+                client.send_raw(f, 'sender@example.com', ['user@example.com'])
+
+        Args:
+            message: RFC 5322 message as bytes, text, an
+                ``email.message.Message`` or a binary file object
+            envelope_from: Envelope sender; defaults to the ``Sender`` or
+                ``From`` header
+            recipients: Envelope recipients; default to the ``To``, ``Cc``
+                and ``Bcc`` headers
+
+        Returns:
+            SendResult: The result, with ``email`` None, the Message-ID
+            header if the message has one and any refused recipients;
+            status ``'suppressed'`` if every recipient is suppressed
+
+        Raises:
+            ValidationError: If there are no recipients, or a recipient's
+                domain cannot receive mail
+            PayloadTooLargeError: If the message is above ``max_message_size``
+            ShoutboxError: For SMTP-related errors
+        """
+        # Only the header block is parsed, and only for what was not given
+        headers = read_headers(message)
+        if headers is not None:
+            default_from, default_recipients = message_envelope(headers)
+            envelope_from = default_from if envelope_from is None else envelope_from
+            recipients = default_recipients if recipients is None else recipients
+        if envelope_from is None or recipients is None:
+            raise ValidationError("envelope_from and recipients are required for a message that cannot be re-read")
+        recipients = list(dict.fromkeys(recipients))
+        suppressed = []
+        if self.suppression is not None:
+            suppressed = [address for address in recipients if address in self.suppression]
+            if suppressed:
+                dropped = set(suppressed)
+                recipients = [address for address in recipients if address not in dropped]
+                if not recipients:
+                    return SendResult('suppressed', attempts=0, suppressed=suppressed)
+        if not recipients:
+            raise ValidationError("Message has no recipients")
+        if self.domain_validator is not None:
+            rejected = self.domain_validator.undeliverable(recipients)
+            if rejected:
+                raise ValidationError(f"Undeliverable recipient domain: {', '.join(rejected)}")
+        size = _source_size(message)
+        if size is not None and self.max_message_size is not None and size > self.max_message_size:
+            raise PayloadTooLargeError(
+                f"Message of {size} bytes exceeds the message limit of {self.max_message_size} bytes",
+                size, self.max_message_size
+            )
+
+        start = time.perf_counter()
+        try:
+            with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as server:
+                self._login(server)
+                refused, sent = self._stream(server, message, envelope_from, recipients, size)
+            return SendResult(
+                message_id=str(headers['Message-ID']) if headers is not None and 'Message-ID' in headers else None,
+                refused=refused,
+                bytes_sent=sent,
+                latency=time.perf_counter() - start,
+                suppressed=suppressed
+            )
+        except smtplib.SMTPAuthenticationError:
+            raise ShoutboxError("SMTP authentication failed")
+        except smtplib.SMTPException as e:
+            raise ShoutboxError(f"SMTP error: {str(e)}")
+        except ShoutboxError:
+            raise
         except Exception as e:
             raise ShoutboxError(f"Unexpected error: {str(e)}")
 
+    def _stream(
+        self,
+        server: smtplib.SMTP,
+        message: typing.Union[MessageSource, typing.Iterable[bytes]],
+        envelope_from: str,
+        recipients: typing.List[str],
+        size: typing.Optional[int]
+    ) -> typing.Tuple[dict, int]:
+        """Send the envelope, then stream the message as DATA; the steps of ``SMTP.sendmail``"""
+        server.ehlo_or_helo_if_needed()
+        options = [f'SIZE={size}'] if size is not None and server.has_extn('size') else []
+        code, response = server.mail(envelope_from, options)
+        if code != 250:
+            server.rset()
+            raise smtplib.SMTPSenderRefused(code, response, envelope_from)
+        refused = {}
+        for address in recipients:
+            code, response = server.rcpt(address)
+            if code not in (250, 251):
+                refused[address] = (code, response)
+        if len(refused) == len(recipients):
+            server.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        code, response = server.docmd('DATA')
+        if code != 354:
+            server.rset()
+            raise smtplib.SMTPDataError(code, response)
+
+        writer = _DataWriter(server.sock)
+        try:
+            if isinstance(message, Message):
+                message = without_bcc(message)
+                policy = message.policy.clone(linesep='\r\n')
+                BytesGenerator(writer, mangle_from_=False, policy=policy).flatten(message)
+            elif isinstance(message, (bytes, bytearray, memoryview, str)):
+                data = message.encode('utf-8') if isinstance(message, str) else memoryview(message)
+                for offset in range(0, len(data), writer.BUFFER_SIZE):
+                    writer.write(bytes(data[offset:offset + writer.BUFFER_SIZE]))
+            elif hasattr(message, 'read'):
+                for chunk in iter(lambda: message.read(writer.BUFFER_SIZE), b''):
+                    writer.write(chunk)
+            else:
+                # Parts of a message, as for emails with streamed attachments
+                for chunk in message:
+                    writer.write(chunk)
+            writer.close()
+        except BaseException:
+            # The server is still reading data; a QUIT would only be more of it
+            server.close()
+            raise
+        code, response = server.getreply()
+        if code != 250:
+            raise smtplib.SMTPDataError(code, response)
+        return refused, writer.size
+
+    def send_iter(
+        self,
+        emails: typing.Iterable[Email],
+        window: typing.Union[int, AdaptiveLimiter] = 8,
+        retries: int = 0
+    ) -> typing.Iterator[SendResult]:
+        """
+        Send a stream of emails, yielding results as they complete
+
+        See :meth:`ShoutboxClient.send_iter`.
+
+        Args:
+            emails: Emails to send
+            window: Maximum SMTP sessions in flight, or an
+                :class:`~shoutbox.concurrency.AdaptiveLimiter`
+            retries: Extra attempts for failed sessions
+
+        Returns:
+            Iterator[SendResult]: One result per email, in completion order
+        """
+        return send_iter(self.send, emails, window, retries)
+
+    def asend_iter(
+        self,
+        emails: typing.Union[typing.Iterable[Email], typing.AsyncIterable[Email]],
+        window: typing.Union[int, AdaptiveLimiter] = 8,
+        retries: int = 0
+    ) -> typing.AsyncIterator[SendResult]:
+        """Async variant of :meth:`send_iter`, accepting a regular or async iterable"""
+        return asend_iter(self.send, emails, window, retries)
+
     def __enter__(self):
         return self
 
@@ -0,0 +1,54 @@
+"""
+Shoutbox send statistics
+~~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains the latency histogram shared by the load generator,
+the dispatcher lanes and the transport health tracking of the router.
+"""
+
+import math
+import threading
+
+
+class LatencyHistogram:
+    """
+    Thread-safe log-bucketed latency histogram
+
+    Memory stays constant however many samples are recorded; percentiles
+    are accurate to roughly 1%.
+    """
+
+    _GROWTH = math.log(1.01)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds: float):
+        bucket = int(math.log(max(seconds, 1e-6) * 1e6) / self._GROWTH)
+        with self._lock:
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + 1
+            self.count += 1
+            self.total += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, percent: float) -> float:
+        """Latency in seconds at the given percentile (0-100)"""
+        with self._lock:
+            if not self.count:
+                return 0.0
+            rank = math.ceil(self.count * percent / 100)
+            seen = 0
+            for bucket in sorted(self._buckets):
+                seen += self._buckets[bucket]
+                if seen >= rank:
+                    return min(math.exp((bucket + 1) * self._GROWTH) / 1e6, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
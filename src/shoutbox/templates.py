@@ -0,0 +1,207 @@
+"""
+Shoutbox templates
+~~~~~~~~~~~~~~~~
+
+This module contains precompiled templates for per-recipient personalisation.
+
+Templates use ``string.Template`` syntax (``$name``, ``${name}`` and ``$$``
+for a literal dollar sign). They are parsed once into a format string, so
+rendering is a single C-level ``str.format_map`` call.
+"""
+
+import html as _html
+import string
+import typing
+
+from .models import Email, EmailAddress
+from .exceptions import ValidationError
+
+_PATTERN = string.Template.pattern
+
+
+class Template:
+    """
+    Compiled ``$name`` template
+
+    Args:
+        source: Template text
+        escape: HTML-escape substituted values
+    """
+
+    __slots__ = ('source', 'escape', 'fields', '_format', '_constant')
+
+    def __init__(self, source: str, escape: bool = False):
+        self.source = source
+        self.escape = escape
+
+        pieces = []
+        fields = []
+        position = 0
+        for match in _PATTERN.finditer(source):
+            literal = source[position:match.start()]
+            pieces.append(literal.replace('{', '{{').replace('}', '}}'))
+            position = match.end()
+            if match.group('escaped') is not None:
+                pieces.append('$')
+                continue
+            name = match.group('named') or match.group('braced')
+            if name is None:
+                raise ValidationError(f"Invalid placeholder in template at position {match.start()}")
+            pieces.append('{' + name + '}')
+            if name not in fields:
+                fields.append(name)
+        pieces.append(source[position:].replace('{', '{{').replace('}', '}}'))
+
+        self.fields = tuple(fields)
+        fmt = ''.join(pieces)
+        self._format = fmt.format_map
+        self._constant = None if fields else fmt.format()
+
+    def render(self, context: typing.Mapping[str, typing.Any]) -> str:
+        """
+        Render the template
+
+        Args:
+            context: Values for the template fields
+
+        Returns:
+            str: The rendered text
+
+        Raises:
+            ValidationError: If a field is missing from ``context``
+        """
+        if self._constant is not None:
+            return self._constant
+        try:
+            if self.escape:
+                return self._format({name: _html.escape(str(context[name])) for name in self.fields})
+            return self._format(context)
+        except KeyError as e:
+            raise ValidationError(f"Missing value for template field {e}")
+
+    def __repr__(self):
+        return f"Template({self.source!r}, escape={self.escape})"
+
+
+class EmailTemplate:
+    """
+    Subject and body templates for personalised emails
+
+    Args:
+        subject: Subject template
+        html: HTML body template
+        text: Plain text body template
+        escape_html: HTML-escape values substituted into the HTML body
+    """
+
+    def __init__(
+        self,
+        subject: str,
+        html: typing.Optional[str] = None,
+        text: typing.Optional[str] = None,
+        escape_html: bool = True
+    ):
+        if not html and not text:
+            raise ValidationError("Either an HTML or text template must be provided")
+        self.subject = Template(subject)
+        self.html = Template(html, escape=escape_html) if html else None
+        self.text = Template(text) if text else None
+
+    @property
+    def fields(self) -> tuple:
+        """Names of every field used by the templates"""
+        fields = []
+        for template in (self.subject, self.html, self.text):
+            if template:
+                fields.extend(name for name in template.fields if name not in fields)
+        return tuple(fields)
+
+    def render(self, context: typing.Mapping[str, typing.Any]) -> tuple:
+        """
+        Render all templates
+
+        Returns:
+            tuple: ``(subject, html, text)``; ``html`` or ``text`` is None when not templated
+        """
+        return (
+            self.subject.render(context),
+            self.html.render(context) if self.html else None,
+            self.text.render(context) if self.text else None,
+        )
+
+    def bind(self, base: Email) -> 'PayloadRenderer':
+        """Bind the template to a base email whose other fields are shared by every recipient"""
+        return PayloadRenderer(self, base)
+
+
+class PayloadRenderer:
+    """
+    Produces per-recipient API payloads from a base email
+
+    The base email is serialised once. Each rendered payload is a shallow
+    copy of that serialisation, so attachments (already base64 encoded),
+    headers, sender and reply-to are shared between payloads and only the
+    recipient and templated fields are computed per call.
+
+    Args:
+        template: Templates for the personalised fields
+        base: Email providing every other field
+    """
+
+    def __init__(self, template: EmailTemplate, base: Email):
+        self.template = template
+        self.base = base
+        payload = dict(base.to_dict())
+        payload.pop('to', None)
+        payload.pop('html', None)
+        payload.pop('text', None)
+        self._base_payload = payload
+
+    def render(
+        self,
+        to: typing.Union[str, EmailAddress, list],
+        context: typing.Mapping[str, typing.Any],
+        validate: bool = True
+    ) -> dict:
+        """
+        Render the payload for one recipient
+
+        Args:
+            to: Recipient address(es)
+            context: Values for the template fields
+            validate: Validate string addresses; pass False for addresses
+                that are already known to be valid
+
+        Returns:
+            dict: API payload ready for ``ShoutboxClient.send_payload``
+
+        Raises:
+            ValidationError: If an address is invalid or a field is missing
+        """
+        template = self.template
+        payload = self._base_payload.copy()
+        payload['to'] = _join_addresses(to, validate)
+        payload['subject'] = template.subject.render(context)
+        if template.html:
+            payload['html'] = template.html.render(context)
+        elif template.text:
+            payload['text'] = template.text.render(context)
+        return payload
+
+    def render_many(
+        self,
+        rows: typing.Iterable[typing.Mapping[str, typing.Any]],
+        to_field: str = 'email',
+        validate: bool = True
+    ) -> typing.Iterator[dict]:
+        """Lazily render one payload per row, taking the recipient from ``to_field``"""
+        for row in rows:
+            yield self.render(row[to_field], row, validate)
+
+
+def _join_addresses(to, validate: bool) -> str:
+    if isinstance(to, EmailAddress):
+        return to.email
+    if isinstance(to, str):
+        return EmailAddress(to).email if validate else to
+    return ','.join(_join_addresses(addr, validate) for addr in to)
@@ -0,0 +1,256 @@
+"""
+Shoutbox stand-in servers
+~~~~~~~~~~~~~~~~~~~~~~~
+
+This module contains local stand-ins for the Shoutbox API and SMTP
+service. They accept everything the clients send without delivering any
+mail, which makes them useful for benchmarks, load tests and offline tests.
+"""
+
+import json
+import socketserver
+import threading
+import time
+import typing
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StandInServer:
+    """Shared lifecycle for the stand-in servers"""
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = 0
+        self._server = None
+        self._thread = None
+
+    def _make_server(self):
+        raise NotImplementedError
+
+    def start(self):
+        """Start serving in a background thread"""
+        self._server = self._make_server()
+        self._server.daemon_threads = True
+        self._server.stand_in = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Stop serving and release the socket"""
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def _record(self):
+        with self.lock:
+            self.requests += 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+
+class _APIRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().split(b';')[0].strip(), 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(chunks)
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_POST(self):
+        stand_in = self.server.stand_in
+        body = self._read_body()
+        stand_in._record()
+        with stand_in.lock:
+            stand_in.in_flight += 1
+            overloaded = stand_in.capacity is not None and stand_in.in_flight > stand_in.capacity
+            if overloaded:
+                stand_in.rejected += 1
+            else:
+                stand_in.max_in_flight = max(stand_in.max_in_flight, stand_in.in_flight)
+        try:
+            if overloaded:
+                status = 429
+            else:
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                status = stand_in.status
+        finally:
+            with stand_in.lock:
+                stand_in.in_flight -= 1
+
+        if status < 400:
+            key = self.headers.get('Idempotency-Key')
+            with stand_in.lock:
+                # A repeated key gets the id of the first send, like the real API would
+                email_id = stand_in.idempotency_keys.setdefault(key, str(uuid.uuid4())) if key else str(uuid.uuid4())
+            payload = {'emailid': email_id, 'message': 'Payload uploaded successfully'}
+        else:
+            payload = {'error': 'Stand-in error', 'status': status}
+        if stand_in.keep_payloads:
+            with stand_in.lock:
+                stand_in.payloads.append(body)
+
+        response = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+
+class _ThreadingHTTPServer(ThreadingHTTPServer):
+    # The default listen backlog of 5 drops connection attempts from busy
+    # clients, which then stall for a one second SYN retransmit
+    request_queue_size = 128
+
+
+class StandInAPIServer(_StandInServer):
+    """
+    Local HTTP server that answers ``POST /send`` like the Shoutbox API
+
+    With ``capacity`` set, requests arriving while that many are already
+    being served are answered with 429 straight away, which simulates a
+    congested or rate-limited service. ``rejected`` counts them and
+    ``max_in_flight`` records the highest concurrency that was served.
+    ``idempotency_keys`` maps each ``Idempotency-Key`` seen to the email id
+    it was answered with.
+
+    Example:
+        with StandInAPIServer() as server:
+            client = ShoutboxClient(api_key='test', base_url=server.url)
+    """
+
+    def __init__(
+        self,
+        host: str = '127.0.0.1',
+        port: int = 0,
+        latency: float = 0.0,
+        status: int = 200,
+        keep_payloads: bool = False,
+        capacity: typing.Optional[int] = None
+    ):
+        super().__init__(host, port, latency)
+        self.status = status
+        self.keep_payloads = keep_payloads
+        self.payloads = []
+        self.capacity = capacity
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.rejected = 0
+        self.idempotency_keys = {}
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def _make_server(self):
+        return _ThreadingHTTPServer((self.host, self.port), _APIRequestHandler)
+
+
+class _SMTPRequestHandler(socketserver.StreamRequestHandler):
+    disable_nagle_algorithm = True
+
+    def _reply(self, line: str):
+        self.wfile.write(line.encode() + b'\r\n')
+        self.wfile.flush()
+
+    def handle(self):
+        stand_in = self.server.stand_in
+        self._reply('220 stand-in ESMTP')
+        sender, recipients = '', []
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('ascii', 'replace').strip()
+            verb = command.split(' ', 1)[0].upper()
+
+            if verb == 'EHLO':
+                self.wfile.write(b'250-stand-in\r\n250-AUTH PLAIN LOGIN\r\n')
+                self._reply('250 8BITMIME')
+            elif verb == 'HELO':
+                self._reply('250 stand-in')
+            elif verb == 'AUTH':
+                self._reply('235 Authentication successful')
+            elif verb == 'MAIL':
+                sender = command.split(':', 1)[1].split(' ', 1)[0].strip().strip('<>')
+                recipients = []
+                self._reply('250 OK')
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip().strip('<>'))
+                self._reply('250 OK')
+            elif verb == 'DATA':
+                self._reply('354 End data with <CR><LF>.<CR><LF>')
+                size = 0
+                lines = [] if stand_in.keep_messages else None
+                while True:
+                    data = self.rfile.readline()
+                    if not data or data == b'.\r\n':
+                        break
+                    size += len(data)
+                    if lines is not None:
+                        lines.append(data[1:] if data.startswith(b'.') else data)
+                stand_in._record()
+                if stand_in.latency:
+                    time.sleep(stand_in.latency)
+                with stand_in.lock:
+                    stand_in.recipients += len(recipients)
+                    stand_in.bytes_received += size
+                    if lines is not None:
+                        stand_in.messages.append((sender, recipients, b''.join(lines)))
+                self._reply('250 OK queued')
+            elif verb in ('RSET', 'NOOP'):
+                self._reply('250 OK')
+            elif verb == 'QUIT':
+                self._reply('221 Bye')
+                return
+            else:
+                self._reply('502 Command not implemented')
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class StandInSMTPServer(_StandInServer):
+    """
+    Local SMTP server that accepts every message without delivering it
+
+    STARTTLS is not offered, so clients must be created with ``use_tls=False``.
+    With ``keep_messages`` set, ``messages`` collects the envelope sender,
+    recipients and un-dot-stuffed data of every message received.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0, keep_messages: bool = False):
+        super().__init__(host, port, latency)
+        self.recipients = 0
+        self.bytes_received = 0
+        self.keep_messages = keep_messages
+        self.messages = []
+
+    def _make_server(self):
+        return _ThreadingTCPServer((self.host, self.port), _SMTPRequestHandler)
@@ -0,0 +1,18 @@
+"""Helpers shared by the tests"""
+
+from shoutbox import Email
+
+class Clock:
+    """Stand-in for ``time.time`` and the like, moved on by setting ``now``"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def make_email(subject="Hi", **overrides):
+    """An HTML email to user@example.com, with any fields given replaced"""
+    kwargs = dict(to="user@example.com", subject=subject, html="<p>Hi</p>")
+    kwargs.update(overrides)
+    return Email(**kwargs)
@@ -0,0 +1,131 @@
+"""Tests for bulk sending"""
+
+import json
+import threading
+import pytest
+
+from shoutbox.bulk import BulkSender, Progress, read_rows
+from shoutbox.exceptions import ValidationError
+
+class RecordingClient:
+    """Client double recording sent emails"""
+
+    def __init__(self, fail_on=()):
+        self.sent = []
+        self.fail_on = set(fail_on)
+        self.lock = threading.Lock()
+
+    def send(self, email):
+        address = email.to[0].email
+        if address in self.fail_on:
+            raise RuntimeError("rejected")
+        with self.lock:
+            self.sent.append(email)
+        return {'emailid': address}
+
+def write_csv(path, count):
+    with open(path, 'w') as f:
+        f.write("email,name,code\n")
+        for i in range(count):
+            f.write(f"user{i}@example.com,User {i},C{i}\n")
+
+def read_results(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f]
+
+def read_results_lenient(path):
+    results = []
+    with open(path) as f:
+        for line in f:
+            try:
+                results.append(json.loads(line))
+            except ValueError:
+                pass
+    return results
+
+def test_read_rows_csv_and_jsonl(tmp_path):
+    """Test streaming rows from CSV and JSONL"""
+    csv_path = tmp_path / "list.csv"
+    write_csv(csv_path, 2)
+    assert [row['email'] for row in read_rows(str(csv_path))] == ["user0@example.com", "user1@example.com"]
+
+    jsonl_path = tmp_path / "list.jsonl"
+    jsonl_path.write_text('{"email": "a@example.com"}\n\n{"email": "b@example.com"}\n')
+    assert [row['email'] for row in read_rows(str(jsonl_path))] == ["a@example.com", "b@example.com"]
+
+def test_progress_low_water_mark():
+    """Test out-of-order completion keeps only rows ahead of the mark"""
+    progress = Progress()
+    for row in (1, 2, 4):
+        progress.mark(row)
+    assert progress.next_row == 0
+    assert progress.is_done(2) and not progress.is_done(3)
+
+    progress.mark(0)
+    progress.mark(3)
+    assert progress.next_row == 5
+    assert not progress._ahead
+
+def test_send_bulk_renders_rows(tmp_path):
+    """Test each row is rendered and a result line written"""
+    csv_path = tmp_path / "list.csv"
+    output = tmp_path / "results.jsonl"
+    write_csv(csv_path, 20)
+    client = RecordingClient(fail_on={"user3@example.com"})
+
+    sender = BulkSender(
+        client,
+        subject="Hello $name",
+        html="<p>Your code is ${code}</p>",
+        from_email="sender@example.com",
+        concurrency=4
+    )
+    stats = sender.send(read_rows(str(csv_path)), str(output))
+
+    assert stats == {'sent': 19, 'failed': 1, 'skipped': 0, 'suppressed': 0}
+    email = next(e for e in client.sent if e.to[0].email == "user5@example.com")
+    assert email.subject == "Hello User 5"
+    assert email.html == "<p>Your code is C5</p>"
+    assert email.to[0].name == "User 5"
+
+    results = read_results(output)
+    assert sorted(r['row'] for r in results) == list(range(20))
+    failed = [r for r in results if r['status'] == 'failed']
+    assert failed[0]['to'] == "user3@example.com"
+
+def test_send_bulk_missing_field(tmp_path):
+    """Test a missing template field fails only that row"""
+    output = tmp_path / "results.jsonl"
+    sender = BulkSender(RecordingClient(), subject="Hi $name", text="Hi")
+    stats = sender.send([{'email': "a@example.com"}], str(output))
+
+    assert stats['failed'] == 1
+    assert "name" in read_results(output)[0]['error']
+
+def test_send_bulk_resume(tmp_path):
+    """Test resuming skips rows that already have results"""
+    csv_path = tmp_path / "list.csv"
+    output = tmp_path / "results.jsonl"
+    write_csv(csv_path, 10)
+
+    # Simulate an interrupted run with a torn last line
+    with open(output, 'w') as f:
+        for row in (0, 1, 2, 5):
+            f.write(json.dumps({'row': row, 'status': 'sent'}) + "\n")
+        f.write('{"row": 6, "sta')
+
+    client = RecordingClient()
+    sender = BulkSender(client, subject="Hi", html="<p>Hi $name</p>", concurrency=2)
+    stats = sender.send(read_rows(str(csv_path)), str(output), resume=True)
+
+    assert stats == {'sent': 6, 'failed': 0, 'skipped': 4, 'suppressed': 0}
+    assert sorted(e.to[0].email for e in client.sent) == sorted(
+        f"user{i}@example.com" for i in (3, 4, 6, 7, 8, 9)
+    )
+    rows = [r['row'] for r in read_results_lenient(output)]
+    assert sorted(rows) == list(range(10))
+
+def test_bulk_sender_requires_body():
+    """Test a body template is required"""
+    with pytest.raises(ValidationError):
+        BulkSender(RecordingClient(), subject="Hi")
@@ -0,0 +1,112 @@
+"""Tests for chunked sends of large recipient lists"""
+
+import json
+import pytest
+
+from shoutbox import ShoutboxClient, Email, PartialSendError
+from shoutbox.exceptions import APIError
+from shoutbox.results import send_iter, is_retryable
+from shoutbox.testing import StandInAPIServer
+
+def make_email(count, **overrides):
+    kwargs = dict(
+        from_email="news@example.com",
+        to=[f"user{i}@example.com" for i in range(count)],
+        subject="Newsletter",
+        html="<p>News</p>"
+    )
+    kwargs.update(overrides)
+    return Email(**kwargs)
+
+def fail_chunks(client, failures):
+    """Make sends of the chunks starting with the given recipients fail a number of times"""
+    send = client._send
+
+    def flaky(email, key):
+        first = email.to[0].email
+        if failures.get(first):
+            failures[first] -= 1
+            raise APIError("Server error", status_code=503)
+        return send(email, key)
+
+    client._send = flaky
+
+def test_chunked_send():
+    """Test large recipient lists are split into concurrent requests"""
+    with StandInAPIServer(keep_payloads=True) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, max_recipients_per_request=100)
+        result = client.send(make_email(250))
+        small = client.send(make_email(100))
+
+    assert server.requests == 4
+    payloads = sorted((json.loads(body) for body in server.payloads[:3]), key=lambda p: p['to'])
+    recipients = [addr for payload in payloads for addr in payload['to'].split(',')]
+    assert sorted(recipients) == sorted(f"user{i}@example.com" for i in range(250))
+    assert result.ok
+    assert len(result.chunks) == 3
+    assert [chunk.index for chunk in result.chunks] == [0, 1, 2]
+    assert len(result['emailids']) == 3
+    assert result.message_id == result.chunks[0].message_id
+    assert len(result.accepted) == 250
+    assert small.chunks is None
+
+def test_only_failed_chunks_retried():
+    """Test a failing chunk is retried without repeating the others"""
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, max_recipients_per_request=10)
+        fail_chunks(client, {"user10@example.com": 2})
+        result = client.send(make_email(30))
+
+    assert result.ok
+    assert server.requests == 3
+    assert [chunk.attempts for chunk in result.chunks] == [1, 3, 1]
+    assert result.attempts == 5
+
+def test_partial_send():
+    """Test a partly failed send reports which chunks succeeded"""
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, max_recipients_per_request=10, chunk_retries=1)
+        fail_chunks(client, {"user20@example.com": 5})
+        with pytest.raises(PartialSendError) as exc_info:
+            client.send(make_email(30))
+
+    result = exc_info.value.result
+    assert not result.ok
+    assert [chunk.ok for chunk in result.chunks] == [True, True, False]
+    assert isinstance(result.chunks[2].error, APIError)
+    assert len(result.accepted) == 20
+    assert len(result['emailids']) == 2
+    assert not is_retryable(exc_info.value)
+    # Only the failed chunk needs sending again
+    retry = [chunk.email for chunk in result.chunks if not chunk.ok]
+    assert [addr.email for addr in retry[0].to][0] == "user20@example.com"
+
+def test_all_chunks_failed():
+    """Test a send where every chunk fails raises the chunk error"""
+    with StandInAPIServer(status=400) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, max_recipients_per_request=10)
+        with pytest.raises(APIError) as exc_info:
+            client.send(make_email(25))
+    assert exc_info.value.status_code == 400
+    # 400 responses are not retried
+    assert server.requests == 3
+
+def test_chunk_idempotency_keys():
+    """Test every chunk is sent with its own idempotency key"""
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, max_recipients_per_request=10,
+                                idempotency_keys=True)
+        email = make_email(20)
+        client.send(email)
+        client.send(make_email(20, idempotency_key="campaign-7"))
+
+    key = email.derive_idempotency_key()
+    assert set(server.idempotency_keys) == {f"{key}:1", f"{key}:2", "campaign-7:1", "campaign-7:2"}
+
+def test_chunked_send_iter():
+    """Test chunked sends inside send_iter"""
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, max_recipients_per_request=5)
+        results = list(send_iter(client.send, [make_email(12), make_email(3)], window=2))
+    assert all(result.ok for result in results)
+    assert server.requests == 4
@@ -0,0 +1,55 @@
+"""Tests for the command line interface"""
+
+import pytest
+
+from shoutbox.cli import main, _email_source
+
+def test_bench_api_stand_in(capsys):
+    """Test the bench command against the stand-in API server"""
+    assert main(['bench', '--stand-in', '-n', '20', '-c', '2', '--attachments', '0:1,1k:1', '--interval', '0.01']) == 0
+
+    output = capsys.readouterr().out
+    assert "local stand-in" in output
+    assert "sent        20" in output
+    assert "errors      0" in output
+
+def test_bench_smtp_stand_in(capsys):
+    """Test the bench command against the stand-in SMTP server"""
+    assert main(['bench', '--transport', 'smtp', '--stand-in', '-n', '5', '-q']) == 0
+
+    output = capsys.readouterr().out
+    assert "sent        5" in output
+
+def test_bench_builds_fresh_emails():
+    """Test the bench sends a new email each time, sharing only the generated content"""
+    import argparse
+    args = argparse.Namespace(attachments='1k', payload_size='1k', to='user@example.com', from_email='bench@example.com')
+    source = _email_source(args)
+    first, second = source(), source()
+    assert first is not second and first == second
+    assert first.attachments[0] is not second.attachments[0]
+    assert first.attachments[0].content is second.attachments[0].content
+
+def test_bench_invalid_option():
+    """Test invalid options exit with a usage error"""
+    with pytest.raises(SystemExit):
+        main(['bench', '--stand-in', '-n', '1', '--payload-size', 'huge'])
+
+def test_no_command(capsys):
+    """Test running without a command prints help"""
+    assert main([]) == 2
+    assert "bench" in capsys.readouterr().out
+
+def test_send_bulk_stand_in(tmp_path, capsys):
+    """Test the send-bulk command against the stand-in API server"""
+    recipients = tmp_path / "list.jsonl"
+    recipients.write_text('{"email": "a@example.com", "name": "A"}\n{"email": "b@example.com", "name": "B"}\n')
+    output = tmp_path / "results.jsonl"
+
+    assert main([
+        'send-bulk', str(recipients), '--stand-in', '-o', str(output),
+        '--subject', 'Hello $name', '--html', '<p>Hi $name</p>', '--from', 'sender@example.com'
+    ]) == 0
+
+    assert "sent 2, failed 0, skipped 0, suppressed 0" in capsys.readouterr().out
+    assert len(output.read_text().splitlines()) == 2
@@ -4,7 +4,7 @@ import os
 import pytest
 from unittest.mock import patch, Mock
 
-from shoutbox import ShoutboxClient, Email, EmailAddress, Attachment
+from shoutbox import ShoutboxClient, Email, EmailAddress, Attachment, SendResult
 from shoutbox.exceptions import ShoutboxError, ValidationError, APIError
 
 def test_client_initialization():
@@ -36,7 +36,7 @@ def test_send_basic_email():
     
     response = client.send(email)
     assert response is not None
-    assert isinstance(response, dict)
+    assert isinstance(response, SendResult)
 
 def test_send_email_with_attachment():
     """Test sending an email with attachment"""
@@ -60,7 +60,7 @@ def test_send_email_with_attachment():
     
     response = client.send(email)
     assert response is not None
-    assert isinstance(response, dict)
+    assert isinstance(response, SendResult)
 
 def test_send_email_with_example_attachments():
     """Test sending an email with example attachments (important.txt and test.xlsx)"""
@@ -85,7 +85,7 @@ def test_send_email_with_example_attachments():
     
     response = client.send(email)
     assert response is not None
-    assert isinstance(response, dict)
+    assert isinstance(response, SendResult)
 
 def test_send_email_with_custom_headers():
     """Test sending an email with custom headers"""
@@ -104,7 +104,7 @@ def test_send_email_with_custom_headers():
     
     response = client.send(email)
     assert response is not None
-    assert isinstance(response, dict)
+    assert isinstance(response, SendResult)
 
 def test_api_error_handling():
     """Test API error handling"""
@@ -145,4 +145,54 @@ def test_context_manager():
         
         response = client.send(email)
         assert response is not None
-        assert isinstance(response, dict)
+        assert isinstance(response, SendResult)
+
+def test_send_posts_encoded_body():
+    """Test the email is posted as pre-encoded JSON bytes that retries reuse"""
+    client = ShoutboxClient(api_key="test-key")
+    email = Email(
+        from_email="sender@example.com",
+        to="recipient@example.com",
+        subject="Test Email",
+        html="<h1>Test</h1>"
+    )
+    response = Mock(status_code=200, content=b'{"emailid": "1"}')
+
+    with patch.object(client.session, 'post', return_value=response) as post:
+        assert client.send(email) == {'emailid': '1'}
+        client.send(email)
+
+    first, second = post.call_args_list
+    assert 'json' not in first.kwargs
+    assert first.kwargs['data'] is second.kwargs['data']
+    assert first.kwargs['data'] == email.to_json()
+
+def test_send_uses_json_codec():
+    """Test payloads and responses go through the configured JSON codec"""
+    from shoutbox.json_codec import JSONCodec
+
+    class RecordingCodec(JSONCodec):
+        def __init__(self):
+            self.calls = []
+
+        def dumps(self, obj):
+            self.calls.append('dumps')
+            return super().dumps(obj)
+
+        def loads(self, data):
+            self.calls.append('loads')
+            return super().loads(data)
+
+    codec = RecordingCodec()
+    client = ShoutboxClient(api_key="test-key", json_codec=codec)
+    assert client.json_codec is codec
+
+    email = Email(to="recipient@example.com", subject="Test Email", html="<h1>Test</h1>")
+    response = Mock(status_code=200, content=b'{"emailid": "1"}')
+    with patch.object(client.session, 'post', return_value=response):
+        assert client.send(email) == {'emailid': '1'}
+
+    assert codec.calls == ['dumps', 'loads']
+
+    with pytest.raises(ValueError):
+        ShoutboxClient(api_key="test-key", json_codec="no-such-codec")
@@ -0,0 +1,112 @@
+"""Tests for adaptive concurrency"""
+
+import threading
+import time
+import pytest
+
+from shoutbox import ShoutboxClient, Email
+from shoutbox.bulk import BulkSender
+from shoutbox.concurrency import AdaptiveLimiter
+from shoutbox.results import send_iter
+from shoutbox.testing import StandInAPIServer
+
+def test_limiter_additive_increase():
+    """Test the limit grows by about one per window of healthy sends"""
+    limiter = AdaptiveLimiter(initial=4, max_limit=10)
+    for _ in range(10):
+        limiter.record(0.01)
+    assert 5 <= limiter.limit <= 6
+
+    for _ in range(1000):
+        limiter.record(0.01)
+    assert limiter.limit == 10
+
+def test_limiter_multiplicative_decrease():
+    """Test congestion halves the limit once per window"""
+    limiter = AdaptiveLimiter(initial=32, min_limit=2)
+    limiter.record(0.01, congested=True)
+    assert limiter.limit == 16
+    # Responses still in flight from the old window do not cut again
+    for _ in range(10):
+        limiter.record(0.01, congested=True)
+    assert limiter.limit == 16
+    for _ in range(10):
+        limiter.record(0.01, congested=True)
+    assert limiter.limit == 8
+
+    for _ in range(100):
+        limiter.record(0.01, congested=True)
+    assert limiter.limit == 2
+    stats = limiter.stats()
+    assert stats['limit'] == 2
+    assert stats['congestion_events'] == 121
+
+def test_limiter_latency_gradient():
+    """Test rising latency reduces the limit before any errors"""
+    limiter = AdaptiveLimiter(initial=20)
+    for _ in range(50):
+        limiter.record(0.01)
+    grown = limiter.limit
+    for _ in range(50):
+        limiter.record(0.1)
+    assert limiter.limit < grown
+    assert limiter.decreases >= 1
+    assert limiter.stats()['baseline_latency'] < 0.1
+
+def test_limiter_validation():
+    """Test invalid settings are rejected"""
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(min_limit=5, max_limit=2)
+    with pytest.raises(ValueError):
+        AdaptiveLimiter(decrease=1.5)
+    assert AdaptiveLimiter(initial=500, max_limit=10).limit == 10
+
+def test_send_iter_adapts_to_congestion():
+    """Test send_iter backs off a stand-in server that rejects excess concurrency"""
+    emails = [Email(to=f"user{i}@example.com", subject="Test", html="<p>x</p>") for i in range(300)]
+    limiter = AdaptiveLimiter(initial=32, max_limit=32)
+
+    with StandInAPIServer(latency=0.005, capacity=4) as server:
+        client = ShoutboxClient(api_key='test', base_url=server.url, pool_size=32)
+        results = list(send_iter(client.send, emails, window=limiter, retries=5, backoff=0.01))
+
+    assert all(result.ok for result in results)
+    assert server.rejected > 0
+    assert limiter.decreases > 0
+    assert limiter.limit < 32
+
+def test_send_iter_adaptive_window_bounds_in_flight():
+    """Test the adaptive limit caps the sends in flight"""
+    lock = threading.Lock()
+    state = {'in_flight': 0, 'max': 0}
+
+    def send(email):
+        with lock:
+            state['in_flight'] += 1
+            state['max'] = max(state['max'], state['in_flight'])
+        time.sleep(0.002)
+        with lock:
+            state['in_flight'] -= 1
+        return {}
+
+    limiter = AdaptiveLimiter(initial=3, max_limit=3)
+    assert len(list(send_iter(send, range(50), window=limiter))) == 50
+    assert state['max'] <= 3
+    assert limiter.samples == 50
+
+def test_bulk_sender_adaptive(tmp_path):
+    """Test BulkSender feeds an adaptive limiter"""
+    class Client:
+        def send(self, email):
+            time.sleep(0.001)
+            return {'emailid': email.to[0].email}
+
+    limiter = AdaptiveLimiter(initial=2, max_limit=16)
+    sender = BulkSender(Client(), subject="Hi $name", text="Hello", concurrency=limiter)
+    rows = [{'email': f"user{i}@example.com", 'name': str(i)} for i in range(100)]
+    stats = sender.send(rows, str(tmp_path / "out.jsonl"))
+
+    assert stats['sent'] == 100
+    assert sender.concurrency == 16
+    assert limiter.samples == 100
+    assert limiter.limit > 2
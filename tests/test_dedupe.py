@@ -0,0 +1,123 @@
+"""Tests for idempotency keys and duplicate suppression"""
+
+import threading
+import pytest
+
+from shoutbox import ShoutboxClient
+from shoutbox.dedupe import MemoryDedupeStore, SQLiteDedupeStore
+from shoutbox.exceptions import APIError
+from shoutbox.testing import StandInAPIServer
+from helpers import Clock, make_email
+
+def test_memory_store_lru_and_ttl():
+    """Test the in-memory store drops the least recently used and expired keys"""
+    clock = Clock()
+    store = MemoryDedupeStore(max_size=2, ttl=60, clock=clock)
+    store.put('a', 'id-a')
+    store.put('b')
+    assert store.get('a') == 'id-a'
+    store.put('c', 'id-c')
+    # 'b' was least recently used
+    assert store.get('b') is None
+    assert store.get('a') == 'id-a'
+    assert len(store) == 2
+
+    clock.now += 61
+    assert store.get('a') is None
+    assert store.get('c') is None
+
+def test_sqlite_store(tmp_path):
+    """Test the SQLite store persists keys until they expire"""
+    clock = Clock()
+    path = str(tmp_path / 'dedupe.db')
+    store = SQLiteDedupeStore(path, ttl=60, clock=clock)
+    store.put('a', 'id-a')
+    store.put('b')
+    store.close()
+
+    store = SQLiteDedupeStore(path, ttl=60, clock=clock)
+    assert store.get('a') == 'id-a'
+    assert store.get('b') == ''
+    assert store.get('c') is None
+    assert len(store) == 2
+    clock.now += 61
+    assert store.get('a') is None
+    assert len(store) == 0
+    store.close()
+
+def test_idempotency_header():
+    """Test explicit and derived keys are sent as the Idempotency-Key header"""
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url)
+        client.send(make_email())
+        assert server.idempotency_keys == {}
+
+        first = client.send(make_email(idempotency_key="reset-1"))
+        again = client.send(make_email(idempotency_key="reset-1"))
+        assert first.message_id == again.message_id
+        assert set(server.idempotency_keys) == {"reset-1"}
+
+        client = ShoutboxClient(api_key="test", base_url=server.url, idempotency_keys=True)
+        client.send(make_email())
+        assert make_email().derive_idempotency_key() in server.idempotency_keys
+
+def test_dedupe_store_suppresses_repeat_sends():
+    """Test repeat sends of a key within the window do not call the API"""
+    store = MemoryDedupeStore()
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, dedupe_store=store)
+        first = client.send(make_email())
+        repeat = client.send(make_email())
+        other = client.send(make_email(to="other@example.com"))
+
+    assert server.requests == 2
+    assert first.ok and not first.duplicate
+    assert repeat.ok and repeat.duplicate
+    assert repeat.message_id == first.message_id
+    assert repeat.attempts == 0
+    assert not other.duplicate
+
+def test_keyed_variants_not_duplicates():
+    """Test variants of a keyed email are each sent, under their own keys"""
+    base = make_email(idempotency_key="campaign-1")
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, dedupe_store=MemoryDedupeStore())
+        first = client.send(base.with_overrides(to="x@example.com"))
+        second = client.send(base.with_overrides(to="y@example.com"))
+        keyed = client.send(base.with_overrides(to="z@example.com", idempotency_key="campaign-1:z"))
+        again = client.send(base.with_overrides(to="z@example.com", idempotency_key="campaign-1:z"))
+
+    assert not first.duplicate and not second.duplicate and not keyed.duplicate
+    assert again.duplicate
+    assert server.requests == 3
+    # Keyless variants get keys derived from their own content
+    assert "campaign-1" not in server.idempotency_keys
+    assert len(server.idempotency_keys) == 3 and "campaign-1:z" in server.idempotency_keys
+
+def test_dedupe_concurrent_sends():
+    """Test concurrent sends of one key make a single request"""
+    with StandInAPIServer(latency=0.05) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, dedupe_store=MemoryDedupeStore())
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(client.send(make_email()))) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    assert server.requests == 1
+    assert len(results) == 5
+    assert sum(not result.duplicate for result in results) == 1
+    assert len({result.message_id for result in results}) == 1
+
+def test_dedupe_failed_send_not_remembered():
+    """Test a failed send can be retried"""
+    store = MemoryDedupeStore()
+    with StandInAPIServer(status=500) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, dedupe_store=store)
+        with pytest.raises(APIError):
+            client.send(make_email())
+        server.status = 200
+        result = client.send(make_email())
+    assert result.ok and not result.duplicate
+    assert server.requests == 2
@@ -0,0 +1,168 @@
+"""Tests for priority dispatch"""
+
+import threading
+import time
+import pytest
+
+from shoutbox.dispatch import Dispatcher, Lane
+from shoutbox.exceptions import APIError
+from shoutbox.results import SendResult
+from helpers import make_email
+
+class SlowTransport:
+    """Transport double with a fixed send time, recording concurrency per subject prefix"""
+
+    def __init__(self, delay=0.02):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.in_flight = {}
+        self.max_in_flight = {}
+        self.order = []
+
+    def send(self, email):
+        kind = email.subject.split()[0]
+        with self.lock:
+            self.in_flight[kind] = self.in_flight.get(kind, 0) + 1
+            self.max_in_flight[kind] = max(self.max_in_flight.get(kind, 0), self.in_flight[kind])
+            self.order.append(kind)
+        try:
+            time.sleep(self.delay)
+            if 'fail' in email.subject:
+                raise APIError("Server error", status_code=500)
+            if 'suppressed' in email.subject:
+                return SendResult('suppressed', email, attempts=0)
+            return SendResult(email=email, message_id=email.subject)
+        finally:
+            with self.lock:
+                self.in_flight[kind] -= 1
+
+def test_transactional_not_delayed_by_bulk():
+    """Test transactional mail skips a bulk backlog"""
+    transport = SlowTransport(delay=0.02)
+    with Dispatcher(transport, concurrency=4) as dispatcher:
+        for i in range(200):
+            dispatcher.submit(make_email(f"bulk {i}"), priority='bulk')
+        start = time.perf_counter()
+        result = dispatcher.send(make_email("transactional reset"), priority='transactional')
+        elapsed = time.perf_counter() - start
+        assert result.ok
+        assert result.message_id == "transactional reset"
+        # 200 bulk sends over 4 slots would take a second
+        assert elapsed < 0.2
+        metrics = dispatcher.metrics()
+        assert metrics['bulk']['depth'] > 100
+        dispatcher.close(wait=False)
+
+def test_reserved_slots_unused_by_bulk():
+    """Test lower lanes never take the slots reserved for transactional mail"""
+    transport = SlowTransport(delay=0.005)
+    with Dispatcher(transport, concurrency=6) as dispatcher:
+        futures = [dispatcher.submit(make_email(f"bulk {i}"), priority='bulk') for i in range(40)]
+        futures += [dispatcher.submit(make_email(f"default {i}")) for i in range(40)]
+        for future in futures:
+            assert future.result().ok
+    # default_lanes() reserves two slots for the transactional lane
+    assert transport.max_in_flight['bulk'] <= 4
+    assert transport.max_in_flight['default'] <= 4
+
+def test_weighted_fairness():
+    """Test busy lanes are served in proportion to their weights"""
+    gate = threading.Event()
+
+    class Gated(SlowTransport):
+        def send(self, email):
+            if email.subject == "high gate":
+                gate.wait()
+            return super().send(email)
+
+    transport = Gated(delay=0.001)
+    lanes = [Lane('high', weight=3), Lane('low', weight=1)]
+    with Dispatcher(transport, concurrency=1, lanes=lanes, default_priority='low') as dispatcher:
+        # Hold the only slot while both lanes fill up
+        dispatcher.submit(make_email("high gate"), priority='high')
+        time.sleep(0.05)
+        for i in range(40):
+            dispatcher.submit(make_email(f"high {i}"), priority='high')
+            dispatcher.submit(make_email(f"low {i}"), priority='low')
+        gate.set()
+    first = transport.order[1:41]
+    assert 27 <= first.count('high') <= 33
+
+def test_metrics():
+    """Test per-lane metrics"""
+    transport = SlowTransport(delay=0.001)
+    with Dispatcher(transport, concurrency=4) as dispatcher:
+        futures = [dispatcher.submit(make_email(f"bulk {i}"), priority='bulk') for i in range(10)]
+        futures.append(dispatcher.submit(make_email("bulk suppressed")))
+        futures.append(dispatcher.submit(make_email("bulk fail")))
+        results = [future.result() for future in futures]
+        metrics = dispatcher.metrics()
+
+    assert not results[-1].ok
+    assert isinstance(results[-1].error, APIError)
+    assert set(metrics) == {'transactional', 'default', 'bulk'}
+    assert metrics['bulk']['submitted'] == 10
+    assert metrics['bulk']['sent'] == 10
+    assert metrics['default']['failed'] == 1
+    assert metrics['default']['suppressed'] == 1
+    assert metrics['default']['sent'] == 0
+    assert metrics['bulk']['max_depth'] >= 1
+    assert metrics['bulk']['depth'] == 0
+    assert metrics['bulk']['latency_p50'] > 0
+    assert metrics['transactional']['submitted'] == 0
+    assert metrics['transactional']['wait_p99'] == 0
+
+def test_send_raises_failure():
+    """Test Dispatcher.send raises the send's error"""
+    with Dispatcher(SlowTransport(delay=0), concurrency=4) as dispatcher:
+        with pytest.raises(APIError):
+            dispatcher.send(make_email("transactional fail"), priority='transactional')
+
+def test_max_depth():
+    """Test full lanes block or raise"""
+    gate = threading.Event()
+
+    class Blocked:
+        def send(self, email):
+            gate.wait()
+            return {'emailid': 'x'}
+
+    lanes = [Lane('default', max_depth=2)]
+    dispatcher = Dispatcher(Blocked(), concurrency=1, lanes=lanes)
+    futures = [dispatcher.submit(make_email("default 1"))]
+    time.sleep(0.05)
+    futures += [dispatcher.submit(make_email(f"default {i}")) for i in range(2)]
+    with pytest.raises(OverflowError):
+        dispatcher.submit(make_email("default 3"), block=False)
+
+    submitted = threading.Event()
+    thread = threading.Thread(target=lambda: futures.append(dispatcher.submit(make_email("default 4"))) or submitted.set())
+    thread.start()
+    assert not submitted.wait(0.05)
+    gate.set()
+    assert submitted.wait(1)
+    dispatcher.close()
+    assert [future.result().ok for future in futures] == [True] * 4
+    assert futures[0].result()['emailid'] == 'x'
+
+def test_close_drains_queues():
+    """Test close sends queued emails and rejects new ones"""
+    transport = SlowTransport(delay=0.001)
+    dispatcher = Dispatcher(transport, concurrency=4)
+    futures = [dispatcher.submit(make_email(f"bulk {i}"), priority='bulk') for i in range(20)]
+    dispatcher.close()
+    assert all(future.done() and future.result().ok for future in futures)
+    with pytest.raises(RuntimeError):
+        dispatcher.submit(make_email("bulk late"))
+
+def test_invalid_configuration():
+    """Test unknown priorities and over-reserved lanes are rejected"""
+    with pytest.raises(ValueError):
+        Dispatcher(SlowTransport(), concurrency=2)
+    with pytest.raises(ValueError):
+        Dispatcher(SlowTransport(), lanes=[Lane('bulk')])
+    with pytest.raises(ValueError):
+        Lane('bulk', weight=0)
+    with Dispatcher(SlowTransport(), concurrency=4) as dispatcher:
+        with pytest.raises(ValueError):
+            dispatcher.submit(make_email("x"), priority='urgent')
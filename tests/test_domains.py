@@ -0,0 +1,120 @@
+"""Tests for recipient domain checks"""
+
+import collections
+import threading
+import time
+import pytest
+
+from shoutbox import ShoutboxClient, Email
+from shoutbox.domains import DomainValidator, DomainStatus, SocketResolver
+from shoutbox.exceptions import ValidationError
+from shoutbox.testing import StandInAPIServer
+from helpers import Clock
+
+class StubResolver:
+    """Resolver answering from a table, counting lookups per domain"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = collections.Counter()
+        self.lock = threading.Lock()
+        self.answers = {
+            'example.com': DomainStatus('example.com', True, 'mx', ['mx.example.com']),
+            'example.org': DomainStatus('example.org', True, 'a', ['192.0.2.1']),
+            'gmial.com': DomainStatus('gmial.com', False, 'nxdomain'),
+            'nomail.example': DomainStatus('nomail.example', False, 'null_mx'),
+        }
+
+    def resolve(self, domain):
+        with self.lock:
+            self.calls[domain] += 1
+        time.sleep(self.delay)
+        if domain == 'timeout.example':
+            raise TimeoutError("resolver timed out")
+        return self.answers.get(domain, DomainStatus(domain, False, 'nxdomain'))
+
+def test_check_and_cache_ttls():
+    """Test answers are cached for their TTL, negative ones shorter"""
+    resolver = StubResolver()
+    clock = Clock()
+    validator = DomainValidator(resolver, ttl=3600, negative_ttl=60, error_ttl=5, clock=clock)
+    assert validator.check('example.com').reason == 'mx'
+    assert validator.check('EXAMPLE.com').deliverable
+    assert validator.check('user@example.com')
+    assert not validator.check('gmial.com')
+    assert not validator.check('nomail.example')
+    # Resolver failures do not block sending
+    assert validator.check('timeout.example').reason == 'error'
+    assert validator.is_deliverable('user@timeout.example')
+    assert resolver.calls == {'example.com': 1, 'gmial.com': 1, 'nomail.example': 1, 'timeout.example': 1}
+
+    clock.now += 61
+    validator.check('example.com')
+    validator.check('gmial.com')
+    validator.check('timeout.example')
+    assert resolver.calls['example.com'] == 1
+    assert resolver.calls['gmial.com'] == 2
+    assert resolver.calls['timeout.example'] == 2
+    assert validator.stats()['lookups'] == 6
+
+def test_max_size():
+    """Test the least recently used domains are dropped"""
+    resolver = StubResolver()
+    validator = DomainValidator(resolver, max_size=2)
+    for domain in ('a.example', 'b.example', 'a.example', 'c.example', 'a.example', 'b.example'):
+        validator.check(domain)
+    assert resolver.calls == {'a.example': 1, 'b.example': 2, 'c.example': 1}
+
+def test_campaign_list_one_lookup_per_domain():
+    """Test filtering a list looks up each distinct domain once, concurrently"""
+    resolver = StubResolver(delay=0.01)
+    validator = DomainValidator(resolver, concurrency=8)
+    domains = ['example.com', 'example.org', 'gmial.com'] + [f'shop{i}.example' for i in range(20)]
+    rows = [{'email': f"user{i}@{domains[i % len(domains)]}"} for i in range(2000)]
+    rejected = []
+    start = time.perf_counter()
+    kept = list(validator.filter(rows, batch_size=500, rejected=rejected))
+    elapsed = time.perf_counter() - start
+
+    assert all(count == 1 for count in resolver.calls.values())
+    assert len(resolver.calls) == len(domains)
+    assert [row['email'].split('@')[1] for row in kept] == [
+        row['email'].split('@')[1] for row in rows if row['email'].endswith(('example.com', 'example.org'))
+    ]
+    assert len(kept) + len(rejected) == len(rows)
+    # 23 lookups of 10ms would take 0.23s one after another
+    assert elapsed < 0.2
+    assert validator.undeliverable(["a@example.com", "b@gmial.com", "c@Gmial.COM"]) == ["b@gmial.com", "c@Gmial.COM"]
+
+def test_concurrent_checks_share_lookup():
+    """Test concurrent checks of an uncached domain make one lookup"""
+    resolver = StubResolver(delay=0.05)
+    validator = DomainValidator(resolver)
+    threads = [threading.Thread(target=validator.check, args=('example.com',)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert resolver.calls == {'example.com': 1}
+
+def test_client_rejects_undeliverable_domain():
+    """Test the client raises before calling the API for an undeliverable domain"""
+    validator = DomainValidator(StubResolver())
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, domain_validator=validator)
+        assert client.send(Email(to="user@example.com", subject="Hi", html="<p>Hi</p>")).ok
+        with pytest.raises(ValidationError, match="typo@gmial.com"):
+            client.send(Email(to=["user@example.com", "typo@gmial.com"], subject="Hi", html="<p>Hi</p>"))
+    assert server.requests == 1
+
+def test_socket_resolver_localhost():
+    """Test the fallback resolver finds address records"""
+    status = SocketResolver().resolve('localhost')
+    assert status.deliverable
+    assert status.reason in ('a', 'error')
+
+def test_socket_resolver_never_negative():
+    """Test the fallback resolver counts a domain without address records as deliverable"""
+    status = SocketResolver().resolve('no-such-domain.invalid')
+    assert status.deliverable
+    assert status.reason == 'error'
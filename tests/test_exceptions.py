@@ -123,3 +123,12 @@ def test_validation_error_details():
     assert 'attachments' in error_str
     assert 'filename' in error_str
     assert 'content' in error_str
+
+def test_payload_too_large_error():
+    """Test PayloadTooLargeError keeps its sizes when pickled"""
+    import pickle
+    from shoutbox.exceptions import PayloadTooLargeError
+    error = PayloadTooLargeError("Too large", size=2000, limit=1000)
+    assert isinstance(error, ValidationError)
+    restored = pickle.loads(pickle.dumps(error))
+    assert (str(restored), restored.size, restored.limit) == ("Too large", 2000, 1000)
@@ -33,7 +33,7 @@ def test_basic_email_endpoint(app, client):
         )
         
         response = shoutbox.send(email)
-        return jsonify({'success': True, 'response': response})
+        return jsonify({'success': True, 'response': response.body})
     
     # Test endpoint
     response = client.post('/send-email')
@@ -64,7 +64,7 @@ def test_email_with_attachment_endpoint(app, client):
         )
         
         response = shoutbox.send(email)
-        return jsonify({'success': True, 'response': response})
+        return jsonify({'success': True, 'response': response.body})
     
     # Test endpoint
     response = client.post('/send-with-attachment')
@@ -89,7 +89,7 @@ def test_bulk_email_endpoint(app, client):
         )
         
         response = shoutbox.send(email)
-        return jsonify({'success': True, 'response': response})
+        return jsonify({'success': True, 'response': response.body})
     
     # Test endpoint
     response = client.post('/send-bulk')
@@ -113,7 +113,7 @@ def test_error_handling(app, client):
             )
             
             response = shoutbox.send(email)
-            return jsonify({'success': True, 'response': response})
+            return jsonify({'success': True, 'response': response.body})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 400
     
@@ -0,0 +1,49 @@
+"""Tests for the JSON codecs"""
+
+import json
+import pytest
+
+from shoutbox import Email, Attachment
+from shoutbox.json_codec import JSONCodec, get_codec, available_codecs
+
+PAYLOAD = {'to': "a@example.com,b@example.com", 'subject': "Café </p>", 'headers': {'X-Count': 3}}
+
+@pytest.mark.parametrize('name', available_codecs())
+def test_codec_round_trip(name):
+    """Test every installed codec produces standard JSON"""
+    codec = get_codec(name)
+    data = codec.dumps(PAYLOAD)
+    assert isinstance(data, bytes)
+    assert json.loads(data) == PAYLOAD
+    assert codec.loads(data) == PAYLOAD
+    assert codec.loads(data.decode()) == PAYLOAD
+
+    with pytest.raises(ValueError):
+        codec.loads(b"{not json")
+
+def test_get_codec_auto():
+    """Test the fastest installed codec is picked and shared"""
+    assert get_codec().name == available_codecs()[0]
+    assert get_codec('auto') is get_codec()
+    assert available_codecs()[-1] == 'json'
+
+    codec = JSONCodec()
+    assert get_codec(codec) is codec
+
+    with pytest.raises(ValueError):
+        get_codec('yaml')
+
+def test_email_to_json_per_codec():
+    """Test the memoised JSON body follows the requested codec"""
+    email = Email(
+        to="one@example.com",
+        subject="Test",
+        html="<h1>Test</h1>",
+        attachments=[Attachment(filename="test.txt", content=b"test content")]
+    )
+    stdlib = get_codec('json')
+
+    default_body = email.to_json()
+    stdlib_body = email.to_json(stdlib)
+    assert email.to_json(stdlib) is stdlib_body
+    assert json.loads(default_body) == json.loads(stdlib_body) == email.to_dict()
@@ -0,0 +1,74 @@
+"""Tests for the load generator"""
+
+import time
+import pytest
+
+from shoutbox.loadgen import (
+    LoadGenerator, LatencyHistogram, parse_size, parse_attachment_mix, synthetic_email
+)
+
+def test_parse_size():
+    """Test size parsing with units"""
+    assert parse_size("512") == 512
+    assert parse_size("10k") == 10 * 1024
+    assert parse_size("1.5MB") == int(1.5 * 1024 * 1024)
+
+    with pytest.raises(ValueError):
+        parse_size("ten")
+
+def test_parse_attachment_mix():
+    """Test attachment mix parsing"""
+    assert parse_attachment_mix("0:70,10k:20,1m:10") == [(0, 70.0), (10240, 20.0), (1048576, 10.0)]
+    assert parse_attachment_mix("0") == [(0, 1.0)]
+
+    with pytest.raises(ValueError):
+        parse_attachment_mix("0:0")
+
+def test_synthetic_email():
+    """Test synthetic email sizes"""
+    email = synthetic_email("to@example.com", "from@example.com", payload_size=2048, attachment_size=100)
+    assert len(email.html) == 2048
+    assert len(email.attachments[0].content) == 100
+
+def test_latency_histogram():
+    """Test percentiles are within the bucket precision"""
+    histogram = LatencyHistogram()
+    for ms in range(1, 101):
+        histogram.record(ms / 1000)
+
+    assert histogram.count == 100
+    assert histogram.percentile(50) == pytest.approx(0.050, rel=0.02)
+    assert histogram.percentile(99) == pytest.approx(0.099, rel=0.02)
+    assert histogram.percentile(100) == pytest.approx(0.100)
+
+def test_load_generator_requests():
+    """Test running a fixed number of sends with errors counted"""
+    calls = []
+
+    def send(email):
+        calls.append(email)
+        if len(calls) % 10 == 0:
+            raise RuntimeError("boom")
+
+    email = synthetic_email("to@example.com", "from@example.com")
+    generator = LoadGenerator(send, lambda: email, concurrency=4, requests=50).run()
+
+    summary = generator.summary()
+    assert len(calls) == 50
+    assert summary['sent'] == 45
+    assert summary['errors'] == 5
+    assert isinstance(generator.last_error, RuntimeError)
+
+def test_load_generator_rate():
+    """Test the target rate is respected"""
+    email = synthetic_email("to@example.com", "from@example.com")
+    start = time.monotonic()
+    generator = LoadGenerator(lambda e: None, lambda: email, concurrency=4, rate=100, requests=30).run()
+
+    assert generator.summary()['sent'] == 30
+    assert time.monotonic() - start >= 0.25
+
+def test_load_generator_requires_limit():
+    """Test a request count or duration is required"""
+    with pytest.raises(ValueError):
+        LoadGenerator(lambda e: None, lambda: None)
@@ -0,0 +1,143 @@
+"""Tests for sending rendered MIME messages"""
+
+import base64
+import email
+import email.policy
+import io
+import json
+import pytest
+from email.message import EmailMessage
+
+from shoutbox import ShoutboxClient, SMTPClient
+from shoutbox.exceptions import ValidationError, PayloadTooLargeError
+from shoutbox.mime import message_envelope
+from shoutbox.smtp import _DataWriter
+from shoutbox.suppression import SuppressionList
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+
+ATTACHMENT = bytes(range(256)) * 40
+
+class Unseekable(io.BytesIO):
+    def seekable(self):
+        return False
+
+class Socket:
+    def __init__(self):
+        self.data = b''
+
+    def sendall(self, data):
+        self.data += data
+
+def make_message():
+    msg = EmailMessage()
+    msg['From'] = 'Sender <sender@example.com>'
+    msg['To'] = 'One <one@example.com>'
+    msg['Cc'] = 'two@example.com'
+    msg['Bcc'] = 'hidden@example.com'
+    msg['Subject'] = 'Quarterly report'
+    msg['X-Campaign'] = 'q3'
+    msg.set_content("Hello\n.\nA line starting with a dot\n")
+    msg.add_alternative("<p>Hello</p>", subtype='html')
+    msg.add_attachment(ATTACHMENT, maintype='application', subtype='octet-stream', filename='report.bin')
+    return msg
+
+def smtp_client(server, **kwargs):
+    return SMTPClient(api_key="test", host=server.host, port=server.port, use_tls=False, **kwargs)
+
+def test_data_writer_across_chunks():
+    """Test line endings and dot-stuffing are handled where chunks split a line"""
+    sock = Socket()
+    writer = _DataWriter(sock)
+    for chunk in (b'.first\r', b'\n', b'.second\n', b'third\r', b'\n.', b'fourth', b'\r\n..fifth'):
+        writer.write(chunk)
+    writer.close()
+    assert sock.data == b'..first\r\n..second\r\nthird\r\n..fourth\r\n...fifth\r\n.\r\n'
+    assert writer.size == len(sock.data)
+
+    # A LF on its own completes the CR before it, and a following LF is a new line
+    sock = Socket()
+    writer = _DataWriter(sock)
+    for chunk in (b'a\r', b'\n', b'\nb'):
+        writer.write(chunk)
+    writer.close()
+    assert sock.data == b'a\r\n\r\nb\r\n.\r\n'
+
+def test_smtp_send_raw_message():
+    """Test a Message is streamed with its envelope from the headers and without Bcc"""
+    msg = make_message()
+    with StandInSMTPServer(keep_messages=True) as server:
+        result = smtp_client(server).send_raw(msg)
+    assert result.ok and result.email is None
+    assert message_envelope(msg) == ('sender@example.com', ['one@example.com', 'two@example.com', 'hidden@example.com'])
+    sender, recipients, data = server.messages[0]
+    assert sender == 'sender@example.com'
+    assert recipients == ['one@example.com', 'two@example.com', 'hidden@example.com']
+    received = email.message_from_bytes(data, policy=email.policy.default)
+    assert 'Bcc' not in received and 'Bcc' in msg
+    assert received.get_body(('plain',)).get_content().replace('\r\n', '\n') == "Hello\n.\nA line starting with a dot\n"
+    assert next(received.iter_attachments()).get_content() == ATTACHMENT
+    assert result.bytes_sent >= len(data)
+
+def test_smtp_send_raw_file(tmp_path):
+    """Test a file is streamed unchanged apart from line endings, to the envelope given"""
+    path = tmp_path / 'message.eml'
+    lines = [b'From: sender@example.com', b'To: one@example.com', b'Subject: Hi', b'']
+    lines += [b'.' * (i % 3) + b'x' * (i % 997) for i in range(2000)]
+    path.write_bytes(b'\n'.join(lines) + b'\n')
+    with StandInSMTPServer(keep_messages=True) as server:
+        client = smtp_client(server, max_message_size=2_000_000)
+        with open(path, 'rb') as f:
+            result = client.send_raw(f, 'bounces@example.com', ['other@example.com'])
+        with open(path, 'rb') as f:
+            assert client.send_raw(f).ok
+        with pytest.raises(PayloadTooLargeError):
+            smtp_client(server, max_message_size=1000).send_raw(path.read_bytes())
+        with pytest.raises(ValidationError):
+            smtp_client(server).send_raw(Unseekable(path.read_bytes()))
+    assert result.ok
+    assert server.messages[0][:2] == ('bounces@example.com', ['other@example.com'])
+    assert server.messages[0][2] == b'\r\n'.join(lines) + b'\r\n'
+    assert server.messages[1][:2] == ('sender@example.com', ['one@example.com'])
+
+def test_api_send_raw():
+    """Test a Message is mapped onto the API payload with attachments passed through"""
+    msg = make_message()
+    with StandInAPIServer(keep_payloads=True) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url)
+        result = client.send_raw(msg)
+        client.send_raw(msg.as_bytes(), recipients=['two@example.com', 'new@example.com'])
+    assert result.ok
+    payload = json.loads(server.payloads[0])
+    assert payload['to'] == 'one@example.com'
+    assert payload['cc'] == 'two@example.com'
+    assert payload['bcc'] == 'hidden@example.com'
+    assert payload['from'] == 'sender@example.com' and payload['name'] == 'Sender'
+    assert payload['subject'] == 'Quarterly report'
+    assert payload['html'] == '<p>Hello</p>\n'
+    assert payload['headers']['X-Campaign'] == 'q3'
+    assert payload['attachments'] == [{
+        'filename': 'report.bin',
+        'content': base64.b64encode(ATTACHMENT).decode(),
+        'content_type': 'application/octet-stream',
+    }]
+    # Cc moves to to when no to address is left
+    restricted = json.loads(server.payloads[1])
+    assert (restricted['to'], restricted['bcc']) == ('two@example.com', 'new@example.com')
+    assert 'cc' not in restricted
+
+def test_send_raw_suppression():
+    """Test suppressed recipients are dropped from raw sends on both transports"""
+    suppression = SuppressionList()
+    suppression.add_many(['two@example.com', 'hidden@example.com'])
+    msg = make_message()
+    with StandInAPIServer(keep_payloads=True) as api_server, StandInSMTPServer(keep_messages=True) as smtp_server:
+        api = ShoutboxClient(api_key="test", base_url=api_server.url, suppression=suppression)
+        smtp = smtp_client(smtp_server, suppression=suppression)
+        assert api.send_raw(msg).suppressed == ['two@example.com', 'hidden@example.com']
+        assert smtp.send_raw(msg).suppressed == ['two@example.com', 'hidden@example.com']
+        assert smtp.send_raw(msg, recipients=['two@example.com']).status == 'suppressed'
+    payload = json.loads(api_server.payloads[0])
+    assert payload['to'] == 'one@example.com'
+    assert 'cc' not in payload and 'bcc' not in payload
+    assert smtp_server.messages[0][1] == ['one@example.com']
+    assert smtp_server.requests == 1
@@ -1,11 +1,14 @@
 """Tests for the Shoutbox models"""
 
 import os
+import json
+import base64
 import pytest
 from unittest.mock import patch, Mock, MagicMock
 
 from shoutbox import EmailAddress, Email, Attachment
 from shoutbox.exceptions import ValidationError
+from shoutbox.json_codec import JSONCodec
 
 def test_email_address_validation():
     """Test email address validation"""
@@ -179,3 +182,366 @@ def test_email_address_conversion():
     
     data = email.to_dict()
     assert data['to'] == ','.join(to_emails)
+
+def test_email_with_overrides():
+    """Test deriving per-recipient variants from a base email"""
+    attachment = Attachment(filename="test.txt", content=b"test content")
+    base = Email(
+        from_email="Sender <sender@example.com>",
+        to=["one@example.com", "two@example.com"],
+        subject="Base",
+        html="<h1>Base</h1>",
+        headers={'X-Campaign': 'spring'},
+        attachments=[attachment]
+    )
+
+    variant = base.with_overrides(to="other@example.com", subject="Variant")
+
+    assert variant.to == [EmailAddress("other@example.com")]
+    assert variant.subject == "Variant"
+    assert variant.from_email is base.from_email
+    assert variant.attachments is base.attachments
+    assert base.to[0].email == "one@example.com"
+    assert base.subject == "Base"
+
+    data = variant.to_dict()
+    assert data['to'] == "other@example.com"
+    assert data['subject'] == "Variant"
+    assert data['name'] == "Sender"
+    assert data['attachments'] is base.to_dict()['attachments']
+    assert base.to_dict()['to'] == "one@example.com,two@example.com"
+
+def test_email_with_overrides_validation():
+    """Test only overridden fields are validated"""
+    base = Email(to="one@example.com", subject="Base", html="<h1>Base</h1>")
+
+    with pytest.raises(ValidationError):
+        base.with_overrides(to="invalid-email")
+
+    with pytest.raises(ValidationError):
+        base.with_overrides(html=None)
+
+    with pytest.raises(TypeError):
+        base.with_overrides(sender="one@example.com")
+
+    for to in (None, [], 5, ["one@example.com", 5]):
+        with pytest.raises(ValidationError):
+            base.with_overrides(to=to)
+    with pytest.raises(ValidationError):
+        Email(to=None, subject="Base", html="<h1>Base</h1>")
+
+    class TaggedEmail(Email):
+        __slots__ = ()
+
+    tagged = TaggedEmail(to="one@example.com", subject="Base", html="<h1>Base</h1>")
+    assert type(tagged.with_overrides(subject="Variant")) is TaggedEmail
+
+    variant = base.with_overrides(html=None, text="Plain", reply_to="reply@example.com", cc=["cc@example.com"])
+    data = variant.to_dict()
+    assert data['text'] == "Plain"
+    assert 'html' not in data
+    assert data['reply_to'] == "reply@example.com"
+    assert data['cc'] == "cc@example.com"
+
+def test_email_fragments_invalidated_on_assignment():
+    """Test replacing a field after serialisation refreshes the payload"""
+    email = Email(to="one@example.com", subject="Test", html="<h1>Test</h1>", from_email="sender@example.com")
+    assert email.to_dict()['to'] == "one@example.com"
+
+    email.to = [EmailAddress("two@example.com")]
+    email.from_email = EmailAddress("other@example.com", "Other")
+    email.attachments = [Attachment(filename="test.txt", content=b"test")]
+
+    data = email.to_dict()
+    assert data['to'] == "two@example.com"
+    assert data['from'] == "other@example.com"
+    assert data['name'] == "Other"
+    assert data['attachments'][0]['filename'] == "test.txt"
+
+def test_email_payload_memoised():
+    """Test the payload and JSON body are computed once and refreshed on assignment"""
+    email = Email(to="one@example.com", subject="Test", html="<h1>Test</h1>")
+
+    assert email.to_dict() is email.to_dict()
+    body = email.to_json()
+    assert body is email.to_json()
+    assert json.loads(body) == email.to_dict()
+
+    email.subject = "Changed"
+    assert email.to_dict()['subject'] == "Changed"
+    assert json.loads(email.to_json())['subject'] == "Changed"
+
+def test_email_caches_see_changes_in_place():
+    """Test changing a list or dict field in place refreshes the payload, JSON and size"""
+    email = Email(to="one@example.com", subject="Test", html="<h1>Test</h1>", headers={'X-A': 'a'})
+    body = email.to_json()
+    size = email.estimated_size()
+
+    email.headers['X-A'] = 'b'
+    email.to.append(EmailAddress("two@example.com"))
+    assert email.to_dict()['headers'] == {'X-A': 'b'}
+    assert email.to_dict()['to'] == "one@example.com,two@example.com"
+    assert json.loads(email.to_json()) == email.to_dict()
+    assert email.to_json() != body
+    assert email.estimated_size() == size + len(",two@example.com")
+
+    payload = email.to_dict()
+    email.attachments.append(Attachment(filename="test.txt", content=b"test"))
+    assert email.to_dict()['attachments'][0]['filename'] == "test.txt"
+    email.attachments[0].filename = "other.txt"
+    assert email.to_dict()['attachments'][0]['filename'] == "other.txt"
+    assert email.to_dict()['to'] is payload['to']
+
+def test_attachment_encoded_once():
+    """Test attachment content is base64 encoded once and refreshed on assignment"""
+    attachment = Attachment(filename="test.txt", content=b"test content")
+    data = attachment.to_dict()
+    assert attachment.to_dict() is data
+
+    attachment.content = b"other"
+    assert base64.b64decode(attachment.to_dict()['content']) == b"other"
+
+def test_models_are_slotted():
+    """Test models have no per-instance __dict__ and keep dataclass behaviour"""
+    import dataclasses
+
+    attachment = Attachment(filename="test.txt", content=b"test content")
+    email = Email(to="one@example.com", subject="Test", html="<h1>Test</h1>", attachments=[attachment])
+
+    for obj in (email, email.to[0], attachment):
+        assert not hasattr(obj, '__dict__')
+
+    with pytest.raises(AttributeError):
+        email.unknown_field = 1
+
+    assert [f.name for f in dataclasses.fields(email)][:3] == ['to', 'subject', 'html']
+    assert dataclasses.replace(email, subject="Other").subject == "Other"
+    assert email == Email(to="one@example.com", subject="Test", html="<h1>Test</h1>", attachments=[attachment])
+
+def test_email_pickle_drops_caches():
+    """Test emails pickle losslessly without their serialisation caches"""
+    import pickle
+
+    email = Email(
+        from_email="Sender <sender@example.com>",
+        to="one@example.com",
+        subject="Test",
+        html="<h1>Test</h1>",
+        attachments=[Attachment(filename="test.txt", content=b"test content")]
+    )
+    email.to_json()
+
+    restored = pickle.loads(pickle.dumps(email))
+    assert restored == email
+    assert restored._payload is None
+    assert restored.to_dict() == email.to_dict()
+
+def test_sender_addresses_interned():
+    """Test repeated sender and reply-to strings share one EmailAddress"""
+    import dataclasses
+    import pickle
+
+    first = Email(to="one@example.com", subject="Test", html="<h1>Test</h1>",
+                  from_email="News <news@example.com>", reply_to="reply@example.com")
+    second = Email(to="two@example.com", subject="Test", html="<h1>Test</h1>",
+                   from_email="News <news@example.com>", reply_to="reply@example.com")
+
+    assert first.from_email is second.from_email
+    assert first.reply_to is second.reply_to
+    assert first.from_email.name == "News"
+    assert EmailAddress.intern("News <news@example.com>") is first.from_email
+
+    address = EmailAddress("x@example.com")
+    assert EmailAddress.intern(address) is address
+
+    with pytest.raises(ValidationError):
+        EmailAddress.intern("invalid-email")
+
+    # Shared addresses are read-only, so one email cannot rename another's sender
+    with pytest.raises(dataclasses.FrozenInstanceError):
+        first.from_email.name = "Other"
+    assert second.from_email.name == "News"
+    first.from_email = EmailAddress("news@example.com", "Other")
+    assert (first.to_dict()['name'], second.to_dict()['name']) == ("Other", "News")
+    assert first.from_email == EmailAddress("Other <news@example.com>")
+    assert pickle.loads(pickle.dumps(second.from_email)) == second.from_email
+    assert repr(second.from_email) == "EmailAddress(email='news@example.com', name='News')"
+    assert EmailAddress("News <news@example.com>") == second.from_email
+    address.name = "X"
+
+def test_email_from_trusted():
+    """Test the trusted constructor builds the same email without validation"""
+    kwargs = dict(
+        to=["one@example.com", "two@example.com"],
+        subject="Test",
+        html="<h1>Test</h1>",
+        text="ignored",
+        cc="cc@example.com",
+        from_email="Sender <sender@example.com>",
+        reply_to="reply@example.com",
+        headers={'X-Custom': 'test'}
+    )
+    trusted = Email.from_trusted(**kwargs)
+    assert trusted == Email(**kwargs)
+    assert trusted.to_dict() == Email(**kwargs).to_dict()
+
+    # Not validated unless asked for
+    assert Email.from_trusted(to="not-an-address", subject="Test", html="x").to[0].email == "not-an-address"
+
+def test_email_from_dict_round_trip():
+    """Test rebuilding an email from its payload"""
+    email = Email(
+        from_email=EmailAddress("sender@example.com", "Sender"),
+        to=["one@example.com", "two@example.com"],
+        bcc=["bcc@example.com"],
+        subject="Test",
+        html="<h1>Test</h1>",
+        reply_to="reply@example.com",
+        headers={'X-Custom': 'test'},
+        attachments=[Attachment(filename="test.txt", content=b"test content", content_type="text/plain")]
+    )
+
+    restored = Email.from_dict(email.to_dict())
+    assert restored == email
+    assert restored.to_dict() == email.to_dict()
+    assert restored.attachments[0].content == b"test content"
+    # The encoded form is reused rather than re-encoded
+    assert restored.attachments[0]._serialized == email.attachments[0].to_dict()
+
+def test_trusted_validation_flag(monkeypatch):
+    """Test the debug flag turns validation back on"""
+    from shoutbox import models
+    monkeypatch.setattr(models, 'validate_trusted', True)
+
+    with pytest.raises(ValidationError):
+        Email.from_trusted(to="not-an-address", subject="Test", html="x")
+
+    with pytest.raises(ValidationError):
+        Email.from_dict({'to': "one@example.com,not-an-address", 'subject': "Test", 'html': "x"})
+
+    with pytest.raises(ValidationError):
+        Email.from_trusted(to="one@example.com", subject="Test")
+
+    assert Email.from_trusted(to="one@example.com", subject="Test", html="x").to[0].email == "one@example.com"
+
+def test_email_idempotency_key():
+    """Test idempotency keys derived from recipients and content"""
+    email = Email(to="user@example.com", subject="Receipt", html="<p>Thanks</p>",
+                  attachments=[Attachment(filename="receipt.pdf", content=b"%PDF")])
+    key = email.derive_idempotency_key()
+    assert len(key) == 64
+    assert email.idempotency_key is None
+
+    same = Email(to="user@example.com", subject="Receipt", html="<p>Thanks</p>",
+                 attachments=[Attachment(filename="receipt.pdf", content=b"%PDF")])
+    assert same.derive_idempotency_key() == key
+    assert email.with_overrides(to="other@example.com").derive_idempotency_key() != key
+    assert email.with_overrides(subject="Receipt!").derive_idempotency_key() != key
+    assert email.with_overrides(headers={'X-Order': '42'}).derive_idempotency_key() != key
+    # Values cannot shift between fields
+    assert (Email(to="user@example.com", subject="ab", html="c").derive_idempotency_key()
+            != Email(to="user@example.com", subject="a", html="bc").derive_idempotency_key())
+
+    explicit = Email(to="user@example.com", subject="Receipt", html="<p>Thanks</p>", idempotency_key="order-42")
+    assert explicit.idempotency_key == "order-42"
+    assert 'idempotency_key' not in explicit.to_dict()
+
+def test_email_split_recipients():
+    """Test splitting an email into copies with fewer recipients"""
+    email = Email(
+        from_email="sender@example.com",
+        to=[f"to{i}@example.com" for i in range(5)],
+        cc=["cc@example.com"],
+        bcc=[f"bcc{i}@example.com" for i in range(3)],
+        subject="Update",
+        html="<p>News</p>",
+        idempotency_key="update-1"
+    )
+    assert email.recipient_count() == 9
+    assert email.split_recipients(9) == [email]
+
+    chunks = email.split_recipients(4)
+    assert [chunk.recipient_count() for chunk in chunks] == [4, 4, 2]
+    assert [addr.email for addr in chunks[1].to] == ["to4@example.com"]
+    assert [addr.email for addr in chunks[1].cc] == ["cc@example.com"]
+    assert [addr.email for addr in chunks[1].bcc] == ["bcc0@example.com", "bcc1@example.com"]
+    # A bcc-only copy is addressed to the sender
+    assert chunks[2].to_dict()['to'] == "sender@example.com"
+    assert chunks[2].to_dict()['bcc'] == "bcc2@example.com"
+    assert 'cc' not in chunks[2].to_dict()
+    assert [chunk.idempotency_key for chunk in chunks] == ["update-1:1", "update-1:2", "update-1:3"]
+    assert all(chunk.subject == "Update" for chunk in chunks)
+
+    with pytest.raises(ValueError):
+        email.split_recipients(0)
+    no_sender = Email(to="to@example.com", bcc=["a@example.com", "b@example.com"], subject="x", html="x")
+    with pytest.raises(ValidationError):
+        no_sender.split_recipients(1)
+
+def test_email_address_normalisation(monkeypatch):
+    """Test domains are lower-cased and IDNA-encoded"""
+    assert EmailAddress("John.Doe@Example.COM").email == "John.Doe@example.com"
+    assert EmailAddress("Info <info@Bücher.de>").email == "info@xn--bcher-kva.de"
+    assert EmailAddress("user@пример.рф").email == "user@xn--e1afmkfd.xn--p1ai"
+
+    from shoutbox import models
+    assert models.normalize_address(" John@Example.com ", fold_local=True) == "john@example.com"
+    monkeypatch.setattr(models, 'fold_local_part', True)
+    assert EmailAddress("John.Doe@Example.COM").email == "john.doe@example.com"
+
+def test_email_recipients_deduplicated():
+    """Test repeated recipients across to, cc and bcc are sent once"""
+    email = Email(
+        to=["one@example.com", "one@EXAMPLE.com", "two@example.com"],
+        cc=["two@Example.com", "three@example.com"],
+        bcc=["one@example.com", "three@example.com"],
+        subject="Test",
+        html="<p>Test</p>"
+    )
+    assert [addr.email for addr in email.to] == ["one@example.com", "two@example.com"]
+    assert [addr.email for addr in email.cc] == ["three@example.com"]
+    assert email.bcc is None
+    assert email.to_dict()['to'] == "one@example.com,two@example.com"
+
+    variant = email.with_overrides(to="three@example.com")
+    assert [addr.email for addr in variant.to] == ["three@example.com"]
+    assert variant.cc is None
+    assert 'cc' not in variant.to_dict()
+    # The original keeps its recipients
+    assert email.to_dict()['cc'] == "three@example.com"
+
+def test_email_estimated_size():
+    """Test the size estimate matches the encoded email without encoding it"""
+    email = Email(
+        to=["one@example.com", "Two <two@example.com>"],
+        cc="three@example.com",
+        subject='Quarterly "report"',
+        html="<p>Hello\tthere</p>\n" * 50,
+        text="Hello there",
+        from_email="Sender <sender@example.com>",
+        reply_to="reply@example.com",
+        headers={"X-Campaign": "q3"},
+        attachments=[Attachment(filename="report.pdf", content=b"x" * 3000)]
+    )
+    assert email.estimated_size() == len(email.to_json(JSONCodec()))
+
+    from shoutbox.smtp import SMTPClient
+    msg = SMTPClient(api_key="test")._build_message(email)
+    mime = len(msg.as_bytes(policy=msg.policy.clone(linesep='\r\n')))
+    assert abs(email.estimated_size('smtp') - mime) < 500
+
+    # Non-ASCII headers grow as RFC 2047 encoded words; the estimate must not fall short
+    accented = Email(to="Zoë <zoe@example.com>", subject="é" * 280, html="<p>Hi</p>",
+                     from_email="Jürgen <j@example.com>", headers={"X-Note": "naïve " * 30},
+                     attachments=[Attachment(filename="résumé.pdf", content=b"x" * 1024 * 1024)])
+    msg = SMTPClient(api_key="test")._build_message(accented)
+    mime = len(msg.as_bytes(policy=msg.policy.clone(linesep='\r\n')))
+    assert mime <= accented.estimated_size('smtp') < mime + 500
+
+    big = Email(to="user@example.com", subject="Hi", html="<p>Hi</p>",
+                attachments=[Attachment(filename="a.bin", content=b"x" * 3_000_000)])
+    assert 4_000_000 < big.estimated_size() < 4_001_000
+    big.subject = "Changed"
+    assert big.estimated_size() == len(big.to_json(JSONCodec()))
+    with pytest.raises(ValueError):
+        email.estimated_size('fax')
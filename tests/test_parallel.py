@@ -0,0 +1,84 @@
+"""Tests for the multiprocess sender"""
+
+import base64
+import functools
+import json
+import multiprocessing
+
+from shoutbox import ShoutboxClient, SMTPClient, Email, Attachment
+from shoutbox.parallel import ProcessPoolSender
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+
+SPAWN = multiprocessing.get_context('spawn')
+
+def make_emails(count, attachment=None):
+    return [
+        Email(
+            to=f"user{i}@example.com",
+            subject=f"Hello {i}",
+            html="<p>Hello</p>",
+            attachments=[attachment] if attachment else []
+        )
+        for i in range(count)
+    ]
+
+def test_process_pool_api():
+    """Test every email is sent once through the worker processes"""
+    with StandInAPIServer(keep_payloads=True) as server:
+        factory = functools.partial(ShoutboxClient, api_key='test', base_url=server.url)
+        with ProcessPoolSender(factory, processes=2, concurrency=4, batch_size=7, mp_context=SPAWN) as sender:
+            results = list(sender.send(make_emails(50)))
+
+        assert sorted(result.index for result in results) == list(range(50))
+        assert all(result.ok and result.message_id for result in results)
+        assert all(result.email.subject == f"Hello {result.index}" for result in results)
+        assert server.requests == 50
+        subjects = sorted(json.loads(body)['subject'] for body in server.payloads)
+        assert subjects == sorted(f"Hello {i}" for i in range(50))
+
+def test_process_pool_shared_attachments():
+    """Test large attachments arrive intact through shared memory"""
+    content = bytes(range(256)) * 2048  # 512 KiB
+    attachment = Attachment(filename="blob.bin", content=content)
+    small = Attachment(filename="small.txt", content=b"small")
+
+    with StandInAPIServer(keep_payloads=True) as server:
+        factory = functools.partial(ShoutboxClient, api_key='test', base_url=server.url)
+        emails = make_emails(6, attachment)
+        emails[0] = Email(to="mixed@example.com", subject="Mixed", html="<p>x</p>", attachments=[small, attachment])
+        sender = ProcessPoolSender(factory, processes=2, batch_size=2, shared_memory_threshold=64 * 1024, mp_context=SPAWN)
+        with sender:
+            results = list(sender.send(emails))
+            # Segments are freed once their batches complete
+            assert sender._segments._segments == {}
+
+        assert all(result.ok for result in results)
+        for body in server.payloads:
+            payload = json.loads(body)
+            attachments = {att['filename']: base64.b64decode(att['content']) for att in payload['attachments']}
+            assert attachments['blob.bin'] == content
+            if payload['to'] == "mixed@example.com":
+                assert attachments['small.txt'] == b"small"
+
+    # The caller's emails are left untouched
+    assert emails[1].attachments[0].content == content
+
+def test_process_pool_failures():
+    """Test failed sends are reported per email"""
+    with StandInAPIServer(status=500) as server:
+        factory = functools.partial(ShoutboxClient, api_key='test', base_url=server.url)
+        with ProcessPoolSender(factory, processes=1, concurrency=1, mp_context=SPAWN) as sender:
+            results = list(sender.send(make_emails(3)))
+
+    assert sorted(result.index for result in results) == [0, 1, 2]
+    assert all(not result.ok and result.error.status_code == 500 for result in results)
+
+def test_process_pool_smtp():
+    """Test SMTP workers"""
+    with StandInSMTPServer() as server:
+        factory = functools.partial(SMTPClient, api_key='test', host=server.host, port=server.port, use_tls=False)
+        with ProcessPoolSender(factory, processes=2, shared_memory_threshold=None, mp_context=SPAWN) as sender:
+            results = list(sender.send(make_emails(10)))
+
+    assert all(result.ok and result.message_id and result.accepted == [result.email.to[0].email] for result in results)
+    assert server.recipients == 10
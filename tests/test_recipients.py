@@ -0,0 +1,51 @@
+"""Tests for recipient list de-duplication"""
+
+import os
+
+from shoutbox.recipients import dedupe_recipients
+
+def test_dedupe_in_memory():
+    """Test repeated addresses are dropped in input order"""
+    rows = ["a@example.com", "B@example.com", "a@EXAMPLE.com", "b@example.com", "c@example.com", "B@Example.com"]
+    assert list(dedupe_recipients(rows)) == ["a@example.com", "B@example.com", "b@example.com", "c@example.com"]
+    assert list(dedupe_recipients(rows, fold_local=True)) == ["a@example.com", "B@example.com", "c@example.com"]
+
+def test_dedupe_rows():
+    """Test rows are compared by their address field"""
+    rows = [
+        {'email': "ann@example.com", 'name': "Ann"},
+        {'email': "ANN@example.com ", 'name': "Ann again"},
+        {'email': "bob@example.com", 'name': "Bob"},
+    ]
+    result = list(dedupe_recipients(rows, fold_local=True))
+    assert [row['name'] for row in result] == ["Ann", "Bob"]
+    result = list(dedupe_recipients(rows, key=lambda row: row['name']))
+    assert len(result) == 3
+
+def test_dedupe_external_sort(tmp_path):
+    """Test lists beyond max_in_memory are de-duplicated through sorted runs"""
+    addresses = [f"user{i % 700}@Example.com" for i in range(3000)]
+    rows = [{'email': address, 'row': i} for i, address in enumerate(addresses)]
+    result = list(dedupe_recipients(rows, max_in_memory=100, tmp_dir=str(tmp_path)))
+
+    assert len(result) == 700
+    assert len({row['email'].lower() for row in result}) == 700
+    # The first 100 distinct addresses stream in input order
+    assert [row['row'] for row in result[:100]] == list(range(100))
+    # Later addresses keep their first occurrence
+    assert all(row['row'] < 700 for row in result)
+    # Temporary files are removed
+    assert os.listdir(tmp_path) == []
+
+def test_dedupe_is_lazy():
+    """Test rows are read as they are consumed"""
+    consumed = []
+
+    def rows():
+        for i in range(10):
+            consumed.append(i)
+            yield f"user{i}@example.com"
+
+    iterator = dedupe_recipients(rows())
+    next(iterator)
+    assert consumed == [0]
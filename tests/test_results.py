@@ -0,0 +1,202 @@
+"""Tests for streamed sends"""
+
+import asyncio
+import itertools
+import threading
+import time
+import pytest
+
+from shoutbox import ShoutboxClient, SMTPClient, Email, SendResult
+from shoutbox.exceptions import ShoutboxError, ValidationError, APIError
+from shoutbox.results import send_iter, asend_iter, is_retryable
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+
+class Transport:
+    """Send function double tracking concurrency"""
+
+    def __init__(self, delays=None, errors=None):
+        self.delays = delays or {}
+        self.errors = errors or {}
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.calls = []
+
+    def __call__(self, email):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            self.calls.append(email)
+        try:
+            time.sleep(self.delays.get(email, 0.001))
+            errors = self.errors.get(email)
+            if errors:
+                raise errors.pop(0)
+            return {'emailid': email}
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+def test_send_iter_completion_order():
+    """Test a slow send does not hold back later results"""
+    transport = Transport(delays={0: 0.3})
+    results = list(send_iter(transport, range(10), window=4))
+
+    assert sorted(result.index for result in results) == list(range(10))
+    assert results[-1].index == 0
+    assert all(isinstance(result, SendResult) and result.ok for result in results)
+    assert results[-1].latency >= 0.3
+    assert results[0].body == {'emailid': results[0].email}
+    assert results[0].message_id == results[0].email
+
+def test_send_iter_bounded_window():
+    """Test the input is read lazily with a bounded window in flight"""
+    transport = Transport()
+    pulled = []
+
+    def emails():
+        for i in itertools.count():
+            pulled.append(i)
+            yield i
+
+    stream = send_iter(transport, emails(), window=3)
+    first = [next(stream) for _ in range(5)]
+    assert len(first) == 5
+    assert len(pulled) <= 5 + 3 + 1
+    stream.close()
+    assert transport.max_in_flight <= 3
+
+def test_send_iter_retries():
+    """Test retryable failures are retried and permanent ones are not"""
+    transport = Transport(errors={
+        1: [ShoutboxError("Connection error")],
+        2: [APIError("busy", 503), APIError("busy", 503), APIError("busy", 503)],
+        3: [ValidationError("bad")],
+        4: [APIError("bad request", 400)],
+    })
+    results = {result.index: result for result in send_iter(transport, range(5), retries=2, backoff=0)}
+
+    assert results[0].ok and results[0].attempts == 1
+    assert results[1].ok and results[1].attempts == 2
+    assert not results[2].ok and results[2].attempts == 3
+    assert isinstance(results[2].error, APIError)
+    assert not results[3].ok and results[3].attempts == 1
+    assert not results[4].ok and results[4].attempts == 1
+
+def test_is_retryable():
+    """Test retry classification"""
+    assert is_retryable(ShoutboxError("Request timed out"))
+    assert is_retryable(APIError("slow down", 429))
+    assert not is_retryable(APIError("not found", 404))
+    assert not is_retryable(ValidationError("bad"))
+    assert not is_retryable(RuntimeError("bug"))
+
+def test_asend_iter():
+    """Test the async variant with a regular and an async iterable"""
+    transport = Transport(delays={0: 0.2})
+
+    async def emails():
+        for i in range(6):
+            yield i
+
+    async def collect(source):
+        return [result async for result in asend_iter(transport, source, window=3)]
+
+    for source in (range(6), emails()):
+        results = asyncio.run(collect(source))
+        assert sorted(result.index for result in results) == list(range(6))
+        assert results[-1].index == 0
+    assert transport.max_in_flight <= 3
+
+def test_client_send_iter():
+    """Test send_iter on both clients against the stand-in servers"""
+    emails = [Email(to=f"user{i}@example.com", subject="Test", html="<p>x</p>") for i in range(20)]
+
+    with StandInAPIServer() as server:
+        client = ShoutboxClient(api_key='test', base_url=server.url, pool_size=4)
+        results = list(client.send_iter(iter(emails)))
+        assert len(results) == 20 and all(result.ok for result in results)
+        assert {result.email.to[0].email for result in results} == {f"user{i}@example.com" for i in range(20)}
+
+        async def collect():
+            return [result async for result in client.asend_iter(emails, window=2)]
+        assert len(asyncio.run(collect())) == 20
+        assert server.requests == 40
+
+    with StandInSMTPServer() as server:
+        client = SMTPClient(api_key='test', host=server.host, port=server.port, use_tls=False)
+        results = list(client.send_iter(emails, window=4))
+        assert all(result.ok for result in results)
+        assert server.recipients == 20
+
+    with StandInAPIServer(status=500) as server:
+        client = ShoutboxClient(api_key='test', base_url=server.url)
+        results = list(client.send_iter(emails[:3], retries=1))
+        assert all(not result.ok and result.attempts == 2 for result in results)
+
+def test_send_result_lazy_body():
+    """Test the response body is parsed only when accessed"""
+    from shoutbox.json_codec import JSONCodec
+
+    class CountingCodec(JSONCodec):
+        loads_calls = 0
+
+        def loads(self, data):
+            CountingCodec.loads_calls += 1
+            return super().loads(data)
+
+    result = SendResult(raw=b'{"emailid": "abc", "message": "ok"}', codec=CountingCodec(), bytes_sent=10)
+    assert result and result.ok
+    assert CountingCodec.loads_calls == 0
+
+    assert result.message_id == "abc"
+    assert result['message'] == "ok"
+    assert dict(result) == {'emailid': "abc", 'message': "ok"}
+    assert result == {'emailid': "abc", 'message': "ok"}
+    assert CountingCodec.loads_calls == 1
+    assert result.raw == b'{"emailid": "abc", "message": "ok"}'
+
+def test_send_result_failed_and_pickled():
+    """Test failed results are falsy and results pickle without their codec"""
+    import pickle
+
+    failed = SendResult('failed', error=APIError("busy", 503, {'error': 'busy'}))
+    assert not failed and not failed.ok
+    assert failed.accepted == []
+    restored = pickle.loads(pickle.dumps(failed))
+    assert restored.error.status_code == 503
+    assert restored.error.response_body == {'error': 'busy'}
+
+    from shoutbox.json_codec import get_codec
+    sent = SendResult(raw=b'{"emailid": "abc"}', codec=get_codec(), index=3)
+    restored = pickle.loads(pickle.dumps(sent))
+    assert restored.message_id == "abc" and restored.index == 3
+
+def test_client_send_results():
+    """Test both transports return SendResult objects"""
+    email = Email(
+        to=["one@example.com", "two@example.com"],
+        bcc="three@example.com",
+        subject="Test",
+        html="<p>x</p>",
+        from_email="sender@example.com"
+    )
+
+    with StandInAPIServer() as server:
+        result = ShoutboxClient(api_key='test', base_url=server.url).send(email)
+    assert isinstance(result, SendResult) and result.ok
+    assert result.email is email
+    assert result.bytes_sent == len(email.to_json())
+    assert result['message'] == "Payload uploaded successfully"
+    assert result.message_id == result['emailid']
+    assert result.accepted == ["one@example.com", "two@example.com", "three@example.com"]
+    assert result.latency > 0
+
+    with StandInSMTPServer() as server:
+        result = SMTPClient(api_key='test', host=server.host, port=server.port, use_tls=False).send(email)
+    assert isinstance(result, SendResult) and result.ok
+    assert result.message_id.startswith("<") and result.message_id.endswith("@example.com>")
+    assert result.refused == {}
+    assert result.accepted == ["one@example.com", "two@example.com", "three@example.com"]
+    assert result.bytes_sent == server.bytes_received
+    assert result.body is None and dict(result) == {}
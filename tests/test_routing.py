@@ -0,0 +1,124 @@
+"""Tests for API/SMTP transport routing"""
+
+import pytest
+
+from shoutbox import ShoutboxClient, SMTPClient, Attachment
+from shoutbox.exceptions import ShoutboxError, APIError, PayloadTooLargeError
+from shoutbox.results import SendResult
+from shoutbox.routing import RoutingClient, RoutingRule
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+from helpers import Clock, make_email
+
+class FakeTransport:
+    def __init__(self, name, error=None):
+        self.name = name
+        self.error = error
+        self.sent = []
+
+    def send(self, email):
+        if self.error is not None:
+            raise self.error
+        self.sent.append(email.subject)
+        return SendResult(email=email, message_id=self.name)
+
+def test_routes_by_size_and_recipients():
+    """Test the default rules send big and many-recipient emails over SMTP"""
+    with StandInAPIServer() as api_server, StandInSMTPServer() as smtp_server:
+        router = RoutingClient(
+            ShoutboxClient(api_key="test", base_url=api_server.url),
+            SMTPClient(api_key="test", host=smtp_server.host, port=smtp_server.port, use_tls=False)
+        )
+        small = make_email()
+        big = make_email(attachments=[Attachment(filename="a.bin", content=b"\0" * (4 * 1024 * 1024))])
+        many = make_email(bcc=[f"user{i}@example.com" for i in range(60)])
+        assert [router.route(email) for email in (small, big, many)] == ['api', 'smtp', 'smtp']
+        results = [router.send(email) for email in (small, big, many)]
+
+    assert all(result.ok for result in results)
+    assert api_server.requests == 1
+    assert smtp_server.requests == 2
+    metrics = router.metrics()
+    assert metrics['api']['sent'] == 1 and metrics['smtp']['sent'] == 2
+    assert metrics['smtp']['latency_p50'] > 0
+
+def test_custom_rules():
+    """Test rules are tried in order and may test the email itself"""
+    api, smtp = FakeTransport('api'), FakeTransport('smtp')
+    rules = [
+        RoutingRule('api', when=lambda email, size, recipients: email.headers.get('X-Priority') == '1'),
+        RoutingRule('smtp', min_size=0),
+    ]
+    router = RoutingClient(api, smtp, rules=rules)
+    assert router.send(make_email("urgent", headers={'X-Priority': '1'})).message_id == 'api'
+    assert router.send(make_email("normal")).message_id == 'smtp'
+    with pytest.raises(ValueError):
+        RoutingRule('fax')
+
+def test_failover_and_circuit_breaker():
+    """Test failing sends move to the other transport, and a failing transport leaves rotation"""
+    clock = Clock()
+    api = FakeTransport('api', error=APIError("Server error", status_code=503))
+    smtp = FakeTransport('smtp')
+    router = RoutingClient(api, smtp, failure_threshold=3, cooldown=30, clock=clock)
+    for i in range(3):
+        assert router.send(make_email(f"m{i}")).message_id == 'smtp'
+    assert not router.health['api'].healthy
+    assert router.route(make_email()) == 'smtp'
+    assert router.metrics()['api']['trips'] == 1
+
+    api.error = None
+    clock.now += 31
+    assert router.route(make_email()) == 'api'
+    assert router.send(make_email("back")).message_id == 'api'
+    assert smtp.sent == ["m0", "m1", "m2"]
+
+def test_permanent_errors_not_failed_over():
+    """Test validation and client errors are raised without trying the other transport"""
+    api = FakeTransport('api', error=APIError("Bad request", status_code=400))
+    smtp = FakeTransport('smtp')
+    router = RoutingClient(api, smtp, failure_threshold=1)
+    with pytest.raises(APIError):
+        router.send(make_email())
+    assert smtp.sent == []
+    assert router.health['api'].healthy
+
+    router = RoutingClient(FakeTransport('api', error=ShoutboxError("down")), smtp, failover=False)
+    with pytest.raises(ShoutboxError):
+        router.send(make_email())
+
+def test_slow_transport_avoided():
+    """Test a transport slower than max_latency is avoided until its average goes stale"""
+    clock = Clock()
+    router = RoutingClient(FakeTransport('api'), FakeTransport('smtp'), max_latency=0.5, cooldown=30, clock=clock)
+    router.health['api'].record(2.0)
+    assert router.route(make_email()) == 'smtp'
+    clock.now += 31
+    assert router.route(make_email()) == 'api'
+
+def test_oversized_email_rerouted():
+    """Test an email above one transport's size limit goes through the other, without a request"""
+    with StandInAPIServer() as api_server, StandInSMTPServer() as smtp_server:
+        api = ShoutboxClient(api_key="test", base_url=api_server.url, max_request_size=64 * 1024)
+        smtp = SMTPClient(api_key="test", host=smtp_server.host, port=smtp_server.port, use_tls=False,
+                          max_message_size=1024 * 1024)
+        router = RoutingClient(api, smtp)
+        medium = make_email(attachments=[Attachment(filename="a.bin", content=b"\0" * (128 * 1024))])
+        huge = make_email(attachments=[Attachment(filename="a.bin", content=b"\0" * (2 * 1024 * 1024))])
+        assert router.route(medium) == 'smtp'
+        assert router.send(medium).ok
+        with pytest.raises(PayloadTooLargeError):
+            router.send(huge)
+    assert api_server.requests == 0
+    assert smtp_server.requests == 1
+
+def test_failover_skips_transport_too_small():
+    """Test a failed send is not failed over to a transport whose size limit it exceeds"""
+    class LimitedTransport(FakeTransport):
+        def check_size(self, email):
+            raise PayloadTooLargeError("Too large", 2048, 1024)
+
+    smtp = LimitedTransport('smtp')
+    router = RoutingClient(FakeTransport('api', error=APIError("Server error", status_code=503)), smtp)
+    with pytest.raises(APIError):
+        router.send(make_email())
+    assert smtp.sent == []
@@ -0,0 +1,205 @@
+"""Tests for scheduled sending"""
+
+import datetime
+import random
+import threading
+import time
+import pytest
+
+from shoutbox.dispatch import Dispatcher
+from shoutbox.results import SendResult
+from shoutbox.scheduler import TimerWheel, Timer, Scheduler, SQLiteScheduleStore, next_local_time
+from helpers import Clock, make_email
+
+class Recorder:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, email):
+        self.sent.append(email.subject)
+        return SendResult(email=email)
+
+class Blocked:
+    def __init__(self, event):
+        self.event = event
+
+    def send(self, email):
+        self.event.wait()
+        return SendResult(email=email)
+
+def test_timer_wheel_fires_in_order():
+    """Test timers across every level fire exactly at their tick"""
+    wheel = TimerWheel(slots=8, levels=3)
+    rng = random.Random(1)
+    expires = [rng.randrange(0, 2000) for _ in range(500)]
+    for i, tick in enumerate(expires):
+        wheel.add(Timer(i, tick))
+    fired = {}
+    for now in range(2001):
+        for timer in wheel.advance(now):
+            fired[timer.id] = now
+    # Past the 512 tick range of three levels, timers wait in overflow
+    assert fired == dict(enumerate(expires))
+    assert len(wheel) == 0
+
+    # Advancing in uneven steps fires each timer at the first step past it
+    wheel = TimerWheel(slots=8, levels=3)
+    for i, tick in enumerate(expires):
+        wheel.add(Timer(i, tick))
+    now = 0
+    while len(wheel):
+        now += rng.randrange(1, 40)
+        for timer in wheel.advance(now):
+            assert now - 40 < timer.expires <= now
+
+def test_timer_wheel_cancel_and_jump():
+    """Test cancelled timers never fire and advancing skips ahead"""
+    wheel = TimerWheel(slots=8, levels=2)
+    timers = [wheel.add(Timer(i, 10 + i * 7)) for i in range(20)]
+    for timer in timers[::2]:
+        assert wheel.cancel(timer)
+    assert not wheel.cancel(timers[0])
+    assert len(wheel) == 10
+
+    fired = wheel.advance(500)
+    assert [timer.id for timer in fired] == list(range(1, 20, 2))
+    assert not any(timer.pending for timer in timers)
+    # A timer already due fires on the next advance
+    wheel.add(Timer('late', 100))
+    assert [timer.id for timer in wheel.advance(500)] == ['late']
+
+def test_timer_wheel_single_level():
+    """Test a one-level wheel fires timers beyond its range from overflow"""
+    wheel = TimerWheel(slots=8, levels=1)
+    expires = [3, 7, 8, 20, 63, 64, 100]
+    for tick in expires:
+        wheel.add(Timer(tick, tick))
+    fired = [timer.id for now in range(101) for timer in wheel.advance(now) if timer.id == now]
+    assert fired == expires
+    assert len(wheel) == 0
+    with pytest.raises(ValueError):
+        TimerWheel(levels=0)
+
+def test_scheduler_delay_and_cancel():
+    """Test emails are released once due and cancelled ones are not"""
+    clock = Clock()
+    recorder = Recorder()
+    with Dispatcher(recorder, concurrency=4) as dispatcher:
+        scheduler = Scheduler(dispatcher, clock=clock, start=False)
+        soon = scheduler.schedule(make_email("soon"), delay=60)
+        later = scheduler.schedule(make_email("later"), delay=3600, priority='transactional')
+        cancelled = scheduler.schedule(make_email("cancelled"), delay=30)
+        assert scheduler.cancel(cancelled)
+        assert not scheduler.cancel(cancelled)
+        assert len(scheduler) == 2
+
+        clock.now += 59
+        assert scheduler.run_pending() == 0
+        clock.now += 1
+        assert scheduler.run_pending() == 1
+        assert soon.future.result().ok
+        assert not soon.pending and later.pending
+        assert not scheduler.cancel(soon)
+
+        clock.now += 7200
+        assert scheduler.run_pending() == 1
+        later.future.result()
+        scheduler.close()
+    assert recorder.sent == ["soon", "later"]
+
+def test_scheduler_rejected_sends():
+    """Test unknown priorities fail on schedule and a refused email does not stop the others"""
+    clock = Clock()
+    recorder = Recorder()
+    dispatcher = Dispatcher(recorder, concurrency=4)
+    scheduler = Scheduler(dispatcher, clock=clock, start=False)
+    with pytest.raises(ValueError):
+        scheduler.schedule(make_email("x"), delay=10, priority='urgent')
+    assert len(scheduler) == 0
+
+    sends = [scheduler.schedule(make_email(str(i)), delay=10) for i in range(3)]
+    dispatcher.close()
+    clock.now += 10
+    assert scheduler.run_pending() == 3
+    results = [send.future.result() for send in sends]
+    assert all(result.status == 'failed' for result in results)
+    assert isinstance(results[0].error, RuntimeError)
+    scheduler.close()
+
+def test_scheduler_at_datetime():
+    """Test scheduling at an aware datetime"""
+    clock = Clock(datetime.datetime(2024, 1, 1, 8, 0, tzinfo=datetime.timezone.utc).timestamp())
+    recorder = Recorder()
+    scheduler = Scheduler(recorder, clock=clock, start=False)
+    at = datetime.datetime(2024, 1, 1, 9, 0, tzinfo=datetime.timezone.utc)
+    handle = scheduler.schedule(make_email("nine"), at=at)
+    assert handle.at == at.timestamp()
+    with pytest.raises(ValueError):
+        scheduler.schedule(make_email("x"))
+    clock.now = at.timestamp()
+    assert scheduler.run_pending() == 1
+    scheduler.close()
+    assert recorder.sent == ["nine"]
+
+def test_scheduler_background_thread():
+    """Test the background thread releases due emails"""
+    recorder = Recorder()
+    with Scheduler(recorder, tick=0.01) as scheduler:
+        handle = scheduler.schedule(make_email("now"), delay=0.02)
+        for _ in range(200):
+            if handle.future:
+                break
+            time.sleep(0.01)
+        assert handle.future.result(timeout=1).ok
+
+def test_scheduler_store(tmp_path):
+    """Test pending emails survive a restart and released ones are removed"""
+    path = str(tmp_path / 'schedule.db')
+    clock = Clock()
+    recorder = Recorder()
+    store = SQLiteScheduleStore(path)
+    scheduler = Scheduler(recorder, clock=clock, store=store, start=False)
+    scheduler.schedule(make_email("first"), delay=10)
+    second = scheduler.schedule(make_email("second"), delay=20, priority='bulk')
+    cancelled = scheduler.schedule(make_email("cancelled"), delay=30)
+    scheduler.cancel(cancelled)
+    clock.now += 10
+    scheduler.run_pending()
+    scheduler.close()
+    store.close()
+
+    # A send still queued in the dispatcher is kept
+    clock = Clock()
+    blocked = threading.Event()
+    store = SQLiteScheduleStore(':memory:')
+    with Dispatcher(Blocked(blocked), concurrency=4) as dispatcher:
+        scheduler = Scheduler(dispatcher, clock=clock, store=store, start=False)
+        queued = scheduler.schedule(make_email("queued"), delay=1)
+        clock.now += 1
+        scheduler.run_pending()
+        assert [send.id for send in store.load()] == [queued.id]
+        blocked.set()
+        queued.future.result()
+        scheduler.close()
+    assert list(store.load()) == []
+    store.close()
+
+    store = SQLiteScheduleStore(path)
+    restored = list(store.load())
+    assert [(send.id, send.email.subject, send.priority) for send in restored] == [(second.id, "second", 'bulk')]
+    scheduler = Scheduler(recorder, clock=clock, store=store, start=False)
+    assert len(scheduler) == 1
+    clock.now += 100
+    assert scheduler.run_pending() == 1
+    scheduler.close()
+    assert recorder.sent == ["first", "second"]
+    assert list(store.load()) == []
+    store.close()
+
+def test_next_local_time():
+    """Test the next occurrence of a local time"""
+    tz = datetime.timezone(datetime.timedelta(hours=2))
+    now = datetime.datetime(2024, 5, 1, 6, 30, tzinfo=datetime.timezone.utc)
+    assert next_local_time(datetime.time(9), tz, now) == datetime.datetime(2024, 5, 1, 9, 0, tzinfo=tz)
+    now = datetime.datetime(2024, 5, 1, 7, 30, tzinfo=datetime.timezone.utc)
+    assert next_local_time(datetime.time(9), tz, now) == datetime.datetime(2024, 5, 2, 9, 0, tzinfo=tz)
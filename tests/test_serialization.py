@@ -0,0 +1,97 @@
+"""Tests for the binary email serialisation"""
+
+import pickle
+import pytest
+
+from shoutbox import Email, EmailAddress, Attachment, ValidationError
+from shoutbox import serialization
+
+
+def make_email(**overrides):
+    kwargs = dict(
+        to=["one@example.com", EmailAddress("two@example.com", "Two")],
+        subject="Café ✓",
+        html="<h1>Test</h1>",
+        cc="cc@example.com",
+        bcc=["bcc@example.com"],
+        from_email="Sender <sender@example.com>",
+        reply_to="sender@example.com",
+        headers={'X-Custom': 'test'},
+        attachments=[Attachment(filename="blob.bin", content=bytes(range(256)) * 4)],
+        idempotency_key="order-42"
+    )
+    kwargs.update(overrides)
+    return Email(**kwargs)
+
+def test_round_trip():
+    """Test an email survives a round trip unchanged"""
+    email = make_email()
+    restored = serialization.loads(serialization.dumps(email))
+    assert restored == email
+    assert restored.to_dict() == email.to_dict()
+
+    text_only = make_email(html=None, text="Plain", cc=None, bcc=None, headers={}, attachments=[])
+    assert serialization.loads(serialization.dumps(text_only)) == text_only
+
+def test_round_trip_with_validation():
+    """Test decoding through the validating constructor"""
+    email = make_email()
+    assert serialization.loads(serialization.dumps(email), validate=True) == email
+
+    invalid = Email.from_trusted(to="not-an-address", subject="Test", html="x")
+    data = serialization.dumps(invalid)
+    assert serialization.loads(data).to[0].email == "not-an-address"
+    with pytest.raises(ValidationError):
+        serialization.loads(data, validate=True)
+
+def test_compact_encoding():
+    """Test attachments stay raw and repeated strings are stored once"""
+    email = make_email()
+    data = serialization.dumps(email)
+    assert len(data) < len(pickle.dumps(email))
+    assert len(data) < len(email.to_json())
+    assert data.count(b"sender@example.com") == 1
+
+    batch = serialization.dumps_many([make_email(to=f"user{i}@example.com") for i in range(10)])
+    assert batch.count(b"sender@example.com") == 1
+    assert batch.count(b"blob.bin") == 1
+
+def test_batch_round_trip():
+    """Test batches share one string table"""
+    emails = [make_email(to=f"user{i}@example.com", subject=f"Hello {i}") for i in range(300)]
+    restored = serialization.loads_many(serialization.dumps_many(emails))
+    assert restored == emails
+
+    with pytest.raises(ValueError):
+        serialization.loads(serialization.dumps_many(emails[:2]))
+
+def test_invalid_data():
+    """Test malformed data is rejected"""
+    data = serialization.dumps(make_email())
+
+    with pytest.raises(ValueError):
+        serialization.loads(b"not an email")
+
+    with pytest.raises(ValueError):
+        serialization.loads(data[:3] + bytes([serialization.VERSION + 1]) + data[4:])
+
+    with pytest.raises(ValueError):
+        serialization.loads(data[:-10])
+
+    with pytest.raises(ValueError):
+        serialization.loads(data + b"\x00")
+
+def test_unknown_fields_skipped():
+    """Test fields added by newer writers are ignored"""
+    email = make_email(attachments=[], headers={})
+    writer = serialization._Writer()
+    writer.body.append(1)
+    writer.email(email)
+    writer.body[1] += 1  # field count of the only email
+    writer.field(200, bytearray(b"new"))
+    assert serialization.loads(writer.getvalue()) == email
+
+def test_non_string_headers_rejected():
+    """Test header values that cannot round trip are rejected"""
+    with pytest.raises(TypeError):
+        serialization.dumps(make_email(headers={'X-Count': 3}))
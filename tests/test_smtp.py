@@ -53,7 +53,7 @@ def test_send_basic_email():
     )
     
     success = client.send(email)
-    assert success is True
+    assert success.ok
 
 def test_send_email_with_attachment():
     """Test sending an email with attachment via SMTP"""
@@ -76,7 +76,7 @@ def test_send_email_with_attachment():
     )
     
     success = client.send(email)
-    assert success is True
+    assert success.ok
 
 def test_send_email_with_multiple_recipients():
     """Test sending an email to multiple recipients via SMTP"""
@@ -97,7 +97,7 @@ def test_send_email_with_multiple_recipients():
     )
     
     success = client.send(email)
-    assert success is True
+    assert success.ok
 
 @patch('smtplib.SMTP')
 def test_smtp_error_handling(mock_smtp):
@@ -144,4 +144,4 @@ def test_context_manager():
         )
         
         success = client.send(email)
-        assert success is True
+        assert success.ok
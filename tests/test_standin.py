@@ -0,0 +1,67 @@
+"""Tests for the local stand-in servers"""
+
+import json
+import pytest
+
+from shoutbox import ShoutboxClient, SMTPClient, Email
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+from shoutbox.exceptions import APIError
+
+@pytest.fixture
+def email():
+    return Email(
+        from_email="sender@example.com",
+        to=["one@example.com", "two@example.com"],
+        subject="Stand-in test",
+        html="<h1>Test</h1>"
+    )
+
+def test_api_stand_in(email):
+    """Test sending through the stand-in API server"""
+    with StandInAPIServer(keep_payloads=True) as server:
+        with ShoutboxClient(api_key="test", base_url=server.url) as client:
+            response = client.send(email)
+
+    assert response['message'] == "Payload uploaded successfully"
+    assert server.requests == 1
+    assert json.loads(server.payloads[0])['to'] == "one@example.com,two@example.com"
+
+def test_api_stand_in_error_status(email):
+    """Test the stand-in API server returning an error status"""
+    with StandInAPIServer(status=500) as server:
+        with ShoutboxClient(api_key="test", base_url=server.url) as client:
+            with pytest.raises(APIError) as exc_info:
+                client.send(email)
+
+    assert exc_info.value.status_code == 500
+
+def test_smtp_stand_in(email):
+    """Test sending through the stand-in SMTP server"""
+    with StandInSMTPServer() as server:
+        client = SMTPClient(api_key="test", host=server.host, port=server.port, use_tls=False)
+        assert client.send(email).ok
+
+    assert server.requests == 1
+    assert server.recipients == 2
+    assert server.bytes_received > 0
+
+def test_api_stand_in_capacity(email):
+    """Test the stand-in API server rejecting requests above its capacity"""
+    from concurrent.futures import ThreadPoolExecutor
+
+    with StandInAPIServer(latency=0.05, capacity=2) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, pool_size=6)
+
+        def send(_):
+            try:
+                return client.send(email).ok
+            except APIError as e:
+                assert e.status_code == 429
+                return False
+
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            outcomes = list(executor.map(send, range(6)))
+
+    assert outcomes.count(True) >= 2
+    assert server.rejected == outcomes.count(False) > 0
+    assert server.max_in_flight <= 2
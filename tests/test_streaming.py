@@ -0,0 +1,107 @@
+"""Tests for attachments streamed from files and iterators"""
+
+import base64
+import email
+import email.policy
+import io
+import json
+import os
+import tracemalloc
+import pytest
+
+from shoutbox import ShoutboxClient, SMTPClient, Attachment
+from shoutbox.exceptions import ValidationError
+from shoutbox import serialization
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+from helpers import make_email
+
+DATA = os.urandom(300_000)
+
+def chunks(data, size=7_777):
+    for offset in range(0, len(data), size):
+        yield data[offset:offset + size]
+
+def received_attachment(data):
+    msg = email.message_from_bytes(data, policy=email.policy.default)
+    return next(part for part in msg.walk() if part.get_filename()).get_content()
+
+def test_stream_encoded_incrementally():
+    """Test streams encode to the same base64 as the whole content, at every length"""
+    for size in (0, 1, 2, 3, 56, 57, 58, 114, 1000, len(DATA)):
+        data = DATA[:size]
+        attachment = Attachment(filename="a.bin", stream=chunks(data), size=size)
+        assert b''.join(attachment.iter_base64()) == base64.b64encode(data)
+        attachment = Attachment(filename="a.bin", stream=chunks(data), size=size)
+        assert b''.join(attachment.iter_base64(mime=True)) == base64.encodebytes(data).rstrip(b'\n')
+
+def test_stream_attachment_fields(tmp_path):
+    """Test size, filename and content type come from a file, and are required otherwise"""
+    path = tmp_path / 'report.pdf'
+    path.write_bytes(DATA)
+    with open(path, 'rb') as f:
+        f.read(10)
+        attachment = Attachment(stream=f)
+        assert (attachment.filename, attachment.content_type, attachment.size) == ('report.pdf', 'application/pdf', len(DATA) - 10)
+        # Seekable streams are rewound for every read
+        assert b''.join(attachment.iter_content()) == DATA[10:]
+        assert b''.join(attachment.iter_content()) == DATA[10:]
+    with pytest.raises(ValidationError):
+        Attachment(filename="a.bin", stream=chunks(DATA))
+    with pytest.raises(ValidationError):
+        Attachment(stream=chunks(DATA), size=len(DATA))
+    with pytest.raises(ValidationError):
+        Attachment(filename="a.bin", content=b"x", stream=io.BytesIO(DATA))
+
+    attachment = Attachment(filename="a.bin", stream=chunks(DATA), size=len(DATA) + 1)
+    with pytest.raises(ValidationError, match="gave 300000 bytes"):
+        b''.join(attachment.iter_content())
+    with pytest.raises(TypeError):
+        serialization.dumps(make_email("Report", attachments=[Attachment(filename="a.bin", stream=io.BytesIO(DATA))]))
+
+def test_api_streamed_attachment():
+    """Test the API client sends a streamed attachment in a chunked body"""
+    with StandInAPIServer(keep_payloads=True) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url)
+        streamed = make_email("Report", attachments=[Attachment(filename="a.bin", stream=chunks(DATA), size=len(DATA))])
+        result = client.send(streamed)
+        seekable = make_email("Report", attachments=[Attachment(filename="a.bin", stream=io.BytesIO(DATA))])
+        assert client.send(seekable).ok and client.send(seekable).ok
+
+    assert result.ok
+    assert result.bytes_sent == len(server.payloads[0]) == streamed.estimated_size()
+    for body in server.payloads:
+        payload = json.loads(body)
+        assert base64.b64decode(payload['attachments'][0]['content']) == DATA
+        assert payload['subject'] == "Report"
+
+def test_smtp_streamed_attachment():
+    """Test the SMTP client streams an attachment inside DATA"""
+    with StandInSMTPServer(keep_messages=True) as server:
+        client = SMTPClient(api_key="test", host=server.host, port=server.port, use_tls=False)
+        result = client.send(make_email("Report", attachments=[Attachment(filename="a.bin", stream=chunks(DATA), size=len(DATA))]))
+    assert result.ok
+    data = server.messages[0][2]
+    assert received_attachment(data) == DATA
+    assert result.bytes_sent >= len(data)
+    assert all(len(line) <= 78 for line in data.split(b'\r\n'))
+
+def test_concurrent_streams_bounded_memory():
+    """Test concurrent streamed sends do not hold their attachments in memory"""
+    size = 4 * 1024 * 1024
+    block = b'\0' * (64 * 1024)
+    with StandInSMTPServer() as server:
+        client = SMTPClient(api_key="test", host=server.host, port=server.port, use_tls=False)
+        emails = [
+            make_email("Report", attachments=[Attachment(filename=f"{i}.bin", stream=(block for _ in range(size // len(block))), size=size)])
+            for i in range(4)
+        ]
+        tracemalloc.start()
+        try:
+            results = list(client.send_iter(emails, window=4))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    assert all(result.ok for result in results)
+    assert server.bytes_received > 4 * size
+    # Holding the contents would take 16 MB, and their encoding 21 MB more
+    assert peak < 4 * 1024 * 1024
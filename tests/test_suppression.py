@@ -0,0 +1,160 @@
+"""Tests for local suppression lists"""
+
+import json
+import random
+import sqlite3
+import pytest
+
+from shoutbox import ShoutboxClient, SMTPClient
+from shoutbox.exceptions import ValidationError
+from shoutbox.suppression import BloomFilter, SuppressionList
+from shoutbox.testing import StandInAPIServer, StandInSMTPServer
+from helpers import make_email
+
+RECIPIENTS = ["one@example.com", "two@example.com"]
+
+def test_bloom_filter():
+    """Test the Bloom filter has no false negatives and about its false positive rate"""
+    bloom = BloomFilter(10_000, error_rate=0.01)
+    keys = [f"user{i}@example.com" for i in range(10_000)]
+    for key in keys:
+        bloom.add(key)
+    assert all(key in bloom for key in keys)
+    false_positives = sum(f"other{i}@example.com" in bloom for i in range(10_000))
+    assert false_positives < 200
+
+    restored = BloomFilter.from_bytes(bloom.to_bytes())
+    assert (restored.size, restored.hashes, restored.capacity) == (bloom.size, bloom.hashes, 10_000)
+    assert all(key in restored for key in keys)
+    with pytest.raises(ValueError):
+        BloomFilter(10, error_rate=1)
+
+def test_add_remove_and_normalisation():
+    """Test addresses match case-insensitively and removed ones stop matching"""
+    suppression = SuppressionList()
+    assert suppression.add("Bounced@Example.COM", reason="hard bounce")
+    assert not suppression.add("bounced@example.com")
+    assert "bounced@example.com" in suppression
+    assert " BOUNCED@example.com" in suppression
+    assert "other@example.com" not in suppression
+    assert suppression.reason("bounced@EXAMPLE.com") == "hard bounce"
+    assert len(suppression) == 1
+
+    assert suppression.remove("bounced@example.com")
+    assert not suppression.remove("bounced@example.com")
+    assert "bounced@example.com" not in suppression
+    assert len(suppression) == 0
+
+    exact = SuppressionList(fold_local=False)
+    exact.add("Bounced@Example.COM")
+    assert "Bounced@example.com" in exact
+    assert "bounced@example.com" not in exact
+
+def test_add_many_grows_filter():
+    """Test bulk adds past the filter's capacity rebuild it larger"""
+    suppression = SuppressionList(capacity=100)
+    addresses = [f"user{i}@example.com" for i in range(1000)]
+    assert suppression.add_many(addresses, reason="import") == 1000
+    assert suppression.add_many([(addresses[0], "again"), ("new@example.com", "complaint")]) == 1
+    assert len(suppression) == 1001
+    assert suppression.bloom.capacity >= 1001
+    assert all(address in suppression for address in addresses)
+    assert suppression.reason("new@example.com") == "complaint"
+    assert suppression.reason(addresses[0]) == "import"
+
+def test_load_csv(tmp_path):
+    """Test bulk loading from CSV with and without a reason column"""
+    path = tmp_path / 'bounces.csv'
+    path.write_text("email,type\nA@example.com,bounce\nb@example.com,complaint\n,bounce\na@example.com,bounce\n")
+    suppression = SuppressionList()
+    assert suppression.load_csv(str(path), reason='type') == 2
+    assert suppression.reason("a@example.com") == "bounce"
+    assert suppression.reason("b@example.com") == "complaint"
+
+    assert suppression.load_csv(str(path), reason='manual') == 0
+    with pytest.raises(ValueError):
+        suppression.load_csv(str(path), column='address')
+
+def test_filter_saved_and_rebuilt(tmp_path):
+    """Test the filter is reloaded on open, and rebuilt after changes by another writer"""
+    path = str(tmp_path / 'suppressed.db')
+    rng = random.Random(0)
+    addresses = [f"user{rng.random()}@example.com" for _ in range(500)]
+    with SuppressionList(path, capacity=1000) as suppression:
+        suppression.add_many(addresses)
+        saved = suppression.bloom.to_bytes()
+
+    with SuppressionList(path, capacity=1000) as suppression:
+        assert suppression.bloom.to_bytes() == saved
+        assert len(suppression) == 500
+        assert all(address in suppression for address in addresses)
+
+    # A change the saved filter does not reflect
+    db = sqlite3.connect(path)
+    with db:
+        db.execute("INSERT INTO suppressed VALUES ('late@example.com', NULL)")
+        db.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+    db.close()
+    with SuppressionList(path, capacity=1000) as suppression:
+        assert "late@example.com" in suppression
+        assert len(suppression) == 501
+
+def test_filter_email():
+    """Test suppressed recipients are dropped from their field"""
+    suppression = SuppressionList()
+    suppression.add_many(["two@example.com", "cc@example.com"])
+    email = make_email(to=RECIPIENTS, cc="cc@example.com", bcc="bcc@example.com")
+    allowed, suppressed = suppression.filter_email(email)
+    assert suppressed == ["two@example.com", "cc@example.com"]
+    assert [addr.email for addr in allowed.to] == ["one@example.com"]
+    assert allowed.cc is None
+    assert [addr.email for addr in allowed.bcc] == ["bcc@example.com"]
+
+    untouched = make_email(to="three@example.com")
+    assert suppression.filter_email(untouched) == (untouched, [])
+
+    allowed, suppressed = suppression.filter_email(make_email(to="two@example.com", cc="cc@example.com"))
+    assert allowed is None
+
+    bcc_only = make_email(to="two@example.com", bcc="bcc@example.com", from_email="news@example.com")
+    allowed, _ = suppression.filter_email(bcc_only)
+    assert [addr.email for addr in allowed.to] == ["news@example.com"]
+    with pytest.raises(ValidationError):
+        suppression.filter_email(make_email(to="two@example.com", bcc="bcc@example.com"))
+
+def test_client_skips_suppressed_recipients():
+    """Test the API client sends only to unsuppressed recipients"""
+    suppression = SuppressionList()
+    suppression.add("two@example.com")
+    with StandInAPIServer(keep_payloads=True) as server:
+        client = ShoutboxClient(api_key="test", base_url=server.url, suppression=suppression)
+        email = make_email(to=RECIPIENTS)
+        result = client.send(email)
+        skipped = client.send(make_email(to="TWO@example.com"))
+
+    assert server.requests == 1
+    assert json.loads(server.payloads[0])['to'] == "one@example.com"
+    assert result.ok
+    assert result.email is email
+    assert result.suppressed == ["two@example.com"]
+    assert result.accepted == ["one@example.com"]
+    assert skipped.status == 'suppressed'
+    assert not skipped
+    assert skipped.attempts == 0
+    assert skipped.suppressed == ["TWO@example.com"]
+    assert skipped.accepted == []
+
+def test_smtp_client_skips_suppressed_recipients():
+    """Test the SMTP client sends only to unsuppressed recipients"""
+    suppression = SuppressionList()
+    suppression.add("two@example.com")
+    with StandInSMTPServer() as server:
+        client = SMTPClient(api_key="test", host=server.host, port=server.port, use_tls=False,
+                            suppression=suppression)
+        result = client.send(make_email(to=RECIPIENTS))
+        skipped = client.send(make_email(to="two@example.com"))
+
+    assert server.requests == 1
+    assert server.recipients == 1
+    assert result.ok and result.suppressed == ["two@example.com"]
+    assert skipped.status == 'suppressed'
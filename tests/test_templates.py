@@ -0,0 +1,82 @@
+"""Tests for the template engine"""
+
+import pytest
+
+from shoutbox import Email, EmailAddress, Attachment
+from shoutbox.templates import Template, EmailTemplate
+from shoutbox.exceptions import ValidationError
+
+def test_template_render():
+    """Test named, braced and escaped placeholders"""
+    template = Template("Hi $name, ${count}x items cost $$5 {literal}")
+    assert template.fields == ('name', 'count')
+    assert template.render({'name': "Ann", 'count': 3}) == "Hi Ann, 3x items cost $5 {literal}"
+
+def test_template_constant():
+    """Test templates without placeholders"""
+    template = Template("<style>p { color: red }</style>")
+    assert template.fields == ()
+    assert template.render({}) == "<style>p { color: red }</style>"
+
+def test_template_escape():
+    """Test HTML escaping of substituted values only"""
+    template = Template("<p>$name</p>", escape=True)
+    assert template.render({'name': "<b>Tom & \"Jerry\"</b>"}) == "<p>&lt;b&gt;Tom &amp; &quot;Jerry&quot;&lt;/b&gt;</p>"
+
+def test_template_errors():
+    """Test missing fields and invalid placeholders"""
+    with pytest.raises(ValidationError):
+        Template("Hi $name").render({})
+
+    with pytest.raises(ValidationError):
+        Template("Costs $5")
+
+def test_email_template_render():
+    """Test rendering subject and bodies together"""
+    template = EmailTemplate("Hello $name", html="<p>$name</p>", text="Hi $name $code")
+    assert template.fields == ('name', 'code')
+    assert template.render({'name': "A&B", 'code': 1}) == ("Hello A&B", "<p>A&amp;B</p>", "Hi A&B 1")
+
+    with pytest.raises(ValidationError):
+        EmailTemplate("Hello")
+
+def test_payload_renderer_shares_base():
+    """Test per-recipient payloads share the serialised base fields"""
+    base = Email(
+        from_email=EmailAddress("sender@example.com", "Sender"),
+        to="placeholder@example.com",
+        subject="Base",
+        html="<p>Base</p>",
+        reply_to="reply@example.com",
+        headers={'X-Campaign': 'spring'},
+        attachments=[Attachment(filename="a.txt", content=b"attached")]
+    )
+    renderer = EmailTemplate("Hello $name", html="<p>Dear $name</p>").bind(base)
+
+    first = renderer.render("one@example.com", {'name': "One"})
+    second = renderer.render(EmailAddress("two@example.com"), {'name': "Two"})
+
+    assert first['to'] == "one@example.com"
+    assert first['subject'] == "Hello One"
+    assert first['html'] == "<p>Dear One</p>"
+    assert first['from'] == "sender@example.com"
+    assert first['name'] == "Sender"
+    assert first['reply_to'] == "reply@example.com"
+    assert second['to'] == "two@example.com"
+    assert first['attachments'] is second['attachments']
+    assert first['headers'] is second['headers']
+
+def test_payload_renderer_validation():
+    """Test recipient validation can be skipped for trusted input"""
+    base = Email(to="placeholder@example.com", subject="Base", text="Base")
+    renderer = EmailTemplate("Hi", text="Hi $name").bind(base)
+
+    with pytest.raises(ValidationError):
+        renderer.render("not-an-address", {'name': "x"})
+
+    payload = renderer.render("trusted@example.com", {'name': "x"}, validate=False)
+    assert payload['text'] == "Hi x"
+    assert 'html' not in payload
+
+    rows = [{'email': f"u{i}@example.com", 'name': str(i)} for i in range(3)]
+    assert [p['to'] for p in renderer.render_many(rows)] == ["u0@example.com", "u1@example.com", "u2@example.com"]